@@ -1,31 +1,238 @@
 # app.py
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify
+import dataclasses
+import functools
+import json
+import math
 import os
-import traceback
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
 
 # 导入我们所有需要的后台模块
 from data_loader import DataLoader
+from panel_registry import PanelRegistry, SNAPSHOT_ENV
+from character_store import CHARACTER_DATA_ENV
 from simulator import BattleSimulator
-from dpr_calculator import DprCalculator
-from rotation_finder import RotationFinder # 导入智能排轴查找器
-from models import BattleState, Enemy, Action
+from dpr_calculator import DprCalculator, DEFAULT_MONTE_CARLO_TRIALS
+from rotation_finder import RotationFinder, SEARCH_MODES, ROTATION_OBJECTIVES, DEFAULT_SPLIT_DEPTH # 导入智能排轴查找器
+from team_rotation_finder import TeamRotationFinder # 导入团队排轴查找器
+from build_optimizer import BuildOptimizer, OBJECTIVES # 导入配装优化器
+from score import Scorer, ScoringModel
+from stat_sensitivity import StatSensitivityAnalyzer
+import defense_efficiency
+from breakpoints import BreakpointIndex, EnemyProfile, BREAKPOINT_CACHE_ENV, preset_profiles
+from models import BattleState, Enemy, Action, CharacterPanel
+from result_cache import ResultCache, make_cache_key
+from jobs import JobManager, JobQueueFull, TERMINAL_STATUSES
+from batch_analysis import BatchAnalysis, MAX_ROTATION_LENGTH, MAX_TURNS, parse_batch_job, parse_enemy, resolve_rotation
+from tracing import get_logger, configure_logging, capture_trace
+from profiling import MetricsRegistry, METRICS_ENV, capture_metrics, capture_profile
 
 # --- 应用初始化 ---
 app = Flask(__name__)
+configure_logging()
+logger = get_logger(__name__)
 
 # --- 全局实例 (仅限轻量级) ---
-# 在应用启动时，只初始化最轻量级的数据加载器
+# 在应用启动时一次性解析并校验全部角色面板 (设置了快照环境变量时优先从二进制快照加载)；
+# 数据文件可以通过环境变量替换为列式角色数据库，此时启动只读取角色索引，面板在首次使用时加载
 try:
-    DATA_FILE_PATH = os.path.join(os.path.dirname(__file__), 'character_data.json')
-    loader = DataLoader(DATA_FILE_PATH)
-    AVAILABLE_CHARACTERS = list(loader.data.keys())
+    DATA_FILE_PATH = os.environ.get(CHARACTER_DATA_ENV) or os.path.join(os.path.dirname(__file__), 'character_data.json')
+    registry = PanelRegistry(DATA_FILE_PATH, snapshot_path=os.environ.get(SNAPSHOT_ENV))
+    AVAILABLE_CHARACTERS = registry.ids()
 except Exception as e:
-    print(f"应用启动时加载数据失败: {e}")
-    loader = None
+    logger.error("应用启动时加载数据失败: %s", e)
+    registry = None
     AVAILABLE_CHARACTERS = []
 
+# 属性断点表: 启动时为全部Boss预设一次性构建 (设置了缓存环境变量时优先从磁盘缓存加载)
+BOSS_BREAKPOINT_PROFILES = preset_profiles()
+breakpoint_index = BreakpointIndex(cache_path=os.environ.get(BREAKPOINT_CACHE_ENV))
+breakpoint_index.preload(BOSS_BREAKPOINT_PROFILES.values())
+
+# 计算结果缓存: 相同输入(角色数据、回合数、敌人、初始资源)的请求直接返回缓存结果
+RESULT_CACHE_MAX_ENTRIES = 256
+RESULT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+RESULT_CACHE_TTL_SECONDS = 600
+# 蒙特卡洛暴击采样单次请求允许的最大试验次数
+MAX_MONTE_CARLO_TRIALS = 200000
+# 手动分析时单次请求允许对比的最大排轴数
+MAX_ANALYZE_ROTATIONS = 64
+result_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS)
+
+# 异步任务队列: 同时运行的搜索任务数、排队上限和保留的已结束任务数
+JOB_MAX_WORKERS = 2
+JOB_MAX_PENDING = 32
+JOB_MAX_FINISHED = 256
+# 任务事件流的推送间隔(秒)
+JOB_STREAM_INTERVAL_SECONDS = 0.5
+job_manager = JobManager(JOB_MAX_WORKERS, JOB_MAX_PENDING, JOB_MAX_FINISHED)
+# 同时进行的流式排轴搜索数 (每个流占用一个搜索线程，workers>1 时还有一个进程池)，超出时返回429
+STREAM_MAX_CONCURRENT = JOB_MAX_WORKERS
+stream_slots = threading.BoundedSemaphore(STREAM_MAX_CONCURRENT)
+
+# 穿透/减防收益计算: 单次请求允许的最大网格点数，以及穿透和减防坐标轴的默认取值
+MAX_DEFENSE_GRID_POINTS = 200000
+DEFAULT_DEFENSE_AXIS = {'start': 0.0, 'stop': 1.0, 'step': 0.05}
+# 属性断点查询单次请求允许的最大目标伤害提升个数
+MAX_BREAKPOINT_TARGETS = 1000
+
+# 多目标战斗: 单次请求允许指定的最大敌人数
+MAX_ENEMIES = 8
+
+# 批量分析: 单次请求允许的最大任务数，以及所有批量请求共享的工作线程数
+MAX_BATCH_JOBS = 512
+BATCH_MAX_WORKERS = 4
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix="p5x-batch")
+
+# 性能指标: HTTP请求计数始终开启；模拟器的分阶段计数默认只统计带 "profile": true 的请求，
+# 设置环境变量 P5X_SIMULATOR_METRICS=1 后统计所有请求 (开启后模拟器有少量计时开销)
+metrics_registry = MetricsRegistry()
+COLLECT_SIMULATOR_METRICS = os.environ.get(METRICS_ENV) == "1"
+
+# --- 辅助函数 ---
+
+def traceable(view):
+    """
+    视图装饰器: 当请求体中带有 "trace": true 时，收集本次请求产生的全部日志记录(含调试级别)，
+    并附加到JSON响应的 'trace' 字段中，用于调试单个排轴。
+    注意: 并行搜索时工作进程中的日志不会被收集。
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        data = request.get_json(silent=True) or {}
+        if not data.get('trace'):
+            return view(*args, **kwargs)
+        with capture_trace() as trace:
+            rv = view(*args, **kwargs)
+        response, status = rv if isinstance(rv, tuple) else (rv, None)
+        payload = response.get_json()
+        payload['trace'] = trace.to_dict()
+        return jsonify(payload), status or response.status_code
+    return wrapper
+
+def profileable(view):
+    """
+    视图装饰器: 当请求体中带有 "profile": true 时，统计本次请求中模拟器各阶段的调用次数和耗时，
+    并用cProfile采集调用剖析，一并附加到JSON响应的 'profile' 字段中。
+    阶段计数同时汇总到 /metrics；开启了 COLLECT_SIMULATOR_METRICS 时所有请求都会汇总 (但不附加到响应)。
+    注意: 并行搜索时工作进程中的模拟器不会被统计。
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        data = request.get_json(silent=True) or {}
+        profile = bool(data.get('profile'))
+        if not profile and not COLLECT_SIMULATOR_METRICS:
+            return view(*args, **kwargs)
+        with capture_metrics() as metrics:
+            if profile:
+                with capture_profile() as cprofile:
+                    rv = view(*args, **kwargs)
+            else:
+                rv = view(*args, **kwargs)
+        metrics_registry.record_simulator(metrics)
+        if not profile:
+            return rv
+        response, status = rv if isinstance(rv, tuple) else (rv, None)
+        payload = response.get_json()
+        payload['profile'] = {'phases': metrics.to_dict(), 'cprofile': cprofile.to_dict()}
+        return jsonify(payload), status or response.status_code
+    return wrapper
+
+def state_cache_key(endpoint: str, character_id: str, turns: int, initial_state: BattleState, *extra) -> str | None:
+    """
+    为一次计算请求生成规范化的缓存键，包含角色原始数据的摘要、回合数、敌人和初始资源，
+    以及其他影响结果的参数 (extra)。角色不存在时返回None (不缓存)。
+    """
+    char_digest = registry.digest(character_id)
+    if char_digest is None:
+        return None
+    return make_cache_key(
+        endpoint, character_id, char_digest, turns,
+        [dataclasses.asdict(e) for e in initial_state.enemies.values()],
+        initial_state.character_resources, *extra
+    )
+
+def parse_monte_carlo(data: Dict) -> Dict | None:
+    """
+    解析可选的蒙特卡洛暴击采样参数: {"monte_carlo": {"trials": 10000, "seed": 42}}。
+    未请求时返回None，参数不合法时抛出ValueError。
+    """
+    options = data.get('monte_carlo')
+    if not options:
+        return None
+    if options is True:
+        options = {}
+    trials = int(options.get('trials', DEFAULT_MONTE_CARLO_TRIALS))
+    if not 1 <= trials <= MAX_MONTE_CARLO_TRIALS:
+        raise ValueError(f'蒙特卡洛试验次数必须在 1 到 {MAX_MONTE_CARLO_TRIALS} 之间。')
+    seed = options.get('seed')
+    return {'trials': trials, 'seed': None if seed is None else int(seed)}
+
+def parse_rotation_names(data: Dict) -> List[List[str]] | None:
+    """
+    解析可选的对比排轴: {"rotations": [["技能A", "技能B"], ["技能B", "技能A"]]}。
+    未提供时返回None，格式不合法时抛出ValueError。
+    """
+    rotations = data.get('rotations')
+    if rotations is None:
+        return None
+    if not isinstance(rotations, list) or not rotations:
+        raise ValueError("'rotations' 必须是非空的排轴列表。")
+    if len(rotations) > MAX_ANALYZE_ROTATIONS:
+        raise ValueError(f"单次最多对比 {MAX_ANALYZE_ROTATIONS} 个排轴。")
+    for names in rotations:
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise ValueError("每个排轴必须是技能名称的列表。")
+        if len(names) > MAX_ROTATION_LENGTH:
+            raise ValueError(f"排轴最多包含 {MAX_ROTATION_LENGTH} 个技能。")
+    return rotations
+
+def parse_enemies(data: Dict) -> List[Enemy]:
+    """
+    解析可选的敌人列表: {"enemies": [{"enemy_id": "A", "hp": 50000, "defense": 1200, "resistances": {...}}, ...]}。
+    未提供时返回默认的单个沙袋，格式不合法时抛出ValueError (每个敌人的校验见 batch_analysis.parse_enemy)。
+    """
+    specs = data.get('enemies')
+    if specs is None:
+        return [Enemy("沙袋", 100000, 1200, {"诅咒": 0.1})]
+    if not isinstance(specs, list) or not specs:
+        raise ValueError("'enemies' 必须是非空的敌人列表。")
+    if len(specs) > MAX_ENEMIES:
+        raise ValueError(f"单次最多指定 {MAX_ENEMIES} 个敌人。")
+    enemies = [parse_enemy(spec) for spec in specs]
+    if len({enemy.enemy_id for enemy in enemies}) != len(enemies):
+        raise ValueError("敌人ID不能重复。")
+    return enemies
+
+def is_cacheable(data: Dict, monte_carlo: Dict | None) -> bool:
+    """追踪和剖析请求需要真实执行计算，未指定种子的蒙特卡洛结果每次不同，这些情况都不走缓存。"""
+    return not data.get('trace') and not data.get('profile') and (monte_carlo is None or monte_carlo['seed'] is not None)
+
 # --- 路由和视图函数定义 ---
 
+@app.before_request
+def refresh_data():
+    """每个请求开始前检查数据文件是否变化；变化时重新加载并清空结果缓存。"""
+    global AVAILABLE_CHARACTERS
+    if registry and registry.reload_if_changed():
+        AVAILABLE_CHARACTERS = registry.ids()
+        result_cache.clear()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """按接口和状态码统计请求数和处理耗时 (见 /metrics)。"""
+    started = g.get('request_started')
+    if started is not None:
+        metrics_registry.record_request(request.endpoint or 'unknown', response.status_code, time.perf_counter() - started)
+    return response
+
 @app.route('/')
 def index():
     """渲染主页"""
@@ -34,31 +241,48 @@ def index():
     return render_template('index.html', characters=AVAILABLE_CHARACTERS)
 
 @app.route('/analyze', methods=['POST'])
+@traceable
+@profileable
 def analyze():
     """处理【手动】分析请求的API接口。"""
-    print("收到手动分析请求...")
-    if not loader:
+    logger.info("收到手动分析请求...")
+    if not registry:
         return jsonify({'error': '服务器数据加载器未初始化。'}), 500
 
     try:
         data = request.get_json()
         character_id = data.get('character_id')
         turns = int(data.get('turns', 3))
+        try:
+            if not 0 <= turns <= MAX_TURNS:
+                raise ValueError(f"'turns' 必须在 0 到 {MAX_TURNS} 之间。")
+            monte_carlo = parse_monte_carlo(data)
+            rotation_names = parse_rotation_names(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        panel = loader.load_character_panel(character_id)
-        if not panel:
-            return jsonify({'error': f"无法加载角色 '{character_id}'"}), 404
-
-        # 每次请求都创建新的实例，以保证线程安全和状态隔离
-        simulator = BattleSimulator([panel])
-        dpr_calculator = DprCalculator(simulator)
-        
         dummy_enemy = Enemy("沙袋", 100000, 1200, {"诅咒": 0.1})
         initial_state = BattleState(
             turn_number=1,
             enemies=[dummy_enemy],
             character_resources={character_id: {"sp": 1000}}
         )
+
+        cache_key = None
+        if is_cacheable(data, monte_carlo):
+            cache_key = state_cache_key('analyze', character_id, turns, initial_state, monte_carlo, rotation_names)
+        if cache_key:
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                return jsonify(cached)
+
+        panel = registry.load_character_panel(character_id)
+        if not panel:
+            return jsonify({'error': f"无法加载角色 '{character_id}'"}), 404
+
+        # 每次请求都创建新的实例，以保证线程安全和状态隔离
+        simulator = BattleSimulator([panel])
+        dpr_calculator = DprCalculator(simulator)
         
         if not panel.skills:
              return jsonify({'error': f"角色 '{character_id}' 没有技能"}), 400
@@ -74,66 +298,793 @@ def analyze():
             'rotation': [a.skill_used.name for a in rotation],
             'final_resources': results['final_state'].character_resources.get(character_id, {})
         }
+        if monte_carlo:
+            response_data['distribution'] = dpr_calculator.simulate_damage_distribution(
+                rotation, initial_state, monte_carlo['trials'], monte_carlo['seed']
+            )
+        if rotation_names:
+            # A/B对比: 多个排轴一起评估，共享的前缀只模拟一次
+            try:
+                rotations = [resolve_rotation(panel, names, dummy_enemy.enemy_id) for names in rotation_names]
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            response_data['comparisons'] = [
+                {
+                    'rotation': names,
+                    'dpr': result['dpr'],
+                    'total_damage': result['total_damage'],
+                    'final_resources': result['final_state'].character_resources.get(character_id, {})
+                }
+                for names, result in zip(rotation_names, dpr_calculator.calculate_batch_dpr(rotations, initial_state))
+            ]
+        if cache_key:
+            result_cache.put(cache_key, response_data)
         return jsonify(response_data)
 
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("手动分析请求处理失败")
         return jsonify({'error': '服务器内部错误。'}), 500
 
+@app.route('/analyze_batch', methods=['POST'])
+def analyze_batch():
+    """
+    处理【批量手动分析】请求: {"jobs": [{"character_id": ..., "rotation": [...], "enemy": {...}}, ...]}。
+    各任务并发执行，结果以NDJSON (每行一个JSON对象) 的形式按完成顺序流式返回，
+    每行带有任务在请求中的下标 'index'；无法执行的任务返回一行 {"index": ..., "error": ...}。
+    """
+    logger.info("收到批量分析请求...")
+    if not registry:
+        return jsonify({'error': '服务器数据加载器未初始化。'}), 500
+
+    data = request.get_json(silent=True) or {}
+    specs = data.get('jobs')
+    if not isinstance(specs, list) or not specs:
+        return jsonify({'error': "'jobs' 必须是非空的任务列表。"}), 400
+    if len(specs) > MAX_BATCH_JOBS:
+        return jsonify({'error': f"单次最多提交 {MAX_BATCH_JOBS} 个任务。"}), 400
+
+    # 在请求线程中完成解析、面板加载和缓存查询，只把需要计算的任务交给线程池
+    batch = BatchAnalysis(registry)
+    immediate, pending, cache_keys = [], [], {}
+    for index, spec in enumerate(specs):
+        try:
+            job = parse_batch_job(index, spec)
+            batch.prepare(job)
+            cache_key = state_cache_key('analyze_batch', job.character_id, len(job.rotation), job.initial_state(), job.rotation)
+        except (ValueError, TypeError) as e:
+            header = {'index': index, 'id': spec.get('id')} if isinstance(spec, dict) else {'index': index}
+            immediate.append({**{k: v for k, v in header.items() if v is not None}, 'error': str(e)})
+            continue
+        cached = result_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            immediate.append({**job.header(), **cached})
+        else:
+            cache_keys[index] = cache_key
+            pending.append(job)
+
+    def generate():
+        for result in immediate:
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+        if not pending:
+            return
+        for job, result in batch.run(pending, batch_executor):
+            if cache_keys[job.index] and 'error' not in result:
+                result_cache.put(cache_keys[job.index], {k: v for k, v in result.items() if k not in job.header()})
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def parse_rotation_search(data: Dict) -> Dict:
+    """
+    解析并校验排轴搜索请求的参数，返回搜索所需的全部参数。
+    参数不合法时抛出ValueError。
+    """
+    character_id = data.get('character_id')
+    turns = int(data.get('turns', 3))
+    # 默认使用记忆化分支定界搜索，可通过 'search_mode': 'exhaustive' 切换回穷举搜索
+    search_mode = data.get('search_mode', 'memo')
+    if search_mode not in SEARCH_MODES:
+        raise ValueError(f"未知的搜索模式 '{search_mode}'")
+    # 并行搜索配置: 进程数 (不超过本机CPU核数) 和搜索树的切分深度
+    workers = min(int(data.get('workers', 1)), os.cpu_count() or 1)
+    split_depth = int(data.get('split_depth', DEFAULT_SPLIT_DEPTH))
+    if workers < 1 or split_depth < 1:
+        raise ValueError('进程数和切分深度都必须至少为1。')
+    # 搜索目标: 'dpr' (默认) 或 'ttk' (最短击杀)；击杀时间目标必须追踪敌人HP
+    objective = data.get('objective', 'dpr')
+    if objective not in ROTATION_OBJECTIVES:
+        raise ValueError(f"未知的搜索目标 '{objective}'")
+    track_hp = bool(data.get('track_hp', objective == 'ttk'))
+    if objective == 'ttk' and not track_hp:
+        raise ValueError("击杀时间目标需要开启HP追踪 ('track_hp')。")
+    # 可选的随时终止预算: 时间(秒)或访问的节点数，用完后返回当前最优解
+    time_budget = float(data['time_budget']) if data.get('time_budget') is not None else None
+    node_budget = int(data['node_budget']) if data.get('node_budget') is not None else None
+    if (time_budget is not None and time_budget <= 0) or (node_budget is not None and node_budget < 1):
+        raise ValueError('时间预算必须为正数，节点预算必须至少为1。')
+    monte_carlo = parse_monte_carlo(data)
+
+    # 定义一个更真实的初始状态用于智能查找
+    initial_state = BattleState(
+        turn_number=1,
+        enemies=parse_enemies(data),
+        character_resources={character_id: {"sp": 100, "h_energy": 0}}
+    )
+
+    # 所有搜索模式和并行配置都返回相同的最优解，因此它们不参与缓存键；
+    # 预算也不参与: 只有在预算内完成的 (即全局最优的) 结果才会写入缓存
+    cache_key = None
+    if is_cacheable(data, monte_carlo):
+        cache_key = state_cache_key('find_best_rotation', character_id, turns, initial_state, monte_carlo, objective, track_hp)
+    return {
+        'character_id': character_id,
+        'turns': turns,
+        'search_mode': search_mode,
+        'workers': workers,
+        'split_depth': split_depth,
+        'objective': objective,
+        'track_hp': track_hp,
+        'time_budget': time_budget,
+        'node_budget': node_budget,
+        'initial_state': initial_state,
+        'monte_carlo': monte_carlo,
+        'cache_key': cache_key,
+    }
+
+def create_rotation_finder(params: Dict) -> Tuple[CharacterPanel, RotationFinder] | None:
+    """为排轴搜索请求创建全新的模拟器和查找器 (每次请求一个实例)，角色无法加载时返回None。"""
+    panel = registry.load_character_panel(params['character_id'])
+    if not panel:
+        return None
+    simulator = BattleSimulator([panel], track_enemy_hp=params['track_hp'])
+    return panel, RotationFinder(simulator, DprCalculator(simulator))
+
+def rotation_search_call(params: Dict, panel: CharacterPanel, rotation_finder: RotationFinder) -> Callable[[], Dict | None]:
+    """返回按请求参数调用 find_best_rotation 的无参函数 (同步执行或交给 iter_search 流式执行)。"""
+    return lambda: rotation_finder.find_best_rotation(
+        character_panel=panel,
+        turns=params['turns'],
+        initial_state=params['initial_state'],
+        search_mode=params['search_mode'],
+        workers=params['workers'],
+        split_depth=params['split_depth'],
+        objective=params['objective'],
+        time_budget=params['time_budget'],
+        node_budget=params['node_budget']
+    )
+
+def run_rotation_search(params: Dict, on_finder: Callable[[RotationFinder], None] | None = None) -> Tuple[Dict, int]:
+    """
+    执行一次排轴搜索，返回 (响应数据, HTTP状态码)，成功的结果会写入结果缓存。
+    on_finder 在搜索开始前以查找器为参数调用，用于挂载进度和取消检查。
+    """
+    created = create_rotation_finder(params)
+    if created is None:
+        return {'error': f"无法加载角色 '{params['character_id']}'"}, 404
+    panel, rotation_finder = created
+    if on_finder:
+        on_finder(rotation_finder)
+
+    # 调用我们的“大脑”来寻找最优解
+    best_rotation_info = rotation_search_call(params, panel, rotation_finder)()
+    return package_rotation_result(params, rotation_finder, best_rotation_info)
+
+def package_rotation_result(params: Dict, rotation_finder: RotationFinder, best_rotation_info: Dict | None) -> Tuple[Dict, int]:
+    """将搜索结果打包为响应数据，返回 (响应数据, HTTP状态码)。完整搜索 (未因预算提前结束) 的结果写入结果缓存。"""
+    character_id = params['character_id']
+    turns = params['turns']
+    if not best_rotation_info:
+        return {'error': f'在 {turns} 回合内未能为 {character_id} 找到任何可行的排轴。'}, 404
+
+    # 将找到的结果打包成与前端期望一致的格式
+    results = best_rotation_info['dpr_results']
+    response_data = {
+        'character_id': character_id,
+        'dpr': results['dpr'],
+        'total_damage': results['total_damage'],
+        'rotation': best_rotation_info['rotation'], # 使用找到的最优排轴
+        'targets': best_rotation_info['targets'],
+        'final_resources': results['final_state'].character_resources.get(character_id, {}),
+        'complete': not rotation_finder.budget_exhausted,
+        'nodes_explored': rotation_finder.nodes_explored,
+    }
+    if params['track_hp']:
+        response_data.update({key: results[key] for key in ('kills', 'time_to_kill', 'overkill')})
+        response_data['enemy_hp'] = {e.enemy_id: e.hp for e in results['final_state'].enemies.values()}
+    monte_carlo = params['monte_carlo']
+    if monte_carlo:
+        # 对找到的最优排轴做暴击采样，给出伤害分布和击杀概率
+        response_data['distribution'] = rotation_finder.dpr_calculator.simulate_damage_distribution(
+            best_rotation_info['actions'], params['initial_state'], monte_carlo['trials'], monte_carlo['seed']
+        )
+    if params['cache_key'] and response_data['complete']:
+        result_cache.put(params['cache_key'], response_data)
+    return response_data, 200
+
 @app.route('/find_best_rotation', methods=['POST'])
+@traceable
+@profileable
 def find_best_rotation():
     """
     处理【智能查找最优排轴】请求的全新API接口。
     """
-    print("收到智能排轴请求...")
-    if not loader:
+    logger.info("收到智能排轴请求...")
+    if not registry:
         return jsonify({'error': '服务器数据加载器未初始化。'}), 500
     
+    try:
+        try:
+            params = parse_rotation_search(request.get_json())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if params['cache_key']:
+            cached = result_cache.get(params['cache_key'])
+            if cached is not None:
+                return jsonify(cached)
+
+        response_data, status = run_rotation_search(params)
+        return jsonify(response_data), status
+
+    except Exception as e:
+        logger.exception("智能排轴请求处理失败")
+        return jsonify({'error': '服务器在智能分析过程中遇到内部错误。'}), 500
+
+def sse_event(event: str, data) -> str:
+    """格式化一条带事件类型的Server-Sent Events消息。"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/find_best_rotation/stream', methods=['POST'])
+def stream_best_rotation():
+    """
+    以Server-Sent Events的形式流式执行排轴搜索 (请求参数与 /find_best_rotation 相同)，推送以下事件:
+    - improved: 发现了更优的排轴 (DPR、排轴、目标、当时的节点数和已用时间)，搜索开始后立即推送一次贪心排轴;
+    - progress: 没有新的最优解时定期推送的进度 (见 RotationFinder.progress_snapshot);
+    - done: 最终结果，格式与 /find_best_rotation 的响应相同 ('complete' 为false表示因预算提前结束);
+    - error: 搜索失败。
+    客户端断开连接时搜索随之取消。同时进行的搜索数超过 STREAM_MAX_CONCURRENT 时返回429。
+    """
+    if not registry:
+        return jsonify({'error': '服务器数据加载器未初始化。'}), 500
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': '请求体必须是一个JSON对象。'}), 400
+    try:
+        try:
+            params = parse_rotation_search(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        cached = result_cache.get(params['cache_key']) if params['cache_key'] else None
+        if cached is not None:
+            return Response(sse_event('done', cached), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+        created = create_rotation_finder(params)
+        if created is None:
+            return jsonify({'error': f"无法加载角色 '{params['character_id']}'"}), 404
+        panel, rotation_finder = created
+    except Exception:
+        logger.exception("流式排轴请求处理失败")
+        return jsonify({'error': '服务器在智能分析过程中遇到内部错误。'}), 500
+
+    if not stream_slots.acquire(blocking=False):
+        return jsonify({'error': f"同时进行的流式搜索已达上限 ({STREAM_MAX_CONCURRENT})"}), 429
+
+    def generate():
+        for kind, payload in rotation_finder.iter_search(rotation_search_call(params, panel, rotation_finder)):
+            if kind == 'done':
+                response_data, status = package_rotation_result(params, rotation_finder, payload)
+                yield sse_event('done' if status == 200 else 'error', response_data)
+            elif kind == 'error':
+                logger.error("流式排轴搜索失败", exc_info=payload)
+                yield sse_event('error', {'error': '服务器在智能分析过程中遇到内部错误。'})
+            else:
+                yield sse_event(kind, payload)
+
+    # 响应关闭时释放名额 (生成器关闭时已经取消搜索并等待搜索线程退出；客户端在开始读取前断开时生成器从未运行)
+    response = Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    response.call_on_close(stream_slots.release)
+    return response
+
+@app.route('/jobs/find_best_rotation', methods=['POST'])
+def submit_rotation_job():
+    """
+    以异步任务的方式提交排轴搜索，立即返回任务ID (202)。
+    请求参数与 /find_best_rotation 相同；之后通过 /jobs/<job_id> 轮询进度和结果。
+    """
+    if not registry:
+        return jsonify({'error': '服务器数据加载器未初始化。'}), 500
+    try:
+        params = parse_rotation_search(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cached = result_cache.get(params['cache_key']) if params['cache_key'] else None
+    try:
+        if cached is not None:
+            job = job_manager.submit_completed('find_best_rotation', cached)
+        else:
+            job = job_manager.submit('find_best_rotation', lambda job: run_rotation_search(params, job.attach_finder))
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    return jsonify(job.to_dict()), 202
+
+def parse_team_search(data: Dict) -> Dict:
+    """
+    解析并校验团队排轴搜索请求的参数。参数不合法时抛出ValueError。
+    """
+    character_ids = data.get('character_ids')
+    if not character_ids or not isinstance(character_ids, list):
+        raise ValueError('character_ids 必须是非空的角色ID列表。')
+    if len(set(character_ids)) != len(character_ids):
+        raise ValueError('character_ids 中不能有重复的角色。')
+    rounds = int(data.get('rounds', 3))
+    if rounds < 1:
+        raise ValueError('回合数必须至少为1。')
+
+    initial_state = BattleState(
+        turn_number=1,
+        enemies=[Enemy("沙袋", 100000, 1200, {"诅咒": 0.1})],
+        character_resources={char_id: {"sp": 100, "h_energy": 0} for char_id in character_ids}
+    )
+
+    cache_key = None
+    if is_cacheable(data, None) and all(char_id in registry for char_id in character_ids):
+        cache_key = make_cache_key(
+            'find_best_team_rotation', character_ids, [registry.digest(char_id) for char_id in character_ids], rounds,
+            [dataclasses.asdict(e) for e in initial_state.enemies.values()],
+            initial_state.character_resources
+        )
+    return {
+        'character_ids': character_ids,
+        'rounds': rounds,
+        'initial_state': initial_state,
+        'cache_key': cache_key,
+    }
+
+def run_team_search(params: Dict, on_finder: Callable[[RotationFinder], None] | None = None) -> Tuple[Dict, int]:
+    """执行一次团队排轴搜索，返回 (响应数据, HTTP状态码)，成功的结果会写入结果缓存。"""
+    panels = []
+    for char_id in params['character_ids']:
+        panel = registry.load_character_panel(char_id)
+        if not panel:
+            return {'error': f"无法加载角色 '{char_id}'"}, 404
+        panels.append(panel)
+
+    simulator = BattleSimulator(panels)
+    team_finder = TeamRotationFinder(simulator, DprCalculator(simulator))
+    if on_finder:
+        on_finder(team_finder)
+    info = team_finder.find_best_team_rotation(params['initial_state'], params['rounds'], params['character_ids'])
+    if not info:
+        return {'error': '未能找到任何可行的团队排轴。'}, 404
+
+    results = info['dpr_results']
+    response_data = {
+        'character_ids': params['character_ids'],
+        'dpr': results['dpr'],
+        'total_damage': results['total_damage'],
+        'rotation': [{'character_id': a.character_id, 'skill': a.skill_used.name} for a in info['actions']],
+        'rounds': [[{'character_id': c, 'skill': skill} for c, skill in r] for r in info['rounds']],
+        'groups': info['groups'],
+        'final_resources': {
+            char_id: results['final_state'].character_resources.get(char_id, {}) for char_id in params['character_ids']
+        }
+    }
+    if params['cache_key']:
+        result_cache.put(params['cache_key'], response_data)
+    return response_data, 200
+
+@app.route('/find_best_team_rotation', methods=['POST'])
+@traceable
+@profileable
+def find_best_team_rotation():
+    """
+    处理【团队排轴】请求: 为多名角色搜索交错的行动顺序 (每回合每人行动一次)，使团队总伤害最高。
+    """
+    logger.info("收到团队排轴请求...")
+    if not registry:
+        return jsonify({'error': '服务器数据加载器未初始化。'}), 500
+
+    try:
+        try:
+            params = parse_team_search(request.get_json())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if params['cache_key']:
+            cached = result_cache.get(params['cache_key'])
+            if cached is not None:
+                return jsonify(cached)
+
+        response_data, status = run_team_search(params)
+        return jsonify(response_data), status
+
+    except Exception:
+        logger.exception("团队排轴请求处理失败")
+        return jsonify({'error': '服务器在团队排轴过程中遇到内部错误。'}), 500
+
+@app.route('/jobs/find_best_team_rotation', methods=['POST'])
+def submit_team_job():
+    """以异步任务的方式提交团队排轴搜索，请求参数与 /find_best_team_rotation 相同。"""
+    if not registry:
+        return jsonify({'error': '服务器数据加载器未初始化。'}), 500
+    try:
+        params = parse_team_search(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cached = result_cache.get(params['cache_key']) if params['cache_key'] else None
+    try:
+        if cached is not None:
+            job = job_manager.submit_completed('find_best_team_rotation', cached)
+        else:
+            job = job_manager.submit('find_best_team_rotation', lambda job: run_team_search(params, job.attach_finder))
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """返回任务的状态、搜索进度 (节点数、当前最优DPR、预计剩余时间) 以及完成后的结果。"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': f"任务 '{job_id}' 不存在"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job(job_id):
+    """以Server-Sent Events的形式持续推送任务状态，直到任务结束。"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': f"任务 '{job_id}' 不存在"}), 404
+
+    def generate():
+        while True:
+            snapshot = job.to_dict()
+            yield f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+            if snapshot['status'] in TERMINAL_STATUSES:
+                return
+            time.sleep(JOB_STREAM_INTERVAL_SECONDS)
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """取消任务。排队中的任务立即取消，运行中的任务会尽快停止搜索。"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': f"任务 '{job_id}' 不存在"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/optimize_build', methods=['POST'])
+@traceable
+@profileable
+def optimize_build():
+    """
+    处理【配装优化】请求的API接口。
+    在请求提供的武器和启示库存中，为指定排轴寻找DPR或评分最高的前N套配装。
+    """
+    logger.info("收到配装优化请求...")
+    if not registry:
+        return jsonify({'error': '服务器数据加载器未初始化。'}), 500
+
     try:
         data = request.get_json()
         character_id = data.get('character_id')
         turns = int(data.get('turns', 3))
+        top_n = int(data.get('top_n', 10))
+        objective = data.get('objective', 'dpr')
+        if objective not in OBJECTIVES:
+            return jsonify({'error': f"未知的优化目标 '{objective}'"}), 400
+        # 评分模型: 'default' 为手动设定的权重，'sensitivity' 为按当前面板和排轴计算的属性边际收益 (得分为属性的等价DPR价值，不含DPR本身)
+        scoring_model = data.get('scoring_model', 'default')
+        if scoring_model not in ('default', 'sensitivity'):
+            return jsonify({'error': f"未知的评分模型 '{scoring_model}'"}), 400
+        if top_n < 1:
+            return jsonify({'error': 'top_n 必须至少为1。'}), 400
 
-        panel = loader.load_character_panel(character_id)
+        panel = registry.load_character_panel(character_id)
         if not panel:
             return jsonify({'error': f"无法加载角色 '{character_id}'"}), 404
+        if not panel.skills:
+            return jsonify({'error': f"角色 '{character_id}' 没有技能"}), 400
 
-        # 每次请求都创建全新的实例
-        simulator = BattleSimulator([panel])
-        dpr_calculator = DprCalculator(simulator)
-        rotation_finder = RotationFinder(simulator, dpr_calculator)
+        # 解析库存；未提供时以角色当前的武器和启示作为唯一选择
+        inventory = data.get('inventory', {})
+        if not isinstance(inventory, dict):
+            return jsonify({'error': "'inventory' 必须是一个对象。"}), 400
+        try:
+            weapons = [DataLoader.parse_weapon(w) for w in inventory.get('weapons', [])]
+            revelations = [DataLoader.parse_revelation(r) for r in inventory.get('revelations', [])]
+        except (KeyError, TypeError) as e:
+            return jsonify({'error': f"库存数据格式错误: {e}"}), 400
+        if not revelations and 'revelations' not in inventory:
+            revelations = panel.revelations
+
+        # 排轴可以用技能名列表指定，默认与手动分析一致，重复使用第一个技能
+        skills_by_name = {skill.name: skill for skill in panel.skills}
+        skill_names = data.get('rotation') or [panel.skills[0].name] * turns
+        unknown = [name for name in skill_names if name not in skills_by_name]
+        if unknown:
+            return jsonify({'error': f"未知的技能: {unknown}"}), 400
 
-        # 定义一个更真实的初始状态用于智能查找
+        simulator = BattleSimulator([panel])
+        dummy_enemy = Enemy("沙袋", 100000, 1200, {"诅咒": 0.1})
         initial_state = BattleState(
             turn_number=1,
-            enemies=[Enemy("沙袋", 100000, 1200, {"诅咒": 0.1})],
-            character_resources={character_id: {"sp": 100, "h_energy": 0}}
+            enemies=[dummy_enemy],
+            character_resources={character_id: {"sp": 1000}}
         )
+        rotation = [Action(character_id, skills_by_name[name], dummy_enemy.enemy_id) for name in skill_names]
 
-        # 调用我们的“大脑”来寻找最优解
-        best_rotation_info = rotation_finder.find_best_rotation(
+        model = ScoringModel()
+        if scoring_model == 'sensitivity':
+            model = StatSensitivityAnalyzer(simulator).analyze(panel, rotation, initial_state).to_scoring_model()
+        optimizer = BuildOptimizer(simulator, Scorer(model))
+        builds = optimizer.optimize(
             character_panel=panel,
-            turns=turns,
-            initial_state=initial_state
+            weapons=weapons,
+            revelations=revelations,
+            rotation=rotation,
+            initial_state=initial_state,
+            top_n=top_n,
+            objective=objective
+        )
+
+        return jsonify({
+            'character_id': character_id,
+            'objective': objective,
+            'scoring_model': dataclasses.asdict(model),
+            'rotation': skill_names,
+            'evaluated': optimizer.evaluated,
+            'builds': builds
+        })
+
+    except Exception:
+        logger.exception("配装优化请求处理失败")
+        return jsonify({'error': '服务器在配装优化过程中遇到内部错误。'}), 500
+
+@app.route('/stat_priorities', methods=['POST'])
+@traceable
+@profileable
+def stat_priorities():
+    """
+    处理【属性优先级】请求的API接口。
+    计算角色在给定排轴下每个面板属性的DPR边际收益，返回属性优先级表和数据驱动的评分模型权重。
+    可选的 'increments' 用于覆盖优先级表中各属性的参考增量，如 {"attack": 50}。
+    """
+    logger.info("收到属性优先级请求...")
+    if not registry:
+        return jsonify({'error': '服务器数据加载器未初始化。'}), 500
+
+    try:
+        data = request.get_json()
+        character_id = data.get('character_id')
+        turns = int(data.get('turns', 3))
+        panel = registry.load_character_panel(character_id)
+        if not panel:
+            return jsonify({'error': f"无法加载角色 '{character_id}'"}), 404
+        if not panel.skills:
+            return jsonify({'error': f"角色 '{character_id}' 没有技能"}), 400
+
+        dummy_enemy = Enemy("沙袋", 100000, 1200, {"诅咒": 0.1})
+        initial_state = BattleState(
+            turn_number=1,
+            enemies=[dummy_enemy],
+            character_resources={character_id: {"sp": 1000}}
         )
+        skill_names = data.get('rotation') or [panel.skills[0].name] * turns
+        try:
+            rotation = resolve_rotation(panel, skill_names, dummy_enemy.enemy_id)
+            analyzer = StatSensitivityAnalyzer(BattleSimulator([panel]), data.get('increments'))
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        report = analyzer.analyze(panel, rotation, initial_state)
+        return jsonify({**report.to_dict(), 'rotation': skill_names})
+
+    except Exception:
+        logger.exception("属性优先级请求处理失败")
+        return jsonify({'error': '服务器在计算属性优先级时遇到内部错误。'}), 500
+
+def parse_grid_axis(value, name: str) -> List[float]:
+    """
+    解析网格的一个坐标轴: 单个数值、数值列表或 {"start": 0, "stop": 0.5, "step": 0.01} (包含终点)。
+    格式不合法时抛出ValueError。
+    """
+    if isinstance(value, dict):
+        try:
+            start, stop, step = float(value['start']), float(value['stop']), float(value['step'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"'{name}' 的范围需要数值型的 start、stop 和 step。")
+        if step <= 0 or stop < start:
+            raise ValueError(f"'{name}' 的范围不合法。")
+        count = int(round((stop - start) / step)) + 1
+        if count > MAX_DEFENSE_GRID_POINTS:
+            raise ValueError(f"'{name}' 的取值过多。")
+        return [round(start + i * step, 10) for i in range(count)]
+    values = value if isinstance(value, list) else [value]
+    try:
+        values = [float(v) for v in values]
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' 必须是数值、数值列表或范围。")
+    if not all(math.isfinite(v) for v in values):
+        raise ValueError(f"'{name}' 必须是有限的数值。")
+    if not values:
+        raise ValueError(f"'{name}' 不能为空。")
+    return values
+
+@app.route('/defense_efficiency', methods=['POST'])
+def defense_efficiency_grid():
+    """
+    处理【穿透/减防收益】请求的API接口 (网页工具 calculateTotals / calculateNeededValues 的服务端版本)。
+    在 (Boss防御系数, 穿透, 减防) 网格上一次性计算伤害提升曲线和还需穿透/减防的曲面，
+    返回的数组按 [防御系数][穿透][减防] 嵌套。所有数值均为小数 (30% 记为 0.3)。
+    可选的 'team' 用于按队伍配置计算当前的穿透/减防合计 (见 defense_efficiency.calculate_totals)。
+    """
+    data = request.get_json(silent=True) or {}
+    boss = data.get('boss')
+    defense = data.get('defense')
+    def_coeff = data.get('def_coeff')
+    if boss is not None:
+        if boss not in defense_efficiency.BOSS_PRESETS:
+            return jsonify({'error': f"未知的Boss '{boss}'"}), 400
+        preset_defense, preset_coeff = defense_efficiency.BOSS_PRESETS[boss]
+        defense = preset_defense if defense is None else defense
+        def_coeff = preset_coeff if def_coeff is None else def_coeff
+    if def_coeff is None:
+        return jsonify({'error': "需要提供 'boss' 或 'def_coeff'。"}), 400
 
-        if not best_rotation_info:
-            return jsonify({'error': f'在 {turns} 回合内未能为 {character_id} 找到任何可行的排轴。'}), 404
+    try:
+        coeffs = parse_grid_axis(def_coeff, 'def_coeff')
+        penetrations = parse_grid_axis(data.get('penetration', DEFAULT_DEFENSE_AXIS), 'penetration')
+        reductions = parse_grid_axis(data.get('reduction', DEFAULT_DEFENSE_AXIS), 'reduction')
+        defense = float(defense) if defense is not None else None
+        team = data.get('team')
+        if team is not None and not isinstance(team, dict):
+            raise ValueError("'team' 必须是一个对象。")
+        totals = defense_efficiency.calculate_totals(**team) if team is not None else None
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    if len(coeffs) * len(penetrations) * len(reductions) > MAX_DEFENSE_GRID_POINTS:
+        return jsonify({'error': f"网格点数不能超过 {MAX_DEFENSE_GRID_POINTS}。"}), 400
 
-        # 将找到的结果打包成与前端期望一致的格式
-        results = best_rotation_info['dpr_results']
+    try:
+        # 减防超过100%时引擎模型的伤害提升为无穷大，非有限值以null返回 (JSON不支持Infinity)
+        grid = defense_efficiency.evaluate_grid(coeffs, penetrations, reductions, defense)
         response_data = {
-            'character_id': character_id,
-            'dpr': results['dpr'],
-            'total_damage': results['total_damage'],
-            'rotation': best_rotation_info['rotation'], # 使用找到的最优排轴
-            'final_resources': results['final_state'].character_resources.get(character_id, {})
+            'boss': boss,
+            'defense': defense,
+            'def_coeff': coeffs,
+            'penetration': penetrations,
+            'reduction': reductions,
+            **{name: defense_efficiency.to_json_list(values) for name, values in grid.items()},
         }
+        if totals is not None:
+            current = defense_efficiency.evaluate_grid(coeffs, [totals.penetration], [totals.reduction], defense)
+            response_data['totals'] = dataclasses.asdict(totals)
+            response_data['current'] = {name: defense_efficiency.to_json_list(values[:, 0, 0]) for name, values in current.items()}
         return jsonify(response_data)
+    except Exception:
+        logger.exception("穿透/减防收益请求处理失败")
+        return jsonify({'error': '服务器在计算穿透/减防收益时遇到内部错误。'}), 500
 
-    except Exception as e:
-        traceback.print_exc()
-        return jsonify({'error': '服务器在智能分析过程中遇到内部错误。'}), 500
+def parse_finite_number(value, name: str) -> float:
+    """把请求中的一个数值转换为float，不是有限的数值 (如NaN、Infinity) 时抛出ValueError。"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' 必须是数值。")
+    if not math.isfinite(number):
+        raise ValueError(f"'{name}' 必须是有限的数值。")
+    return number
+
+def parse_breakpoint_profile(data: Dict) -> Tuple[str | None, EnemyProfile]:
+    """
+    从请求中解析断点表的敌人配置: 'boss' (预设名称) 或
+    'enemy': {"defense": 1200, "def_coeff": 1.0, "resistances": {"诅咒": 0.1}, "weakness_multiplier": 1.0}。
+    格式不合法时抛出ValueError。
+    """
+    boss = data.get('boss')
+    if boss is not None:
+        if boss not in BOSS_BREAKPOINT_PROFILES:
+            raise ValueError(f"未知的Boss '{boss}'")
+        return boss, BOSS_BREAKPOINT_PROFILES[boss]
+    enemy = data.get('enemy')
+    if not isinstance(enemy, dict) or 'defense' not in enemy:
+        raise ValueError("需要提供 'boss' 或包含 'defense' 的 'enemy'。")
+    try:
+        resistances = {str(k): parse_finite_number(v, f'resistances.{k}') for k, v in (enemy.get('resistances') or {}).items()}
+        return None, EnemyProfile(
+            parse_finite_number(enemy['defense'], 'defense'),
+            parse_finite_number(enemy.get('def_coeff', EnemyProfile.def_coeff), 'def_coeff'),
+            tuple(sorted(resistances.items())),
+            parse_finite_number(enemy.get('weakness_multiplier', 1.0), 'weakness_multiplier'),
+        )
+    except (AttributeError, TypeError) as e:
+        raise ValueError(f"敌人参数格式错误: {e}")
+
+@app.route('/breakpoints', methods=['GET'])
+def breakpoint_stats():
+    """返回已构建的断点表数量和可直接查询的Boss预设。"""
+    return jsonify({'tables': len(breakpoint_index), 'bosses': list(BOSS_BREAKPOINT_PROFILES),
+                    'cache_path': breakpoint_index.cache_path})
+
+@app.route('/breakpoints', methods=['POST'])
+def query_breakpoints():
+    """
+    处理【属性断点】查询的API接口: 在预计算的断点表上以O(1)插值查询，不再逐次从头计算防御公式。
+    给定当前的穿透和减防 (小数，默认为0)，返回防御承伤系数、敌人侧总乘数 (可选 'damage_type' 和 'vulnerability')
+    和相对于无穿透、无减防的伤害提升；给定 'targets' (目标伤害提升，格式同网格坐标轴) 时，
+    返回在当前减防下还需的穿透、在当前穿透下还需的减防 (单靠这一项无法达到时为null)。
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        boss, profile = parse_breakpoint_profile(data)
+        penetration = parse_finite_number(data.get('penetration', 0.0), 'penetration')
+        reduction = parse_finite_number(data.get('reduction', 0.0), 'reduction')
+        vulnerability = parse_finite_number(data.get('vulnerability', 0.0), 'vulnerability')
+        targets = parse_grid_axis(data['targets'], 'targets') if 'targets' in data else []
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    # 减防达到100%时防御被降为负无穷，引擎模型的承伤系数为无穷大，没有可查询的断点
+    if not 0.0 <= penetration <= 1.0 or not 0.0 <= reduction < 1.0:
+        return jsonify({'error': "'penetration' 必须在 [0, 1] 内，'reduction' 必须在 [0, 1) 内。"}), 400
+    if vulnerability <= -1.0:
+        return jsonify({'error': "'vulnerability' 必须大于 -1。"}), 400
+    if len(targets) > MAX_BREAKPOINT_TARGETS:
+        return jsonify({'error': f"'targets' 不能超过 {MAX_BREAKPOINT_TARGETS} 个。"}), 400
+
+    try:
+        # 预设在启动时已构建；自定义敌人的表在首次查询时构建并加入索引
+        table = breakpoint_index.table(profile)
+        # 非有限值以null返回 (JSON不支持Infinity/NaN)，无法达到的断点同样为null
+        to_json = defense_efficiency.to_json_list
+        needed_penetration = to_json([table.needed_penetration(target, reduction) for target in targets])
+        needed_reduction = to_json([table.needed_reduction(target, penetration) for target in targets])
+        return jsonify({
+            'boss': boss,
+            'profile': {**dataclasses.asdict(profile), 'resistances': dict(profile.resistances)},
+            'penetration': penetration,
+            'reduction': reduction,
+            'defense_multiplier': to_json(table.defense_multiplier(penetration, reduction)),
+            'multiplier': to_json(table.multiplier(penetration, reduction, data.get('damage_type'), vulnerability)),
+            'damage_increase': to_json(table.damage_increase(penetration, reduction)),
+            'max_damage_increase': to_json(table.max_gain),
+            'breakpoints': [
+                {'damage_increase': target, 'needed_penetration': pen, 'needed_reduction': red}
+                for target, pen, red in zip(targets, needed_penetration, needed_reduction)
+            ],
+        })
+    except Exception:
+        logger.exception("属性断点查询处理失败")
+        return jsonify({'error': '服务器在查询属性断点时遇到内部错误。'}), 500
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """返回结果缓存的命中/未命中等统计信息。"""
+    return jsonify(result_cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """以Prometheus文本格式导出指标: 模拟器各阶段的计数和耗时、HTTP请求计数、结果缓存和任务队列统计。"""
+    cache = result_cache.stats()
+    jobs = job_manager.stats()
+    extra = [
+        ("p5x_result_cache_hits_total", "counter", "结果缓存命中次数。", [({}, cache['hits'])]),
+        ("p5x_result_cache_misses_total", "counter", "结果缓存未命中次数。", [({}, cache['misses'])]),
+        ("p5x_result_cache_evictions_total", "counter", "结果缓存淘汰次数。", [({}, cache['evictions'])]),
+        ("p5x_result_cache_entries", "gauge", "结果缓存当前的条目数。", [({}, cache['entries'])]),
+        ("p5x_result_cache_bytes", "gauge", "结果缓存当前的大小(字节)。", [({}, cache['bytes'])]),
+        ("p5x_jobs", "gauge", "各状态的异步任务数。", [({'status': status}, n) for status, n in jobs['jobs'].items()]),
+        ("p5x_breakpoint_tables", "gauge", "已构建的属性断点表数量。", [({}, len(breakpoint_index))]),
+    ]
+    return Response(metrics_registry.render_prometheus(extra), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/jobs', methods=['GET'])
+def job_stats():
+    """返回任务队列中各状态的任务数量。"""
+    return jsonify(job_manager.stats())
 
 # --- 应用启动 ---
 if __name__ == '__main__':
@@ -0,0 +1,197 @@
+# batch_analysis.py
+"""
+批量手动分析: 一次请求评估多个 (角色, 排轴, 敌人) 任务。
+
+- 角色面板直接取自预加载的面板注册表，同一批次中每个角色的模拟器 (及其编译好的规则) 和DPR计算器只构建一次;
+- 角色、敌人和初始资源都相同的任务合并为一组，组内的排轴通过前缀树评估器一起计算，共享的前缀只模拟一次;
+- 各组在线程池中并发执行，结果按完成顺序逐个产出，便于以NDJSON的形式流式返回。
+"""
+import math
+from concurrent.futures import Executor, as_completed
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Iterator, List, Tuple
+
+from dpr_calculator import DprCalculator
+from models import BattleState, Enemy, Action, CharacterPanel
+from panel_registry import PanelRegistry
+from simulator import BattleSimulator
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 任务未指定时使用的默认值 (与 /analyze 一致)
+DEFAULT_TURNS = 3
+DEFAULT_SP = 1000
+DEFAULT_ENEMY = {"enemy_id": "沙袋", "hp": 100000, "defense": 1200, "resistances": {"诅咒": 0.1}}
+# 单个任务的回合数和排轴长度上限 (/analyze 使用同样的上限)
+MAX_TURNS = 100
+MAX_ROTATION_LENGTH = 100
+# 敌人的数值字段
+ENEMY_NUMBER_FIELDS = ("hp", "defense", "defense_reduction", "vulnerability", "weakness_multiplier")
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def parse_enemy(spec: Any) -> Enemy:
+    """
+    解析并校验一个敌人: {"enemy_id": "沙袋", "hp": 100000, "defense": 1200, "resistances": {"诅咒": 0.1}, ...}。
+    enemy_id 必须是字符串，数值字段必须是有限的数字，resistances 必须是 属性 -> 数字 的对象。
+    格式不合法时抛出ValueError。
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("敌人必须是一个对象。")
+    try:
+        enemy = Enemy(**spec)
+    except TypeError as e:
+        raise ValueError(f"敌人参数格式错误: {e}")
+    if not isinstance(enemy.enemy_id, str):
+        raise ValueError("敌人的 'enemy_id' 必须是字符串。")
+    for name in ENEMY_NUMBER_FIELDS:
+        if not _is_number(getattr(enemy, name)):
+            raise ValueError(f"敌人的 '{name}' 必须是数字。")
+    resistances = enemy.resistances
+    if not isinstance(resistances, dict) or not all(
+        isinstance(element, str) and _is_number(value) for element, value in resistances.items()
+    ):
+        raise ValueError("敌人的 'resistances' 必须是 属性 -> 数字 的对象。")
+    return enemy
+
+def resolve_rotation(panel: CharacterPanel, names: List[str], target_id: str) -> List[Action]:
+    """将技能名称列表转换为行动列表，技能不存在时抛出ValueError。"""
+    skills = {}
+    for skill in panel.skills:
+        skills.setdefault(skill.name, skill)
+    unknown = [name for name in names if name not in skills]
+    if unknown:
+        raise ValueError(f"角色 '{panel.character_id}' 没有这些技能: {unknown}")
+    return [Action(panel.character_id, skills[name], target_id) for name in names]
+
+@dataclass
+class BatchJob:
+    """批量分析中的一个任务。"""
+    index: int # 任务在请求中的下标
+    character_id: str
+    rotation: List[str] | None # 技能名称列表，None表示使用默认排轴 (第一个技能 × turns)
+    turns: int
+    enemy: Enemy
+    sp: int
+    tag: Any = None # 客户端提供的任务标识，原样返回
+    actions: List[Action] = field(default_factory=list, repr=False) # 解析后的行动列表 (prepare之后)
+
+    def initial_state(self) -> BattleState:
+        return BattleState(
+            turn_number=1,
+            enemies=[replace(self.enemy, resistances=dict(self.enemy.resistances))],
+            character_resources={self.character_id: {"sp": self.sp}}
+        )
+
+    def group_key(self) -> Tuple:
+        """角色、敌人和初始资源都相同的任务可以共享同一个前缀树。"""
+        enemy = self.enemy
+        return (self.character_id, enemy.enemy_id, enemy.hp, enemy.defense, tuple(sorted(enemy.resistances.items())),
+                enemy.defense_reduction, enemy.vulnerability, enemy.weakness_multiplier, self.sp)
+
+    def header(self) -> Dict[str, Any]:
+        """每条结果都带有的任务标识字段。"""
+        data = {"index": self.index, "character_id": self.character_id}
+        if self.tag is not None:
+            data["id"] = self.tag
+        return data
+
+def parse_batch_job(index: int, spec: Dict[str, Any]) -> BatchJob:
+    """
+    解析一个任务:
+    {"character_id": "Joker", "rotation": ["技能A", "技能B"], "turns": 3,
+     "enemy": {"enemy_id": "沙袋", "hp": 100000, "defense": 1200, "resistances": {"诅咒": 0.1}},
+     "sp": 1000, "id": "客户端标识"}
+    除 character_id 外均可省略。格式不合法时抛出ValueError。
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("任务必须是一个对象。")
+    character_id = spec.get('character_id')
+    if not isinstance(character_id, str):
+        raise ValueError("任务缺少 'character_id'。")
+    rotation = spec.get('rotation')
+    if rotation is not None and (not isinstance(rotation, list) or not all(isinstance(n, str) for n in rotation)):
+        raise ValueError("'rotation' 必须是技能名称的列表。")
+    if rotation is not None and len(rotation) > MAX_ROTATION_LENGTH:
+        raise ValueError(f"排轴最多包含 {MAX_ROTATION_LENGTH} 个技能。")
+    enemy_spec = spec.get('enemy', {})
+    if not isinstance(enemy_spec, dict):
+        raise ValueError("'enemy' 必须是一个对象。")
+    try:
+        turns = int(spec.get('turns', DEFAULT_TURNS))
+        sp = int(spec.get('sp', DEFAULT_SP))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"任务参数格式错误: {e}")
+    enemy = parse_enemy({**DEFAULT_ENEMY, **enemy_spec})
+    if not 0 <= turns <= MAX_TURNS:
+        raise ValueError(f"'turns' 必须在 0 到 {MAX_TURNS} 之间。")
+    return BatchJob(index, character_id, rotation, turns, enemy, sp, tag=spec.get('id'))
+
+class BatchAnalysis:
+    """
+    一个批次的共享上下文: 按角色缓存面板、模拟器和DPR计算器，并负责分组执行任务。
+    prepare() 在请求线程中调用 (加载面板、解析排轴)，run() 把任务组提交到线程池。
+    """
+    def __init__(self, registry: PanelRegistry):
+        self.registry = registry
+        self._contexts: Dict[str, Tuple[CharacterPanel, DprCalculator] | None] = {}
+
+    def _context(self, character_id: str) -> Tuple[CharacterPanel, DprCalculator] | None:
+        """[内部辅助方法] 返回角色的 (面板, DPR计算器)，每个角色只构建一次；角色无法加载时返回None。"""
+        if character_id not in self._contexts:
+            panel = self.registry.load_character_panel(character_id)
+            self._contexts[character_id] = (panel, DprCalculator(BattleSimulator([panel]))) if panel else None
+        return self._contexts[character_id]
+
+    def prepare(self, job: BatchJob):
+        """加载任务的角色并解析排轴 (填充 job.actions 和 job.rotation)。无法执行时抛出ValueError。"""
+        context = self._context(job.character_id)
+        if context is None:
+            raise ValueError(f"无法加载角色 '{job.character_id}'")
+        panel, _ = context
+        if job.rotation is None:
+            if not panel.skills:
+                raise ValueError(f"角色 '{job.character_id}' 没有技能")
+            job.rotation = [panel.skills[0].name] * job.turns
+        job.actions = resolve_rotation(panel, job.rotation, job.enemy.enemy_id)
+
+    def _evaluate_group(self, jobs: List[BatchJob]) -> List[Dict[str, Any]]:
+        """[内部辅助方法] 在工作线程中评估一组共享初始状态的任务。"""
+        character_id = jobs[0].character_id
+        _, dpr_calculator = self._contexts[character_id]
+        results = dpr_calculator.calculate_batch_dpr([job.actions for job in jobs], jobs[0].initial_state())
+        return [
+            {
+                **job.header(),
+                "rotation": job.rotation,
+                "dpr": result["dpr"],
+                "total_damage": result["total_damage"],
+                "final_resources": result["final_state"].character_resources.get(character_id, {}),
+            }
+            for job, result in zip(jobs, results)
+        ]
+
+    def run(self, jobs: List[BatchJob], executor: Executor) -> Iterator[Tuple[BatchJob, Dict[str, Any]]]:
+        """
+        并发执行已准备好的任务，按组完成的顺序产出 (任务, 结果)。
+        评估失败的组，其中每个任务产出一条错误结果。生成器提前关闭时取消尚未开始的组。
+        """
+        groups: Dict[Tuple, List[BatchJob]] = {}
+        for job in jobs:
+            groups.setdefault(job.group_key(), []).append(job)
+        futures = {executor.submit(self._evaluate_group, group): group for group in groups.values()}
+        logger.info("批量分析: %d 个任务合并为 %d 组并发执行。", len(jobs), len(groups))
+        try:
+            for future in as_completed(futures):
+                group = futures[future]
+                try:
+                    results = future.result()
+                except Exception:
+                    logger.exception("批量分析任务组执行失败")
+                    results = [{**job.header(), "error": "服务器在执行任务时遇到内部错误。"} for job in group]
+                yield from zip(group, results)
+        finally:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,97 @@
+# benchmarks/bench_process_action.py
+"""
+BattleSimulator.process_action 单次行动开销的微基准测试。
+
+对比两种状态派生方式:
+  - deepcopy: 旧实现，每次行动都深度复制整个BattleState
+  - fork:     写时复制实现，只复制被修改的子容器
+另外给出开启分阶段计时 (BattleSimulator.enable_metrics) 后的单次行动开销，以及各阶段的耗时分布。
+
+用法: python benchmarks/bench_process_action.py [--actions N] [--enemies N] [--buffs N]
+"""
+import argparse
+import contextlib
+import copy
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from models import BattleState, Enemy, Action, Buff
+from data_loader import DataLoader
+from simulator import BattleSimulator
+from profiling import SimulatorMetrics
+
+DATA_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'character_data.json')
+
+def build_state(num_enemies: int, num_buffs: int) -> BattleState:
+    """构造一个带有多个敌人和Buff的战斗状态，模拟真实战斗中较“重”的状态。"""
+    enemies = [Enemy(f"敌人{i}", 100000, 1200, {"诅咒": 0.1, "火焰": 0.2}) for i in range(num_enemies)]
+    filler_buffs = {b.buff_id: b for b in (Buff(name=f"占位Buff{i}", duration=3) for i in range(num_buffs))}
+    return BattleState(
+        turn_number=1,
+        enemies=enemies,
+        character_buffs={"Joker": dict(filler_buffs), "Li Yaoling": dict(filler_buffs)},
+        enemy_debuffs={e.enemy_id: dict(filler_buffs) for e in enemies},
+        character_resources={"Joker": {"sp": 10 ** 9, "h_energy": 0}, "Li Yaoling": {"sp": 10 ** 9}},
+    )
+
+def time_actions(simulator: BattleSimulator, state: BattleState, actions, num_actions: int) -> float:
+    """依次执行num_actions个行动，返回每次行动的平均耗时(微秒)。"""
+    start = time.perf_counter()
+    for i in range(num_actions):
+        _, state = simulator.process_action(state, actions[i % len(actions)])
+    return (time.perf_counter() - start) / num_actions * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--actions', type=int, default=20000, help='执行的行动次数')
+    parser.add_argument('--enemies', type=int, default=5, help='战场上的敌人数量')
+    parser.add_argument('--buffs', type=int, default=10, help='每个角色/敌人身上的占位Buff数量')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader = DataLoader(DATA_FILE_PATH)
+        joker = loader.load_character_panel("Joker")
+        li_yaoling = loader.load_character_panel("Li Yaoling")
+        simulator = BattleSimulator([joker, li_yaoling])
+
+    state = build_state(args.enemies, args.buffs)
+    target_id = next(iter(state.enemies))
+    actions = [
+        Action("Li Yaoling", li_yaoling.skills[0], "Joker"),
+        Action("Joker", joker.skills[0], target_id),
+        Action("Joker", joker.skills[1], target_id),
+    ]
+
+    results = {}
+    for label, fork in (("deepcopy", copy.deepcopy), ("fork", None)):
+        # 模拟器通过实例属性 _fork 派生新状态，这里在实例上临时替换为深度复制
+        if fork is not None:
+            simulator._fork = fork
+        try:
+            # 模拟器内部仍有大量控制台输出，这里将其丢弃，只测量计算本身
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[label] = time_actions(simulator, state, actions, args.actions)
+        finally:
+            simulator.__dict__.pop("_fork", None)
+
+    metrics = SimulatorMetrics()
+    instrumented = BattleSimulator([joker, li_yaoling])
+    instrumented.enable_metrics(metrics)
+    with contextlib.redirect_stdout(io.StringIO()):
+        metered = time_actions(instrumented, state, actions, args.actions)
+
+    print(f"process_action 单次行动开销 ({args.actions} 次行动, {args.enemies} 个敌人, 每个单位 {args.buffs} 个Buff):")
+    for label, micros in results.items():
+        print(f"  {label:<10} {micros:8.2f} µs/行动")
+    print(f"  加速比     {results['deepcopy'] / results['fork']:8.2f}x")
+    print(f"  fork+计量   {metered:8.2f} µs/行动")
+    for phase, entry in metrics.to_dict().items():
+        if "seconds" in entry:
+            print(f"    {phase:<16} {entry['calls']:8d} 次  {entry['mean_us']:8.2f} µs/次")
+
+if __name__ == '__main__':
+    main()
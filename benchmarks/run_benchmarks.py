@@ -0,0 +1,283 @@
+# benchmarks/run_benchmarks.py
+"""
+模拟器、排轴搜索、伤害公式和API接口的基准测试套件，结果以JSON格式输出，便于比较不同版本。
+
+测量项目:
+  process_action   - BattleSimulator.process_action 每秒执行的行动数
+  rotation_finder  - find_best_rotation 在不同回合数和搜索模式下的耗时、访问节点数和每秒节点数
+  damage_kernel    - calculate_expected_damage (单次) 和 calculate_expected_damage_batch (批量) 每秒评估次数
+  endpoints        - 通过Flask测试客户端调用各接口的端到端延迟 (未命中缓存 / 命中缓存)
+  data_loading     - 面板注册表从JSON文件和列式角色数据库启动的耗时、内存峰值，以及数据库首次查找一个角色的延迟
+
+所有测量都使用合成角色 (技能数量由 --skills 指定)，不依赖数据文件中的具体角色。
+
+用法:
+  python benchmarks/run_benchmarks.py [--skills 3] [--turns 4-10] [--output results.json]
+  python benchmarks/run_benchmarks.py --compare baseline.json   # 与之前的结果比较
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from calculator import calculate_expected_damage, calculate_expected_damage_batch
+from character_store import convert_json
+from dpr_calculator import DprCalculator
+from models import BattleState, Enemy, Action
+from panel_registry import PanelRegistry
+from rotation_finder import RotationFinder
+from simulator import BattleSimulator
+from synthetic import synthetic_character_data, synthetic_panel
+from tracing import LOG_LEVEL_ENV, configure_logging
+
+SYNTHETIC_ID = "合成角色"
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+def make_state(character_id: str, sp: int) -> BattleState:
+    """构造基准测试使用的初始战斗状态。"""
+    return BattleState(
+        turn_number=1,
+        enemies=[Enemy("沙袋", 100000, 1200, {"诅咒": 0.1})],
+        character_resources={character_id: {"sp": sp, "h_energy": 0}}
+    )
+
+def bench_process_action(num_skills: int, num_actions: int) -> dict:
+    """测量 process_action 的吞吐量 (按技能顺序循环出招，SP充足)。"""
+    panel = synthetic_panel(SYNTHETIC_ID, num_skills)
+    simulator = BattleSimulator([panel])
+    state = make_state(SYNTHETIC_ID, 10 ** 9)
+    actions = [Action(SYNTHETIC_ID, skill, "沙袋") for skill in panel.skills]
+    start = time.perf_counter()
+    for i in range(num_actions):
+        _, state = simulator.process_action(state, actions[i % len(actions)])
+    elapsed = time.perf_counter() - start
+    return {"actions": num_actions, "seconds": elapsed, "actions_per_sec": num_actions / elapsed}
+
+def bench_rotation_finder(num_skills: int, turns_range: range, modes: list, max_exhaustive_turns: int, sp: int) -> list:
+    """测量 find_best_rotation 在每个回合数和搜索模式下的耗时和节点吞吐量。"""
+    panel = synthetic_panel(SYNTHETIC_ID, num_skills)
+    results = []
+    for mode in modes:
+        for turns in turns_range:
+            if mode == "exhaustive" and turns > max_exhaustive_turns:
+                continue
+            simulator = BattleSimulator([panel])
+            finder = RotationFinder(simulator, DprCalculator(simulator))
+            start = time.perf_counter()
+            info = finder.find_best_rotation(panel, turns, make_state(SYNTHETIC_ID, sp), search_mode=mode)
+            elapsed = time.perf_counter() - start
+            results.append({
+                "mode": mode,
+                "turns": turns,
+                "seconds": elapsed,
+                "nodes": finder.nodes_explored,
+                "nodes_per_sec": finder.nodes_explored / elapsed if elapsed else None,
+                "best_dpr": info["dpr_results"]["dpr"] if info else None,
+            })
+    return results
+
+def bench_damage_kernel(num_evals: int, batch_size: int) -> dict:
+    """测量伤害公式的单次和批量评估吞吐量。"""
+    panel = synthetic_panel(SYNTHETIC_ID, 2)
+    stats = panel.get_final_stats()
+    skill = panel.skills[0]
+    enemy = Enemy("沙袋", 100000, 1200, {"诅咒": 0.1})
+
+    start = time.perf_counter()
+    for _ in range(num_evals):
+        calculate_expected_damage(stats, skill, enemy)
+    scalar_elapsed = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    attack = rng.uniform(500, 3000, batch_size)
+    crit_rate = rng.uniform(0, 1, batch_size)
+    repeats = max(1, num_evals // batch_size)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        calculate_expected_damage_batch(
+            attack, crit_rate, 0.5, 0.1, 0.1, 0.0, enemy.defense, 0.0, 0.1, multiplier=skill.multiplier
+        )
+    batch_elapsed = time.perf_counter() - start
+    return {
+        "scalar_evals_per_sec": num_evals / scalar_elapsed,
+        "batch_size": batch_size,
+        "batch_evals_per_sec": repeats * batch_size / batch_elapsed,
+    }
+
+def bench_endpoints(num_skills: int, turns: int, repeats: int) -> dict:
+    """
+    通过Flask测试客户端测量接口的端到端延迟。
+    合成角色被注册到应用的面板注册表中 (只在内存中，不修改数据文件)。
+    每个接口分别测量清空结果缓存后的延迟 (cold) 和命中缓存的延迟 (warm)，单位为毫秒。
+    """
+    import app as app_module
+    app_module.registry.register(SYNTHETIC_ID, synthetic_character_data(num_skills))
+    client = app_module.app.test_client()
+    requests_to_time = {
+        "analyze": ("/analyze", {"character_id": SYNTHETIC_ID, "turns": turns}),
+        "find_best_rotation": ("/find_best_rotation", {"character_id": SYNTHETIC_ID, "turns": turns}),
+        "analyze_monte_carlo": ("/analyze", {"character_id": SYNTHETIC_ID, "turns": turns,
+                                             "monte_carlo": {"trials": 10000, "seed": 1}}),
+        "analyze_batch": ("/analyze_batch", {"jobs": [
+            {"character_id": SYNTHETIC_ID, "turns": turns, "sp": 100 + 50 * (i % 4), "id": i} for i in range(16)
+        ]}),
+    }
+    results = {}
+    try:
+        for name, (url, body) in requests_to_time.items():
+            timings = {"cold": [], "warm": []}
+            for _ in range(repeats):
+                for phase in ("cold", "warm"):
+                    if phase == "cold":
+                        app_module.result_cache.clear()
+                    start = time.perf_counter()
+                    response = client.post(url, json=body)
+                    response.get_data() # 流式响应需要读完整个响应体
+                    timings[phase].append((time.perf_counter() - start) * 1000)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"{url} 返回了 {response.status_code}: {response.get_json()}")
+            results[name] = {
+                phase: {"median_ms": statistics.median(values), "min_ms": min(values), "max_ms": max(values)}
+                for phase, values in timings.items()
+            }
+    finally:
+        app_module.registry.unregister(SYNTHETIC_ID)
+        app_module.result_cache.clear()
+        app_module.job_manager.shutdown()
+    return results
+
+def bench_data_loading(num_characters: int, num_skills: int) -> dict:
+    """
+    测量面板注册表的启动开销: 把 num_characters 个合成角色分别写成JSON文件和角色数据库，
+    各自构建注册表并记录耗时和内存峰值 (tracemalloc)，再测量数据库首次查找一个角色的延迟 (毫秒)。
+    """
+    raw_data = {f"{SYNTHETIC_ID}{i}": synthetic_character_data(num_skills) for i in range(num_characters)}
+    results = {"characters": num_characters}
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "characters.json")
+        store_path = os.path.join(directory, "characters.p5xdb")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(raw_data, f, ensure_ascii=False)
+        convert_json(json_path, store_path)
+        for name, path in (("json", json_path), ("store", store_path)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            registry = PanelRegistry(path)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[name] = {"startup_ms": elapsed * 1000, "peak_bytes": peak}
+        start = time.perf_counter()
+        registry.get(f"{SYNTHETIC_ID}{num_characters // 2}")
+        results["store"]["first_lookup_ms"] = (time.perf_counter() - start) * 1000
+        registry.snapshot.panels.store.close()
+    return results
+
+def metadata(args) -> dict:
+    """运行环境信息，便于判断两次结果是否可比。"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "args": vars(args),
+    }
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """将嵌套的结果展平为 {路径: 数值}，用于比较两次运行。"""
+    flat = {}
+    if isinstance(results, dict):
+        items = results.items()
+    elif isinstance(results, list):
+        # 排轴搜索的结果按 (模式, 回合数) 标识，其余列表按下标
+        items = ((f"{item['mode']}@{item['turns']}" if isinstance(item, dict) and "mode" in item else str(i), item)
+                 for i, item in enumerate(results))
+    else:
+        return {prefix: results} if isinstance(results, (int, float)) and not isinstance(results, bool) else {}
+    for key, value in items:
+        flat.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+    return flat
+
+def compare(baseline: dict, current: dict):
+    """打印当前结果相对基准结果的变化 (只比较两者都有的数值指标)。"""
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    print(f"与基准 {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}) 比较:", file=sys.stderr)
+    for key in sorted(old.keys() & new.keys()):
+        if old[key]:
+            print(f"  {key:<55} {old[key]:>14.4g} -> {new[key]:>14.4g}  ({new[key] / old[key] - 1:+.1%})", file=sys.stderr)
+
+def parse_range(text: str) -> range:
+    """解析 '4-10' 或 '6' 形式的回合数范围。"""
+    low, _, high = text.partition('-')
+    return range(int(low), int(high or low) + 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skills', type=int, default=3, help='合成角色的技能数量 (含HIGHLIGHT)')
+    parser.add_argument('--turns', type=parse_range, default=parse_range('4-10'), help='排轴搜索的回合数范围，如 4-10')
+    parser.add_argument('--modes', default='memo,exhaustive', help='排轴搜索模式，逗号分隔')
+    parser.add_argument('--max-exhaustive-turns', type=int, default=7, help='穷举搜索的最大回合数 (穷举随回合数指数增长)')
+    parser.add_argument('--sp', type=int, default=1000, help='排轴搜索的初始SP')
+    parser.add_argument('--actions', type=int, default=20000, help='process_action 基准的行动次数')
+    parser.add_argument('--damage-evals', type=int, default=200000, help='伤害公式基准的评估次数')
+    parser.add_argument('--batch-size', type=int, default=65536, help='批量伤害公式的批大小')
+    parser.add_argument('--endpoint-turns', type=int, default=5, help='接口基准使用的回合数')
+    parser.add_argument('--repeats', type=int, default=5, help='每个接口的重复请求次数')
+    parser.add_argument('--characters', type=int, default=500, help='数据加载基准的合成角色数量')
+    parser.add_argument('--only', default='process_action,rotation_finder,damage_kernel,endpoints,data_loading',
+                        help='只运行指定的基准，逗号分隔')
+    parser.add_argument('--output', help='结果JSON的输出路径，默认输出到标准输出')
+    parser.add_argument('--compare', help='用于比较的基准结果JSON文件')
+    args = parser.parse_args()
+
+    # 默认只输出警告，避免日志输出影响计时 (导入app时也会读取该环境变量)
+    os.environ.setdefault(LOG_LEVEL_ENV, "WARNING")
+    configure_logging()
+    selected = set(args.only.split(','))
+    results = {}
+    if 'process_action' in selected:
+        results["process_action"] = bench_process_action(args.skills, args.actions)
+    if 'rotation_finder' in selected:
+        results["rotation_finder"] = bench_rotation_finder(
+            args.skills, args.turns, args.modes.split(','), args.max_exhaustive_turns, args.sp
+        )
+    if 'damage_kernel' in selected:
+        results["damage_kernel"] = bench_damage_kernel(args.damage_evals, args.batch_size)
+    if 'endpoints' in selected:
+        results["endpoints"] = bench_endpoints(args.skills, args.endpoint_turns, args.repeats)
+    if 'data_loading' in selected:
+        results["data_loading"] = bench_data_loading(args.characters, args.skills)
+
+    meta = metadata(args)
+    meta["args"]["turns"] = f"{args.turns.start}-{args.turns.stop - 1}"
+    report = {"meta": meta, "results": results}
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+if __name__ == '__main__':
+    main()
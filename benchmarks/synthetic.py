@@ -0,0 +1,54 @@
+# benchmarks/synthetic.py
+"""
+基准测试使用的合成角色。
+
+合成角色的技能数量可配置，技能的倍率和SP消耗逐个递增，
+偶数序号的技能附带 'GENERATE_SHAQI_1' 效果，最后一个技能为HIGHLIGHT，
+从而覆盖资源消耗、效果触发和HIGHLIGHT能量等模拟器的主要路径。
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from models import CharacterPanel, CharacterStats, Weapon, Skill
+
+def synthetic_character_data(num_skills: int) -> dict:
+    """返回与 character_data.json 格式相同的合成角色数据，可直接注入 DataLoader.data。"""
+    if num_skills < 1:
+        raise ValueError("合成角色至少需要1个技能")
+    skills = []
+    for i in range(num_skills - 1):
+        skills.append({
+            "name": f"技能{i + 1}",
+            "multiplier": round(0.6 + 0.1 * i, 3),
+            "sp_cost": 10 + 4 * i,
+            "skill_type": "NORMAL",
+            "damage_type": "诅咒",
+            "effect_names": ["GENERATE_SHAQI_1"] if i % 2 == 0 else [],
+        })
+    skills.append({
+        "name": "HIGHLIGHT",
+        "multiplier": 2.0,
+        "sp_cost": 0,
+        "skill_type": "HIGHLIGHT",
+        "damage_type": "诅咒",
+        "effect_names": ["GENERATE_SHAQI_1"],
+    })
+    return {
+        "base_stats": {"attack": 350, "crit_rate": 0.1, "crit_damage": 0.5, "penetration": 0.0,
+                       "additive_damage_bonus": 0.1, "final_damage_bonus": 0.0},
+        "weapon": {"name": "合成武器", "base_attack": 500, "penetration": 0.1},
+        "revelations": [],
+        "skills": skills,
+    }
+
+def synthetic_panel(character_id: str, num_skills: int) -> CharacterPanel:
+    """构造一个拥有 num_skills 个技能的合成角色面板。"""
+    data = synthetic_character_data(num_skills)
+    return CharacterPanel(
+        character_id=character_id,
+        base_stats=CharacterStats(**data["base_stats"]),
+        equipped_weapon=Weapon(**data["weapon"]),
+        skills=[Skill(**skill) for skill in data["skills"]],
+    )
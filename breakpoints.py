@@ -0,0 +1,204 @@
+# breakpoints.py
+"""
+属性断点预计算表: 为每个敌人 (防御、防御系数、抗性、弱点) 预先计算 穿透 × 减防 网格上的防御承伤系数，
+之后以O(1)的插值查询代替逐次从头计算。
+
+- 正向查询: 给定 (穿透, 减防)，按坐标直接算出网格下标，做双线性插值得到防御承伤系数，
+  再乘以抗性、弱点和易伤得到敌人侧的总乘数; 超出网格范围时退回到精确公式;
+- 反向查询 (断点): 给定目标伤害提升 (相对于无穿透、无减防) 和当前的减防/穿透，查询还需要的穿透/减防。
+  伤害引擎中穿透和减防都是乘在防御上的 (防御 × (1 - 减防) × 系数 × (1 - 穿透))，两者地位对称，
+  所需值可以由防御公式直接解出 (O(1)的闭式解)，不需要查表，也就没有插值误差;
+- 索引: BreakpointIndex 按敌人配置的内容摘要保存各张表，应用启动时为Boss预设一次性构建，
+  并可以缓存到磁盘 (zlib压缩的pickle，格式与面板快照相同)，下次启动直接加载。缓存文件只应从可信的位置加载。
+
+表使用的是伤害引擎的防御模型 (calculator.calculate_defense_multiplier_batch)，
+与网页工具的减法减防模型 (见 defense_efficiency) 不同。
+"""
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+from calculator import calculate_defense_multiplier_batch, DEFENSE_COEFFICIENT, DEFENSE_CONSTANT
+from defense_efficiency import BOSS_PRESETS
+from models import Enemy
+from result_cache import make_cache_key
+from snapshot_file import load_snapshot_file, save_snapshot_file
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 穿透和减防坐标轴的步长 (两轴都覆盖 [0, 1])
+BREAKPOINT_STEP = 0.01
+
+# 断点表缓存文件的魔数和版本号 (文件格式见 snapshot_file，与面板快照相同)
+CACHE_MAGIC = b"P5XBRKPT"
+CACHE_VERSION = 2
+# 通过该环境变量指定缓存文件路径后，应用启动时会优先从缓存加载断点表，并在构建了新表后更新缓存
+BREAKPOINT_CACHE_ENV = "P5X_BREAKPOINT_CACHE"
+
+@dataclass(frozen=True)
+class EnemyProfile:
+    """决定断点表内容的敌人静态属性。减防和易伤随战斗变化，不属于配置，而是在查询时给出。"""
+    defense: float
+    def_coeff: float = DEFENSE_COEFFICIENT
+    resistances: Tuple[Tuple[str, float], ...] = ()
+    weakness_multiplier: float = 1.0
+
+    def __post_init__(self):
+        if self.defense < 0 or self.def_coeff < 0:
+            raise ValueError("防御和防御系数不能为负数。")
+
+    @classmethod
+    def from_enemy(cls, enemy: Enemy, def_coeff: float = DEFENSE_COEFFICIENT) -> 'EnemyProfile':
+        return cls(float(enemy.defense), float(def_coeff), tuple(sorted(enemy.resistances.items())),
+                   float(enemy.weakness_multiplier))
+
+    def key(self) -> str:
+        """配置和网格参数的摘要，用作索引和磁盘缓存的键。"""
+        return make_cache_key(asdict(self), BREAKPOINT_STEP)
+
+def _bilinear(grid: np.ndarray, x: float, y: float, x_step: float, y_step: float) -> float:
+    """
+    [内部辅助方法] 在两轴都从0开始的等距网格上做双线性插值，坐标必须在网格范围内。
+    网格下标由坐标直接算出，查询为O(1)。
+    """
+    fx, fy = x / x_step, y / y_step
+    i = min(int(fx), grid.shape[0] - 2)
+    j = min(int(fy), grid.shape[1] - 2)
+    tx, ty = fx - i, fy - j
+    top = grid[i, j] * (1 - ty) + grid[i, j + 1] * ty
+    bottom = grid[i + 1, j] * (1 - ty) + grid[i + 1, j + 1] * ty
+    return float(top * (1 - tx) + bottom * tx)
+
+@dataclass
+class BreakpointTable:
+    """
+    一个敌人配置的断点表。
+    defense_multipliers[穿透下标, 减防下标] 为网格上的防御承伤系数；反向查询直接用闭式解计算。
+    """
+    profile: EnemyProfile
+    step: float
+    defense_multipliers: np.ndarray
+    base_multiplier: float   # 无穿透、无减防时的防御承伤系数
+    max_gain: float          # 防御被完全抵消时的伤害提升，即可达到的最大伤害提升
+
+    @property
+    def axis_max(self) -> float:
+        return self.step * (self.defense_multipliers.shape[0] - 1)
+
+    def _in_grid(self, penetration: float, reduction: float) -> bool:
+        return 0.0 <= penetration <= self.axis_max and 0.0 <= reduction <= self.axis_max
+
+    def defense_multiplier(self, penetration: float, reduction: float) -> float:
+        """查询防御承伤系数。超出网格范围 (如穿透为负或大于1) 时使用精确公式。"""
+        if self._in_grid(penetration, reduction):
+            return _bilinear(self.defense_multipliers, penetration, reduction, self.step, self.step)
+        profile = self.profile
+        return float(calculate_defense_multiplier_batch(profile.defense, reduction, penetration, profile.def_coeff))
+
+    def multiplier(self, penetration: float, reduction: float, damage_type: str | None = None, vulnerability: float = 0.0) -> float:
+        """敌人侧的总乘数: 防御承伤系数 × (1 - 抗性) × 弱点倍率 × (1 + 易伤)。"""
+        resistance = dict(self.profile.resistances).get(damage_type, 0) if damage_type else 0
+        return self.defense_multiplier(penetration, reduction) * (1 - resistance) \
+            * self.profile.weakness_multiplier * (1 + vulnerability)
+
+    def damage_increase(self, penetration: float, reduction: float) -> float:
+        """穿透和减防带来的伤害提升 (相对于无穿透、无减防)。"""
+        return self.defense_multiplier(penetration, reduction) / self.base_multiplier - 1
+
+    def _needed(self, target_gain: float, other: float) -> float | None:
+        """
+        [内部辅助方法] 在另一项为 other 时达到目标伤害提升还需要的数值；无法达到时返回None。
+        目标承伤系数 M = base × (1 + 提升)，对应的剩余防御 D' = K × (1/M - 1)；
+        由 D' = 防御 × 系数 × (1 - 另一项) × (1 - 所需值) 解出所需值。
+        """
+        if target_gain <= 0:
+            return 0.0
+        if target_gain > self.max_gain:
+            return None
+        remaining_defense = DEFENSE_CONSTANT * (1 / (self.base_multiplier * (1 + target_gain)) - 1)
+        full_defense = self.profile.defense * self.profile.def_coeff * (1 - other)
+        # 另一项已把防御完全抵消时不再需要任何数值
+        if full_defense <= 0:
+            return 0.0
+        return min(max(1 - remaining_defense / full_defense, 0.0), 1.0)
+
+    def needed_penetration(self, target_gain: float, reduction: float = 0.0) -> float | None:
+        """在给定减防下，达到目标伤害提升所需的穿透；单靠穿透无法达到时返回None。"""
+        return self._needed(target_gain, reduction)
+
+    def needed_reduction(self, target_gain: float, penetration: float = 0.0) -> float | None:
+        """在给定穿透下，达到目标伤害提升所需的减防；单靠减防无法达到时返回None。"""
+        return self._needed(target_gain, penetration)
+
+def build_table(profile: EnemyProfile, step: float = BREAKPOINT_STEP) -> BreakpointTable:
+    """用向量化的防御公式一次性算出整张防御承伤系数表。"""
+    axis = np.linspace(0.0, 1.0, int(round(1.0 / step)) + 1)
+    multipliers = calculate_defense_multiplier_batch(profile.defense, axis[None, :], axis[:, None], profile.def_coeff)
+    base = float(multipliers[0, 0])
+    # 防御被完全抵消时承伤系数为1
+    max_gain = 1.0 / base - 1.0
+    return BreakpointTable(profile, step, multipliers, base, max_gain)
+
+def preset_profiles() -> Dict[str, EnemyProfile]:
+    """Boss预设对应的敌人配置。"""
+    return {name: EnemyProfile(float(defense), float(coeff)) for name, (defense, coeff) in BOSS_PRESETS.items()}
+
+def save_tables(tables: Dict[str, BreakpointTable], path: str):
+    """将断点表写入缓存文件 (格式见 snapshot_file)。"""
+    save_snapshot_file(path, CACHE_MAGIC, CACHE_VERSION, tables)
+
+def load_tables(path: str) -> Dict[str, BreakpointTable]:
+    """从缓存文件加载断点表。文件不存在、格式或版本不符时返回空字典。"""
+    return load_snapshot_file(path, CACHE_MAGIC, CACHE_VERSION, "断点表缓存") or {}
+
+class BreakpointIndex:
+    """
+    按敌人配置索引的断点表集合 (线程安全)。查询不存在的配置时当场构建并加入索引，
+    索引中的表数达到 max_tables 后，新配置的表只构建不保存。
+    设置了缓存路径时，启动时从缓存加载，preload() 构建了新表后写回缓存。
+    """
+    def __init__(self, cache_path: str | None = None, max_tables: int = 256):
+        self.cache_path = cache_path
+        self.max_tables = max_tables
+        self._lock = threading.Lock()
+        self._tables: Dict[str, BreakpointTable] = load_tables(cache_path) if cache_path else {}
+        if self._tables:
+            logger.info("从缓存 '%s' 加载了 %d 张断点表。", cache_path, len(self._tables))
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def _get_or_build(self, profile: EnemyProfile) -> Tuple[BreakpointTable, bool]:
+        """[内部辅助方法] 返回 (断点表, 是否为新构建的表)。"""
+        key = profile.key()
+        table = self._tables.get(key)
+        if table is not None:
+            return table, False
+        table = build_table(profile)
+        with self._lock:
+            if len(self._tables) >= self.max_tables:
+                return table, False
+            # 并发构建同一配置时保留先写入的那一份
+            return self._tables.setdefault(key, table), True
+
+    def table(self, profile: EnemyProfile) -> BreakpointTable:
+        return self._get_or_build(profile)[0]
+
+    def table_for_enemy(self, enemy: Enemy, def_coeff: float = DEFENSE_COEFFICIENT) -> BreakpointTable:
+        """返回与伤害引擎中该敌人对应的断点表，可直接传给 calculate_expected_damage 的 breakpoints 参数。"""
+        return self.table(EnemyProfile.from_enemy(enemy, def_coeff))
+
+    def preload(self, profiles: Iterable[EnemyProfile]):
+        """一次性构建给定配置的断点表；有新表且设置了缓存路径时写回缓存。"""
+        built = sum(self._get_or_build(profile)[1] for profile in profiles)
+        logger.info("断点表索引就绪: 共 %d 张表，其中新构建 %d 张。", len(self._tables), built)
+        if built and self.cache_path:
+            try:
+                with self._lock:
+                    tables = dict(self._tables)
+                save_tables(tables, self.cache_path)
+            except OSError as e:
+                logger.warning("写入断点表缓存 '%s' 失败: %s", self.cache_path, e)
@@ -0,0 +1,79 @@
+# buff_lifecycle.py
+"""
+Buff生命周期: 施加 (叠层与刷新)、随回合推进的持续时间和到期移除。
+
+回合模型: BattleState.turn_number 为当前回合。模拟器默认每个行动结束一个回合，
+团队排轴查找器则以“每名角色各行动一次”为一个回合 (见 BattleSimulator.process_action 的 end_turn)。
+在第 T 回合施加、持续 d 回合的Buff，在本回合及之后的 d 个回合内生效，在第 T + d 回合结束时移除；
+Buff.expires_at 记录这个到期回合，Buff.duration 保留施加时的持续回合数。
+
+持续时间不逐个递减: 状态中维护按到期回合分桶的索引 (BattleState.buff_expiry)，
+回合结束时只取出当回合到期的那一桶，逐项核对后移除。每回合的开销与到期的Buff数成正比，
+而不是扫描所有角色和敌人的Buff字典。Buff被刷新 (到期回合推后) 或已被移除时，
+旧桶中的条目在核对时会被忽略 (惰性删除)。
+"""
+from typing import Dict, List, Tuple
+
+from models import BattleState, Buff, intern_buff_name
+
+# Buff的两种持有者，与 BattleState 中写时复制的子容器种类一致
+CHARACTER = "buffs"
+ENEMY = "debuffs"
+
+def _buffs_for_write(state: BattleState, kind: str, owner_id: str) -> Dict[int, Buff]:
+    """[内部辅助函数] 按持有者种类获取Buff字典的可写版本。"""
+    if kind == CHARACTER:
+        return state.buffs_for_write(owner_id)
+    return state.debuffs_for_write(owner_id)
+
+def remaining_turns(buff: Buff, turn_number: int) -> int | None:
+    """Buff在第 turn_number 回合 (含) 起还会生效的回合数；永久Buff返回None。"""
+    if buff.expires_at is None:
+        return None
+    return max(buff.expires_at - turn_number + 1, 0)
+
+def apply_buff(
+    state: BattleState,
+    kind: str,
+    owner_id: str,
+    name: str,
+    duration: int,
+    stacks: int = 1,
+    max_stacks: int = 1
+) -> Buff:
+    """
+    为角色 (kind=CHARACTER) 或敌人 (kind=ENEMY) 施加Buff，返回状态中的Buff对象。
+    已有同名Buff时叠加层数 (不超过 max_stacks) 并把所有层的持续时间刷新为 duration；
+    duration 不大于0表示永久有效。state 必须是写时复制派生出的新状态。
+    """
+    buffs = _buffs_for_write(state, kind, owner_id)
+    buff_id = intern_buff_name(name)
+    expires_at = state.turn_number + duration if duration > 0 else None
+    buff = buffs.get(buff_id)
+    if buff is None:
+        buff = buffs[buff_id] = Buff(name, duration, min(stacks, max_stacks), max_stacks, expires_at)
+    else:
+        buff.max_stacks = max_stacks
+        buff.stacks = min(buff.stacks + stacks, max_stacks)
+        buff.duration = duration
+        buff.expires_at = expires_at
+    if expires_at is not None:
+        state.schedule_expiry(kind, owner_id, buff_id, expires_at)
+    return buff
+
+def advance_turn(state: BattleState) -> List[Tuple[str, str, Buff]]:
+    """
+    结束当前回合: 移除在本回合到期的Buff，然后回合数加一。
+    返回被移除的 (种类, 持有者ID, Buff) 列表。state 必须是写时复制派生出的新状态。
+    """
+    turn = state.turn_number
+    expired = []
+    for kind, owner_id, buff_id in state.pop_expiring(turn):
+        owners = state.character_buffs if kind == CHARACTER else state.enemy_debuffs
+        buff = owners.get(owner_id, {}).get(buff_id)
+        if buff is None or buff.expires_at != turn:
+            continue # 已被移除或刷新过的过期条目
+        del _buffs_for_write(state, kind, owner_id)[buff_id]
+        expired.append((kind, owner_id, buff))
+    state.turn_number = turn + 1
+    return expired
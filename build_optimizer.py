@@ -0,0 +1,375 @@
+# build_optimizer.py
+from dataclasses import dataclass, replace
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from models import (
+    CharacterPanel, CharacterStats, Weapon, Revelation, RevelationPosition,
+    BattleState, Action, Enemy, Skill
+)
+from calculator import calculate_expected_damage_batch
+from simulator import BattleSimulator
+from dpr_calculator import DprCalculator
+from score import Scorer
+import game_database
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 支持的优化目标
+OBJECTIVES = ("dpr", "score")
+
+# 装备属性向量的各个分量。武器和启示主词条都会被映射到这组分量上，
+# 面板计算方式与 CharacterPanel.get_final_stats 一致。
+_FIELDS = (
+    "attack",                 # 固定攻击力 (武器基础攻击 + 主词条攻击)
+    "attack_percent_bonus",   # 攻击力百分比加成
+    "crit_rate_bonus",        # 暴击率加成 (武器 + 主词条暴击率)
+    "crit_damage",            # 额外暴击伤害
+    "penetration",            # 穿透
+    "additive_damage_bonus",  # 加法类增伤
+    "final_damage_bonus",     # 最终伤害加成
+)
+_FIELD_INDEX = {name: i for i, name in enumerate(_FIELDS)}
+
+# 启示槽位的固定顺序
+POSITIONS = list(RevelationPosition)
+# 套装件数达到该值后不再有新的加成 (最高为4件套效果)
+_MAX_SET_COUNT = 4
+# 每次批量评估的最大配装数，用于控制内存占用
+DEFAULT_BATCH_SIZE = 65536
+
+@dataclass
+class _Slot:
+    """[内部] 一个装备槽位 (武器或某个位置的启示) 的候选物品及其列式属性。"""
+    items: List[Weapon | Revelation]
+    vectors: np.ndarray     # (候选数, 字段数)
+    set_indices: np.ndarray # (候选数,) 所属套装的编号，武器为-1
+
+@dataclass
+class _DamagingAction:
+    """[内部] 排轴中一次由被优化角色造成伤害的行动，以及计算伤害时的战斗状态。"""
+    skill: Skill
+    state: BattleState
+    enemy: Enemy
+
+def _weapon_vector(weapon: Weapon) -> np.ndarray:
+    vector = np.zeros(len(_FIELDS))
+    vector[_FIELD_INDEX["attack"]] = weapon.base_attack
+    vector[_FIELD_INDEX["crit_rate_bonus"]] = weapon.crit_rate_bonus
+    vector[_FIELD_INDEX["crit_damage"]] = weapon.crit_damage_bonus
+    vector[_FIELD_INDEX["penetration"]] = weapon.penetration
+    return vector
+
+def _revelation_vector(revelation: Revelation) -> np.ndarray:
+    main_stat = revelation.main_stat
+    vector = np.zeros(len(_FIELDS))
+    vector[_FIELD_INDEX["attack"]] = main_stat.attack
+    vector[_FIELD_INDEX["attack_percent_bonus"]] = main_stat.attack_percent_bonus
+    vector[_FIELD_INDEX["crit_rate_bonus"]] = main_stat.crit_rate + main_stat.crit_rate_bonus
+    vector[_FIELD_INDEX["crit_damage"]] = main_stat.crit_damage
+    vector[_FIELD_INDEX["penetration"]] = main_stat.penetration
+    vector[_FIELD_INDEX["additive_damage_bonus"]] = main_stat.additive_damage_bonus
+    vector[_FIELD_INDEX["final_damage_bonus"]] = main_stat.final_damage_bonus
+    return vector
+
+def record_damaging_actions(
+    simulator: BattleSimulator,
+    character_id: str,
+    rotation: List[Action],
+    initial_state: BattleState
+) -> Tuple[List[_DamagingAction], float]:
+    """
+    用参考面板模拟一次排轴。
+    返回指定角色的所有伤害行动 (全体技能的每个目标各记一次)，以及其他角色造成的(与该角色属性无关的)伤害总和。
+    注意: 批量计算不按敌人的剩余HP截断伤害，应使用未开启HP追踪的模拟器。
+    """
+    damaging_actions = []
+    other_damage = 0.0
+    state = initial_state
+    for action in rotation:
+        # 伤害按回合结束前的状态计算 (与 process_action 一致)，在行动回合到期的Buff仍然生效
+        damage, hit_state, next_state = simulator.process_action_with_hit_state(state, action)
+        if action.character_id != character_id:
+            other_damage += damage
+        elif hit_state is not state:
+            for target in simulator.action_targets(state, action):
+                enemy = hit_state.enemies[target.enemy_id]
+                damaging_actions.append(_DamagingAction(action.skill_used, hit_state, enemy))
+        state = next_state
+    return damaging_actions, other_damage
+
+def rotation_damage_batch(
+    simulator: BattleSimulator,
+    character_id: str,
+    damaging_actions: List[_DamagingAction],
+    static_stats: CharacterStats
+) -> np.ndarray:
+    """
+    批量计算一组静态面板在记录的伤害行动上造成的总伤害 (不含其他角色的伤害)。
+    static_stats 的各个字段是等长的NumPy数组，每个位置对应一个静态面板。
+    """
+    total_damage = np.zeros(np.broadcast(*static_stats.as_tuple()).shape)
+    for damaging in damaging_actions:
+        # 效果函数会原地修改字段 (如 stats.attack *= ...)，必须先复制数组
+        stats = CharacterStats(**{name: np.copy(value) for name, value in static_stats.as_dict().items()})
+        stats = simulator.apply_dynamic_effects(stats, character_id, damaging.state)
+        enemy = damaging.enemy
+        total_damage = total_damage + calculate_expected_damage_batch(
+            attack=stats.attack,
+            crit_rate=stats.crit_rate,
+            crit_damage=stats.crit_damage,
+            penetration=stats.penetration,
+            additive_damage_bonus=stats.additive_damage_bonus,
+            final_damage_bonus=stats.final_damage_bonus,
+            enemy_defense=enemy.defense,
+            defense_reduction=enemy.defense_reduction,
+            resistance=enemy.resistances.get(damaging.skill.damage_type, 0),
+            multiplier=damaging.skill.multiplier,
+            vulnerability=enemy.vulnerability,
+            weakness_multiplier=enemy.weakness_multiplier,
+        )
+    return total_damage
+
+def _build_slot(items: List[Weapon | Revelation], vectors: List[np.ndarray], set_indices: List[int]) -> _Slot:
+    """
+    [内部辅助函数] 构建槽位，并在同一套装内剔除被支配的物品:
+    若另一件同套装物品的每个属性分量都不低于它 (且不完全相同或排在它前面)，它就不可能出现在更优的配装中。
+    """
+    if not items:
+        return _Slot([], np.zeros((0, len(_FIELDS))), np.zeros(0, dtype=int))
+    vectors = np.array(vectors)
+    set_indices = np.array(set_indices)
+    order = np.arange(len(items))
+    kept = []
+    for i in range(len(items)):
+        same_set = set_indices == set_indices[i]
+        at_least = np.all(vectors >= vectors[i], axis=1)
+        strictly = np.any(vectors > vectors[i], axis=1)
+        dominators = same_set & at_least & (strictly | (order < i))
+        dominators[i] = False
+        if not np.any(dominators):
+            kept.append(i)
+    return _Slot([items[i] for i in kept], vectors[kept], set_indices[kept])
+
+class BuildOptimizer:
+    """
+    配装优化器: 在给定的武器和启示库存中，寻找DPR (或评分) 最高的前N套配装。
+
+    - 排轴只用参考面板模拟一次，记录被优化角色每次造成伤害时的战斗状态；
+      因为资源和Buff的演进与配装无关，之后每套配装只需重新计算这些行动的伤害。
+    - 配装以列式数组表示，通过 calculate_expected_damage_batch 成批计算，不做逐套模拟。
+    - 逐槽位分支定界: 未选择的槽位用“各分量取最大值”的理想物品、套装件数用所有剩余槽位都能凑上的
+      乐观值来估计上界，上界不超过当前第N名的部分配装会被整批剪掉。
+      该上界假设所有属性和套装加成都是非负的，且各套装的加成互相独立、可以叠加。
+    """
+    def __init__(self, simulator: BattleSimulator, scorer: Scorer | None = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.simulator = simulator
+        self.scorer = scorer
+        self.batch_size = batch_size
+        logger.debug("配装优化器已初始化。")
+
+    def _set_bonus_table(self, set_names: List[str]) -> np.ndarray:
+        """
+        [内部辅助方法] 预先计算每个套装在 0~4 件时的加成向量，形状为 (套装数, 5, 字段数)。
+        与 get_final_stats 一样，只计入攻击%、暴击率和穿透三项套装加成。
+        """
+        table = np.zeros((len(set_names), _MAX_SET_COUNT + 1, len(_FIELDS)))
+        for s, name in enumerate(set_names):
+            set_definition = game_database.REVELATION_SETS_DB.get(name)
+            if not set_definition: continue
+            for count in range(_MAX_SET_COUNT + 1):
+                bonuses = CharacterStats()
+                if count >= 2 and set_definition.two_piece_bonus:
+                    bonuses = set_definition.two_piece_bonus(bonuses)
+                if count >= 4 and set_definition.four_piece_bonus:
+                    bonuses = set_definition.four_piece_bonus(bonuses)
+                table[s, count, _FIELD_INDEX["attack_percent_bonus"]] = bonuses.attack_percent_bonus
+                table[s, count, _FIELD_INDEX["crit_rate_bonus"]] = bonuses.crit_rate_bonus
+                table[s, count, _FIELD_INDEX["penetration"]] = bonuses.penetration
+        return table
+
+    def _evaluate(self, character_panel: CharacterPanel, totals: np.ndarray) -> np.ndarray:
+        """
+        [内部辅助方法] 批量计算一组配装的目标值。
+        :param totals: 形状为 (B, 字段数) 的数组，每行是一套配装的装备属性向量与套装加成之和。
+        """
+        base = character_panel.base_stats
+        columns = {name: totals[:, i] for i, name in enumerate(_FIELDS)}
+        static_stats = CharacterStats(
+            attack=(base.attack + columns["attack"]) * (1 + columns["attack_percent_bonus"]),
+            hp=base.hp,
+            crit_rate=base.crit_rate + columns["crit_rate_bonus"],
+            crit_damage=base.crit_damage + columns["crit_damage"],
+            penetration=base.penetration + columns["penetration"],
+            additive_damage_bonus=base.additive_damage_bonus + columns["additive_damage_bonus"],
+            final_damage_bonus=base.final_damage_bonus + columns["final_damage_bonus"],
+        )
+
+        total_damage = self._other_damage + rotation_damage_batch(
+            self.simulator, character_panel.character_id, self._damaging_actions, static_stats
+        )
+        dpr = total_damage / self._rotation_length
+        if self._objective == "score":
+            return self.scorer.calculate_score_batch(dpr, static_stats)
+        return dpr
+
+    def _offer(self, values: np.ndarray, choices: np.ndarray):
+        """[内部辅助方法] 将一批完整配装并入前N名。"""
+        values = np.concatenate([self._top_values, values])
+        choices = np.concatenate([self._top_choices, choices])
+        if len(values) > self._top_n:
+            keep = np.argpartition(-values, self._top_n - 1)[:self._top_n]
+            values, choices = values[keep], choices[keep]
+        self._top_values, self._top_choices = values, choices
+
+    def _threshold(self) -> float:
+        """[内部辅助方法] 当前第N名的目标值；不足N套时为负无穷。"""
+        return self._top_values.min() if len(self._top_values) >= self._top_n else float('-inf')
+
+    def _search(self, character_panel: CharacterPanel):
+        """
+        [内部辅助方法] 批量化的深度优先分支定界。
+        栈中的每一项是一批处于同一深度的部分配装；出栈时将它们与下一个槽位的全部候选一次性组合、
+        计算上界并剪枝，存活者按上界从高到低切分成新的批次入栈，使最有希望的配装最先被展开。
+        """
+        num_slots = len(self._slots)
+        set_range = np.arange(self._set_table.shape[0])
+        stack = [(
+            0,
+            np.zeros((1, len(_FIELDS))),
+            np.zeros((1, self._set_table.shape[0]), dtype=int),
+            np.zeros((1, 0), dtype=int),
+            np.array([np.inf]),
+        )]
+        while stack:
+            depth, partial, counts, choices, bounds = stack.pop()
+            # 入栈后阈值可能已经提高，先用当前阈值再过滤一遍
+            alive = bounds > self._threshold()
+            if not np.any(alive):
+                continue
+            partial, counts, choices = partial[alive], counts[alive], choices[alive]
+
+            slot = self._slots[depth]
+            if len(slot.items):
+                n, m = len(partial), len(slot.items)
+                partial = (partial[:, None, :] + slot.vectors[None, :, :]).reshape(n * m, -1)
+                counts = np.repeat(counts, m, axis=0)
+                piece_sets = np.tile(slot.set_indices, n)
+                has_set = piece_sets >= 0
+                counts[np.flatnonzero(has_set), piece_sets[has_set]] += 1
+                choices = np.hstack([np.repeat(choices, m, axis=0), np.tile(np.arange(m), n)[:, None]])
+            else:
+                # 该槽位没有库存，保持空缺
+                choices = np.hstack([choices, np.full((len(choices), 1), -1)])
+
+            optimistic_counts = np.minimum(counts + self._remaining_set_slots[depth + 1], _MAX_SET_COUNT)
+            set_bonus = self._set_table[set_range, optimistic_counts].sum(axis=1)
+            values = self._evaluate(character_panel, partial + self._ideal_suffix[depth + 1] + set_bonus)
+            self.evaluated += len(values)
+
+            alive = values > self._threshold()
+            if depth == num_slots - 1:
+                # 最后一个槽位: 没有剩余槽位，上界即为精确值
+                self._offer(values[alive], choices[alive])
+                continue
+
+            order = np.flatnonzero(alive)[np.argsort(-values[alive], kind="stable")]
+            next_size = max(1, len(self._slots[depth + 1].items))
+            chunk = max(1, self.batch_size // next_size)
+            # 倒序入栈，使上界最高的批次最先出栈
+            for start in reversed(range(0, len(order), chunk)):
+                rows = order[start:start + chunk]
+                stack.append((depth + 1, partial[rows], counts[rows], choices[rows], values[rows]))
+
+    def optimize(
+        self,
+        character_panel: CharacterPanel,
+        weapons: List[Weapon],
+        revelations: List[Revelation],
+        rotation: List[Action],
+        initial_state: BattleState,
+        top_n: int = 10,
+        objective: str = "dpr"
+    ) -> List[Dict]:
+        """
+        在库存中寻找目标值最高的前N套配装。
+
+        :param character_panel: 被优化角色的面板，其基础属性和技能保持不变。
+        :param weapons: 可选武器列表 (为空时使用当前武器)。
+        :param revelations: 启示库存，按各自的 position 分配到槽位，每个槽位最多装备一件。
+        :param rotation: 用于评估的团队排轴。
+        :param initial_state: 排轴开始时的战斗状态。
+        :param top_n: 返回的配装数量。
+        :param objective: 优化目标，'dpr' 或 'score' (需要在构造时提供Scorer)。
+        :return: 按目标值从高到低排列的配装列表，每项的DPR均经过完整模拟复核。
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"未知的优化目标: '{objective}'，可选值为 {OBJECTIVES}")
+        if objective == "score" and self.scorer is None:
+            raise ValueError("按评分优化需要提供Scorer。")
+        if top_n < 1:
+            raise ValueError("top_n 必须至少为1")
+
+        weapons = weapons or [character_panel.equipped_weapon]
+        set_names = sorted({r.set_name for r in revelations})
+        set_index = {name: i for i, name in enumerate(set_names)}
+        self._set_table = self._set_bonus_table(set_names)
+        self._slots: List[_Slot] = [_build_slot(weapons, [_weapon_vector(w) for w in weapons], [-1] * len(weapons))]
+        for position in POSITIONS:
+            pieces = [r for r in revelations if r.position == position]
+            self._slots.append(_build_slot(
+                pieces, [_revelation_vector(r) for r in pieces], [set_index[r.set_name] for r in pieces]
+            ))
+        logger.info("配装优化: 剔除被支配物品后各槽位候选数 %s", [len(slot.items) for slot in self._slots])
+
+        # 预先计算每个槽位之后的“理想物品”累加向量，以及剩余槽位中各套装最多还能凑出的件数
+        num_slots = len(self._slots)
+        self._ideal_suffix = np.zeros((num_slots + 1, len(_FIELDS)))
+        self._remaining_set_slots = np.zeros((num_slots + 1, len(set_names)), dtype=int)
+        for depth in range(num_slots - 1, -1, -1):
+            slot = self._slots[depth]
+            ideal = slot.vectors.max(axis=0) if len(slot.items) else np.zeros(len(_FIELDS))
+            self._ideal_suffix[depth] = self._ideal_suffix[depth + 1] + np.maximum(ideal, 0)
+            self._remaining_set_slots[depth] = self._remaining_set_slots[depth + 1]
+            self._remaining_set_slots[depth][np.unique(slot.set_indices[slot.set_indices >= 0])] += 1
+
+        self._damaging_actions, self._other_damage = record_damaging_actions(
+            self.simulator, character_panel.character_id, rotation, initial_state
+        )
+        self._rotation_length = len(rotation) or 1
+        self._objective = objective
+        self._top_n = top_n
+        self._top_values = np.zeros(0)
+        self._top_choices = np.zeros((0, num_slots), dtype=int)
+        self.evaluated = 0
+
+        self._search(character_panel)
+        logger.info("配装优化完成: 共批量评估 %d 个候选。", self.evaluated)
+
+        # 对入选的配装做一次完整模拟，给出精确的DPR和面板
+        results = []
+        for row in np.argsort(-self._top_values, kind="stable"):
+            picked = [
+                self._slots[depth].items[index]
+                for depth, index in enumerate(self._top_choices[row]) if index >= 0
+            ]
+            weapon = picked[0]
+            build_revelations = picked[1:]
+            panel = replace(character_panel, equipped_weapon=weapon, revelations=build_revelations)
+            panels = [panel if p.character_id == panel.character_id else p for p in self.simulator.characters.values()]
+            simulator = BattleSimulator(panels)
+            dpr_results = DprCalculator(simulator).calculate_team_dpr(rotation, initial_state)
+            final_stats = panel.get_final_stats()
+            entry = {
+                "weapon": weapon.name,
+                "revelations": {r.position.name: r.name for r in build_revelations},
+                "dpr": dpr_results["dpr"],
+                "total_damage": dpr_results["total_damage"],
+                "final_stats": final_stats.as_dict(),
+            }
+            if self.scorer is not None:
+                entry["score"] = self.scorer.calculate_score(dpr_results, final_stats)
+            results.append(entry)
+        return results
@@ -1,6 +1,13 @@
 # calculator.py
+from typing import TYPE_CHECKING
+
+import numpy as np
+
 from models import CharacterStats, Skill, Enemy
 
+if TYPE_CHECKING:
+    from breakpoints import BreakpointTable
+
 # --- 全局游戏常量 ---
 # 这些常量定义了伤害公式中的核心平衡数值。
 # 来自文章1.2节《基础伤害公式的构建》
@@ -11,7 +18,8 @@ DEFENSE_COEFFICIENT = 1.0
 def calculate_expected_damage(
     stats: CharacterStats, 
     skill: Skill, 
-    enemy: Enemy
+    enemy: Enemy,
+    breakpoints: 'BreakpointTable | None' = None
 ) -> float:
     """
     根据文章重构的、分步的期望伤害计算函数。
@@ -20,6 +28,8 @@ def calculate_expected_damage(
     :param stats: 包含了所有加成后的最终角色属性。
     :param skill: 使用的技能。
     :param enemy: 攻击的目标敌人。
+    :param breakpoints: 可选，该敌人的断点表 (见 breakpoints.BreakpointIndex.table_for_enemy)。
+                        提供时第2步的防御承伤系数改为O(1)插值查表，结果与精确计算有微小的插值误差。
     :return: 期望伤害值。
     """
     
@@ -28,21 +38,28 @@ def calculate_expected_damage(
     panel_damage = stats.attack * skill.multiplier
 
     # === 第2步: 计算防御减免 (文章4.1节, 步骤2a-2d) ===
-    # 2a. 计算基础有效防御力 (计入来自debuff的减防效果)
-    effective_def_after_debuffs = enemy.defense * (1 - enemy.defense_reduction)
+    if breakpoints is not None:
+        # 查表: 按 (穿透, 减防) 插值得到防御承伤系数，超出网格时断点表自行退回精确公式
+        defense_multiplier = breakpoints.defense_multiplier(stats.penetration, enemy.defense_reduction)
+        if defense_multiplier == float('inf'):
+            return float('inf')
+    else:
+        # 2a. 计算基础有效防御力 (计入来自debuff的减防效果)
+        effective_def_after_debuffs = enemy.defense * (1 - enemy.defense_reduction)
     
-    # 应用全局防御系数
-    effective_def_with_coeff = effective_def_after_debuffs * DEFENSE_COEFFICIENT
+        # 应用全局防御系数
+        effective_def_with_coeff = effective_def_after_debuffs * DEFENSE_COEFFICIENT
     
-    # 2b. 应用来自攻击方的穿透效果
-    penetrated_def = effective_def_with_coeff * (1 - stats.penetration)
+        # 2b. 应用来自攻击方的穿透效果
+        penetrated_def = effective_def_with_coeff * (1 - stats.penetration)
     
-    # 2c & 2d. 计算最终防御承伤系数并应用
-    # 为避免除以零的错误，增加一个保护性检查。
-    if (penetrated_def + DEFENSE_CONSTANT) <= 0:
-        return float('inf') # 如果防御被降为负无穷，伤害理论上也是无穷大
+        # 2c & 2d. 计算最终防御承伤系数并应用
+        # 为避免除以零的错误，增加一个保护性检查。
+        if (penetrated_def + DEFENSE_CONSTANT) <= 0:
+            return float('inf') # 如果防御被降为负无穷，伤害理论上也是无穷大
         
-    defense_multiplier = 1 - (penetrated_def / (penetrated_def + DEFENSE_CONSTANT))
+        defense_multiplier = 1 - (penetrated_def / (penetrated_def + DEFENSE_CONSTANT))
+
     damage_after_def = panel_damage * defense_multiplier
 
     # === 第3步: 应用“增伤区”乘数 (文章4.1节, 步骤3) ===
@@ -77,3 +94,120 @@ def calculate_expected_damage(
 
     # 确保最终伤害不会是负数
     return max(0, final_damage)
+
+
+def calculate_defense_multiplier_batch(
+    enemy_defense,
+    defense_reduction,
+    penetration,
+    defense_coefficient=DEFENSE_COEFFICIENT
+) -> np.ndarray:
+    """
+    伤害公式第2步 (防御减免) 的向量化版本，返回防御承伤系数。
+    参数均可以是标量或可广播的NumPy数组；计算步骤与 calculate_expected_damage 一致，
+    防御被降为负无穷 (分母不为正) 时返回无穷大。
+
+    :param enemy_defense: 敌人防御力。
+    :param defense_reduction: 敌人减防总和。
+    :param penetration: 穿透。
+    :param defense_coefficient: 防御系数，默认为全局的 DEFENSE_COEFFICIENT。
+    """
+    enemy_defense, defense_reduction, penetration, defense_coefficient = (
+        np.asarray(a, dtype=np.float64) for a in (enemy_defense, defense_reduction, penetration, defense_coefficient)
+    )
+    effective_def_with_coeff = enemy_defense * (1 - defense_reduction) * defense_coefficient
+    penetrated_def = effective_def_with_coeff * (1 - penetration)
+    denominator = penetrated_def + DEFENSE_CONSTANT
+    with np.errstate(divide='ignore', invalid='ignore'):
+        defense_multiplier = 1 - (penetrated_def / denominator)
+    return np.where(denominator <= 0, np.inf, defense_multiplier)
+
+
+def calculate_expected_damage_batch(
+    attack,
+    crit_rate,
+    crit_damage,
+    penetration,
+    additive_damage_bonus,
+    final_damage_bonus,
+    enemy_defense,
+    defense_reduction,
+    resistance,
+    multiplier=1.0,
+    vulnerability=0.0,
+    weakness_multiplier=1.0
+) -> np.ndarray:
+    """
+    calculate_expected_damage 的向量化批量版本，用于配装遍历等需要评估海量组合的场景。
+    所有参数均可以是标量或等长(可广播)的NumPy数组，每个位置对应一组 (属性, 技能, 敌人)。
+    计算步骤和运算顺序与单次计算函数完全一致，结果逐元素相同，
+    包括防御保护性检查(返回无穷大)和最终的非负截断。
+
+    :param attack: 最终攻击力。
+    :param crit_rate: 暴击率。
+    :param crit_damage: 【额外】暴击伤害。
+    :param penetration: 穿透。
+    :param additive_damage_bonus: 加法类增伤区总和。
+    :param final_damage_bonus: 最终伤害加成。
+    :param enemy_defense: 敌人防御力。
+    :param defense_reduction: 敌人减防总和。
+    :param resistance: 敌人对该技能伤害属性的抗性。
+    :param multiplier: 技能倍率。
+    :param vulnerability: 敌人易伤总和。
+    :param weakness_multiplier: 弱点倍率。
+    :return: 期望伤害数组。
+    """
+    attack, crit_rate, crit_damage, penetration, additive_damage_bonus, final_damage_bonus, \
+        enemy_defense, defense_reduction, resistance, multiplier, vulnerability, weakness_multiplier = (
+            np.asarray(a, dtype=np.float64) for a in (
+                attack, crit_rate, crit_damage, penetration, additive_damage_bonus, final_damage_bonus,
+                enemy_defense, defense_reduction, resistance, multiplier, vulnerability, weakness_multiplier
+            )
+        )
+
+    # 第1步: 技能面板伤害
+    panel_damage = attack * multiplier
+
+    # 第2步: 防御减免
+    defense_multiplier = calculate_defense_multiplier_batch(enemy_defense, defense_reduction, penetration)
+    # 与单次计算一致: 防御承伤系数无效时伤害视为无穷大，这里先屏蔽无效运算的警告，最后统一替换
+    invalid_def = np.isinf(defense_multiplier)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        damage = panel_damage * defense_multiplier
+
+        # 第3步至第6步: 增伤区、暴击期望、抗性、弱点、易伤、最终伤害
+        damage = damage * (1 + additive_damage_bonus)
+        damage = damage * (1 + crit_rate * crit_damage)
+        damage = damage * (1 - resistance)
+        damage = damage * weakness_multiplier
+        damage = damage * (1 + vulnerability)
+        damage = damage * (1 + final_damage_bonus)
+
+    # 确保最终伤害不会是负数 (与 max(0, x) 语义一致, NaN 同样截断为0)
+    damage = np.where(damage > 0, damage, 0.0)
+    return np.where(invalid_def, np.inf, damage)
+
+
+def calculate_hit_components(
+    stats: CharacterStats,
+    skill: Skill,
+    enemy: Enemy
+) -> tuple[float, float, float]:
+    """
+    将单次命中拆分为 (未暴击伤害, 暴击率, 额外暴伤)，用于按命中采样暴击的蒙特卡洛模拟。
+    计算步骤与 calculate_expected_damage 相同，只是不折算暴击期望:
+    暴击时的伤害为 未暴击伤害 * (1 + 额外暴伤)。暴击率被截断到 [0, 1]。
+    """
+    panel_damage = stats.attack * skill.multiplier
+    penetrated_def = enemy.defense * (1 - enemy.defense_reduction) * DEFENSE_COEFFICIENT * (1 - stats.penetration)
+    crit_rate = min(max(stats.crit_rate, 0.0), 1.0)
+    if (penetrated_def + DEFENSE_CONSTANT) <= 0:
+        return float('inf'), crit_rate, stats.crit_damage
+
+    damage = panel_damage * (1 - (penetrated_def / (penetrated_def + DEFENSE_CONSTANT)))
+    damage *= 1 + stats.additive_damage_bonus
+    damage *= 1 - enemy.resistances.get(skill.damage_type, 0)
+    damage *= enemy.weakness_multiplier
+    damage *= 1 + enemy.vulnerability
+    damage *= 1 + stats.final_damage_bonus
+    return max(0, damage), crit_rate, stats.crit_damage
@@ -0,0 +1,242 @@
+# character_store.py
+"""
+列式角色数据库: character_data.json 的磁盘格式替代，支持按角色延迟读取。
+
+- 存储: 一个SQLite文件，角色的基础属性、武器、技能(及其效果)和启示分别存放在各自的表中，
+  每个属性占一列 (而不是嵌套的JSON对象)。技能、效果和启示表以 (角色ID, 序号) 为主键 (WITHOUT ROWID)，
+  同一角色的行在文件中连续存放，读取一个角色只涉及少量相邻的页;
+- 延迟读取: 打开时只读取角色索引 (角色ID、原始数据摘要、校验错误)，角色数据在第一次访问时才从文件中读取，
+  未被访问的角色不占用内存。文件以只读方式打开，并通过 mmap_size 让SQLite以内存映射方式读取;
+- 转换: convert_json() 把现有的JSON数据文件转换为数据库。转换时按注册表的规则校验每个角色，
+  未通过校验的角色只记录错误信息。数值按原样存储 (属性列不声明类型，整数不会被转换为浮点数)，
+  读出的角色数据解析后与JSON中的完全相同；原始数据的摘要在转换时计算并保存，缓存键与从JSON加载时相同;
+- 使用: DataLoader 和 PanelRegistry 通过文件头自动识别数据库文件，接口与使用JSON文件时相同。
+  数据库只在转换时整体重写 (先写临时文件再替换)，热重载按文件的 (修改时间, 大小) 检测变化。
+
+用法: python character_store.py character_data.json character_data.p5xdb
+"""
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Tuple
+
+from models import STATS_FIELDS
+from result_cache import make_cache_key
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 数据库格式版本，表结构变化时递增
+STORE_FORMAT_VERSION = 1
+# 通过该环境变量指定应用使用的角色数据文件 (JSON文件或角色数据库)，默认为 character_data.json
+CHARACTER_DATA_ENV = "P5X_CHARACTER_DATA"
+# SQLite以内存映射方式读取的最大字节数
+STORE_MMAP_BYTES = 256 * 1024 * 1024
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+WEAPON_FIELDS = ("name", "base_attack", "crit_rate_bonus", "crit_damage_bonus", "penetration")
+SKILL_FIELDS = ("name", "multiplier", "sp_cost", "skill_type", "damage_type", "target_type")
+REVELATION_FIELDS = ("name", "set_name", "position")
+
+def _stat_columns(prefix: str = "") -> str:
+    return ", ".join(f"{prefix}{name}" for name in STATS_FIELDS)
+
+# 属性和数值列不声明类型 (没有类型亲和性)，按写入时的类型原样保存
+SCHEMA = f"""
+CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE characters (character_id TEXT PRIMARY KEY, digest TEXT, error TEXT, {_stat_columns()});
+CREATE TABLE weapons (character_id TEXT PRIMARY KEY, {", ".join(WEAPON_FIELDS)});
+CREATE TABLE skills (
+    character_id TEXT, skill_index INTEGER, {", ".join(SKILL_FIELDS)},
+    PRIMARY KEY (character_id, skill_index)
+) WITHOUT ROWID;
+CREATE TABLE skill_effects (
+    character_id TEXT, skill_index INTEGER, effect_index INTEGER, effect_name TEXT,
+    PRIMARY KEY (character_id, skill_index, effect_index)
+) WITHOUT ROWID;
+CREATE TABLE revelations (
+    character_id TEXT, revelation_index INTEGER, {", ".join(REVELATION_FIELDS)}, {_stat_columns("main_")},
+    PRIMARY KEY (character_id, revelation_index)
+) WITHOUT ROWID;
+"""
+
+class CharacterStoreError(ValueError):
+    """文件不是角色数据库，或格式版本不符时抛出。"""
+
+def is_character_store(path: str) -> bool:
+    """按文件头判断文件是否为角色数据库 (SQLite文件)。文件不存在时返回False。"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except OSError:
+        return False
+
+def _present(values: Dict[str, Any], names: Tuple[str, ...], prefix: str = "") -> Dict[str, Any]:
+    """[内部辅助方法] 从一行中取出非空的列，还原为JSON中的对象 (缺省的字段在库中为NULL)。"""
+    return {name: values[prefix + name] for name in names if values[prefix + name] is not None}
+
+class CharacterStore(Mapping):
+    """
+    只读的角色数据库: 角色ID -> 与JSON文件中格式相同的角色数据字典 (按需从文件中读取)。
+    只包含通过校验的角色；未通过校验的角色及其错误信息见 errors。
+    可以在多个线程之间共享 (内部对数据库连接加锁)。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        if not is_character_store(path):
+            raise CharacterStoreError(f"'{path}' 不是角色数据库文件")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        try:
+            self._conn.execute(f"PRAGMA mmap_size = {STORE_MMAP_BYTES}")
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'format_version'").fetchone()
+            version = row["value"] if row else None
+            if version != STORE_FORMAT_VERSION:
+                raise CharacterStoreError(f"角色数据库 '{path}' 的格式版本 ({version}) 与当前版本 ({STORE_FORMAT_VERSION}) 不符")
+            rows = self._conn.execute("SELECT character_id, digest, error FROM characters ORDER BY rowid").fetchall()
+        except sqlite3.DatabaseError as e:
+            self._conn.close()
+            raise CharacterStoreError(f"读取角色数据库 '{path}' 失败: {e}")
+        except CharacterStoreError:
+            self._conn.close()
+            raise
+        # 角色索引常驻内存: 通过校验的角色 -> 原始数据摘要，以及未通过校验的角色 -> 错误信息
+        self.digests: Dict[str, str] = {r["character_id"]: r["digest"] for r in rows if r["error"] is None}
+        self.errors: Dict[str, str] = {r["character_id"]: r["error"] for r in rows if r["error"] is not None}
+
+    def __getitem__(self, character_id: str) -> Dict[str, Any]:
+        if character_id not in self.digests:
+            raise KeyError(character_id)
+        with self._lock:
+            return self._read_character(character_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.digests)
+
+    def __len__(self) -> int:
+        return len(self.digests)
+
+    def __contains__(self, character_id: object) -> bool:
+        return character_id in self.digests
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _read_character(self, character_id: str) -> Dict[str, Any]:
+        """[内部辅助方法] 从各个表中读取一个角色并组装为JSON格式的字典，调用方需持有锁。"""
+        query = self._conn.execute
+        key = (character_id,)
+        char_row = query(f"SELECT {_stat_columns()} FROM characters WHERE character_id = ?", key).fetchone()
+        weapon_row = query(f"SELECT {', '.join(WEAPON_FIELDS)} FROM weapons WHERE character_id = ?", key).fetchone()
+        effects: Dict[int, List[str]] = {}
+        for row in query("SELECT skill_index, effect_name FROM skill_effects WHERE character_id = ? "
+                         "ORDER BY skill_index, effect_index", key):
+            effects.setdefault(row["skill_index"], []).append(row["effect_name"])
+
+        skills = []
+        for row in query(f"SELECT skill_index, {', '.join(SKILL_FIELDS)} FROM skills WHERE character_id = ? "
+                         "ORDER BY skill_index", key):
+            skill = _present(row, SKILL_FIELDS)
+            skill["effect_names"] = effects.get(row["skill_index"], [])
+            skills.append(skill)
+
+        revelations = []
+        for row in query(f"SELECT {', '.join(REVELATION_FIELDS)}, {_stat_columns('main_')} FROM revelations "
+                         "WHERE character_id = ? ORDER BY revelation_index", key):
+            revelation = _present(row, REVELATION_FIELDS)
+            main_stat = _present(row, STATS_FIELDS, "main_")
+            if main_stat:
+                revelation["main_stat"] = main_stat
+            revelations.append(revelation)
+
+        return {
+            "base_stats": _present(char_row, STATS_FIELDS),
+            "weapon": _present(weapon_row, WEAPON_FIELDS) if weapon_row else {},
+            "revelations": revelations,
+            "skills": skills,
+        }
+
+def _write_character(conn: sqlite3.Connection, character_id: str, char_data: Dict[str, Any], digest: str):
+    """[内部辅助方法] 把一个已通过校验的角色写入各个表。"""
+    base_stats = char_data.get('base_stats', {})
+    conn.execute(
+        f"INSERT INTO characters (character_id, digest, error, {_stat_columns()}) "
+        f"VALUES (?, ?, NULL, {', '.join('?' * len(STATS_FIELDS))})",
+        (character_id, digest, *(base_stats.get(name) for name in STATS_FIELDS))
+    )
+    weapon = char_data['weapon']
+    conn.execute(
+        f"INSERT INTO weapons VALUES (?, {', '.join('?' * len(WEAPON_FIELDS))})",
+        (character_id, *(weapon.get(name) for name in WEAPON_FIELDS))
+    )
+    for skill_index, skill in enumerate(char_data.get('skills', [])):
+        conn.execute(
+            f"INSERT INTO skills VALUES (?, ?, {', '.join('?' * len(SKILL_FIELDS))})",
+            (character_id, skill_index, *(skill.get(name) for name in SKILL_FIELDS))
+        )
+        conn.executemany(
+            "INSERT INTO skill_effects VALUES (?, ?, ?, ?)",
+            [(character_id, skill_index, i, name) for i, name in enumerate(skill.get('effect_names', []))]
+        )
+    for revelation_index, rev in enumerate(char_data.get('revelations', [])):
+        main_stat = rev.get('main_stat', {})
+        conn.execute(
+            f"INSERT INTO revelations VALUES (?, ?, {', '.join('?' * (len(REVELATION_FIELDS) + len(STATS_FIELDS)))})",
+            (character_id, revelation_index, *(rev.get(name) for name in REVELATION_FIELDS),
+             *(main_stat.get(name) for name in STATS_FIELDS))
+        )
+
+def convert_json(json_path: str, store_path: str) -> Tuple[int, int]:
+    """
+    把JSON角色数据文件转换为角色数据库 (先写临时文件再替换，正在读取旧文件的进程不受影响)。
+    返回 (写入的角色数, 未通过校验的角色数)。JSON文件无法读取或解析时抛出 OSError / ValueError。
+    """
+    # 局部导入以避免循环依赖 (panel_registry 通过 DataLoader 间接导入本模块)
+    from panel_registry import PanelValidationError, validate_character
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        raw_data = json.load(f)
+    if not isinstance(raw_data, dict):
+        raise ValueError(f"'{json_path}' 的顶层必须是 角色ID -> 角色数据 的对象")
+
+    temp_path = f"{store_path}.tmp{os.getpid()}"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    stored = rejected = 0
+    conn = sqlite3.connect(temp_path)
+    try:
+        with conn:
+            conn.executescript(SCHEMA)
+            conn.execute("INSERT INTO meta VALUES ('format_version', ?)", (STORE_FORMAT_VERSION,))
+            conn.execute("INSERT INTO meta VALUES ('source', ?)", (os.path.basename(json_path),))
+            for character_id, char_data in raw_data.items():
+                try:
+                    validate_character(character_id, char_data)
+                except PanelValidationError as e:
+                    conn.execute("INSERT INTO characters (character_id, error) VALUES (?, ?)", (character_id, str(e)))
+                    logger.error("%s", e)
+                    rejected += 1
+                    continue
+                _write_character(conn, character_id, char_data, make_cache_key(char_data))
+                stored += 1
+    except BaseException:
+        conn.close()
+        os.remove(temp_path)
+        raise
+    conn.close()
+    os.replace(temp_path, store_path)
+    logger.info("已将 '%s' 转换为角色数据库 '%s': %d 个角色，%d 个未通过校验。", json_path, store_path, stored, rejected)
+    return stored, rejected
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="把JSON角色数据文件转换为列式角色数据库。")
+    parser.add_argument('data_file', help='角色数据JSON文件')
+    parser.add_argument('store_file', help='输出的角色数据库路径')
+    args = parser.parse_args()
+    stored, rejected = convert_json(args.data_file, args.store_file)
+    print(f"角色数据库 '{args.store_file}' 包含 {stored} 个角色，{rejected} 个角色未通过校验。")
@@ -2,12 +2,17 @@
 # data_loader.py
 # ===================================================================
 import json
+import os
 from typing import Dict, Any, List
 # 导入所有需要的数据模型，用于将字典转换为对象
 from models import (
     CharacterPanel, CharacterStats, Weapon, Skill, 
     Revelation, RevelationPosition
 )
+from character_store import CharacterStore, CharacterStoreError, is_character_store
+from tracing import get_logger
+
+logger = get_logger(__name__)
 
 class DataLoader:
     """
@@ -18,55 +23,99 @@ class DataLoader:
         """
         在初始化时，读取并解析JSON文件。
         """
+        self.data_filepath = data_filepath
+        self.reload()
+
+    def _file_signature(self) -> tuple | None:
+        """[内部辅助方法] 数据文件的 (修改时间, 大小)，文件不存在时返回None。"""
+        try:
+            stat = os.stat(self.data_filepath)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self):
+        """
+        重新读取并解析数据文件。数据文件为角色数据库 (见 character_store) 时只读取角色索引，
+        角色数据在 load_character_panel 时才从文件中读取。
+        """
+        self._signature = self._file_signature()
+        if is_character_store(self.data_filepath):
+            try:
+                self.data = CharacterStore(self.data_filepath)
+                logger.info("成功打开角色数据库 '%s' (%d 个角色)。", self.data_filepath, len(self.data))
+            except CharacterStoreError as e:
+                logger.error("%s", e)
+                self.data = {}
+            return
         try:
-            with open(data_filepath, 'r', encoding='utf-8') as f:
+            with open(self.data_filepath, 'r', encoding='utf-8') as f:
                 self.data = json.load(f)
-            print(f"成功从 '{data_filepath}' 加载数据。")
+            logger.info("成功从 '%s' 加载数据。", self.data_filepath)
         except FileNotFoundError:
-            print(f"[错误] 数据文件未找到: {data_filepath}")
+            logger.error("数据文件未找到: %s", self.data_filepath)
             self.data = {}
         except json.JSONDecodeError:
-            print(f"[错误] 解析JSON文件失败: {data_filepath}")
+            logger.error("解析JSON文件失败: %s", self.data_filepath)
             self.data = {}
 
+    def reload_if_changed(self) -> bool:
+        """如果数据文件自上次加载后被修改过，则重新加载。返回是否发生了重新加载。"""
+        if self._file_signature() == self._signature:
+            return False
+        logger.info("检测到数据文件 '%s' 已变化，重新加载。", self.data_filepath)
+        self.reload()
+        return True
+
+    @staticmethod
+    def parse_weapon(weapon_data: Dict[str, Any]) -> Weapon:
+        """将一个武器字典转换为Weapon对象。格式错误时抛出KeyError或TypeError。"""
+        return Weapon(**weapon_data)
+
+    @staticmethod
+    def parse_revelation(rev_data: Dict[str, Any]) -> Revelation:
+        """将一个启示字典转换为Revelation对象。格式错误时抛出KeyError或TypeError。"""
+        # 将JSON中的字符串位置 (e.g., "SUN") 转换为枚举成员 (RevelationPosition.SUN)
+        position_enum = RevelationPosition[rev_data['position']]
+        return Revelation(
+            name=rev_data['name'],
+            set_name=rev_data['set_name'],
+            position=position_enum,
+            main_stat=CharacterStats(**rev_data.get('main_stat', {}))
+        )
+
+    @classmethod
+    def parse_character(cls, character_id: str, char_data: Dict[str, Any]) -> CharacterPanel:
+        """将一个角色字典转换为CharacterPanel。格式错误时抛出KeyError或TypeError。"""
+        # 使用Python的**kwargs语法，将字典直接解包作为dataclass的构造函数参数
+        base_stats = CharacterStats(**char_data.get('base_stats', {}))
+        weapon = cls.parse_weapon(char_data.get('weapon', {}))
+        skills = [Skill(**skill_data) for skill_data in char_data.get('skills', [])]
+
+        # 加载启示列表
+        revelations_data = char_data.get('revelations', [])
+        revelations_list: List[Revelation] = [cls.parse_revelation(rev_data) for rev_data in revelations_data]
+
+        # 构建并返回最终的角色面板对象
+        return CharacterPanel(
+            character_id=character_id,
+            base_stats=base_stats,
+            equipped_weapon=weapon,
+            skills=skills,
+            revelations=revelations_list
+        )
+
     def load_character_panel(self, character_id: str) -> CharacterPanel | None:
         """
         根据给定的character_id，加载并构建一个完整的CharacterPanel。
         """
         char_data = self.data.get(character_id)
         if not char_data:
-            print(f"[错误] 在数据文件中找不到角色: '{character_id}'")
+            logger.error("在数据文件中找不到角色: '%s'", character_id)
             return None
 
         try:
-            # 使用Python的**kwargs语法，将字典直接解包作为dataclass的构造函数参数
-            base_stats = CharacterStats(**char_data.get('base_stats', {}))
-            weapon = Weapon(**char_data.get('weapon', {}))
-            skills = [Skill(**skill_data) for skill_data in char_data.get('skills', [])]
-            
-            # 加载启示列表
-            revelations_data = char_data.get('revelations', [])
-            revelations_list: List[Revelation] = []
-            for rev_data in revelations_data:
-                # 将JSON中的字符串位置 (e.g., "SUN") 转换为枚举成员 (RevelationPosition.SUN)
-                position_enum = RevelationPosition[rev_data['position']]
-                revelations_list.append(
-                    Revelation(
-                        name=rev_data['name'],
-                        set_name=rev_data['set_name'],
-                        position=position_enum
-                    )
-                )
-
-            # 构建并返回最终的角色面板对象
-            panel = CharacterPanel(
-                character_id=character_id,
-                base_stats=base_stats,
-                equipped_weapon=weapon,
-                skills=skills,
-                revelations=revelations_list
-            )
-            return panel
+            return self.parse_character(character_id, char_data)
         except (KeyError, TypeError) as e:
-            print(f"[错误] 加载 '{character_id}' 时数据格式错误: {e}")
+            logger.error("加载 '%s' 时数据格式错误: %s", character_id, e)
             return None
\ No newline at end of file
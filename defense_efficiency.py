@@ -0,0 +1,155 @@
+# defense_efficiency.py
+"""
+穿透/减防收益计算器: index.html 中 calculateTotals / calculateNeededValues 的服务端向量化版本。
+
+防御系数模型 (与网页工具一致，所有数值均为小数，如 30% 记为 0.3):
+    最终防御系数 = Boss防御系数 × (1 - 穿透) - 减防
+    伤害提升     = (1 + Boss防御系数) / (1 + max(最终防御系数, 0)) - 1
+    还需减防     = max(最终防御系数, 0)              (再叠加这么多减防即可把防御系数降到0)
+    还需穿透     = max(最终防御系数 / Boss防御系数, 0)
+
+所有函数都接受可广播的NumPy数组，可以一次性计算整张 (Boss防御系数, 穿透, 减防) 网格。
+此外还用伤害引擎自身的防御步骤 (calculator.calculate_defense_multiplier_batch) 给出同一网格上的伤害提升，
+便于对照两种模型。
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from calculator import calculate_defense_multiplier_batch
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# Boss预设: 名称 -> (基础防御, 防御系数)，与 index.html 中的 bosses 表一致
+BOSS_PRESETS: Dict[str, tuple] = {
+    "模板A": (1280, 3.632),
+    "模板B": (1280, 2.584),
+    "模板C": (1280, 3.059),
+    "模板D": (855, 2.632),
+    "苏鲁特": (821, 2.584),
+    "拉弥亚": (821, 2.584),
+    "杰克灯笼": (364, 2.584),
+    "韦驮天": (364, 2.584),
+    "迦楼罗": (364, 2.584),
+    "佳塔由": (364, 2.584),
+    "荷鲁斯": (364, 2.584),
+    "八咫乌": (364, 2.584),
+    "座天使": (1280, 2.584),
+    "大天使": (1280, 2.584),
+    "魔罗": (1280, 2.584),
+}
+
+# 队伍中的特殊穿透加成 (与网页工具一致)
+MITSURU = "桐条美鹤"           # 冰之舞刺击: 解明角色的启示穿透 × 15%
+MITSURU_PENETRATION_RATIO = 0.03 * 5
+FUUKA = "山岸风花"             # 深清: 作为解明角色时，风花支援槽位的穿透 × 4.5%
+FUUKA_PENETRATION_RATIO = 0.045
+
+@dataclass
+class DefenseTotals:
+    """队伍的穿透、减防和暴击率合计，以及其中的特殊技能加成。"""
+    penetration: float
+    reduction: float
+    crit_rate: float
+    mitsuru_bonus: float = 0.0
+    fuuka_bonus: float = 0.0
+
+def calculate_totals(
+    buffs: Iterable[Dict],
+    main_penetration: float = 0.0,
+    enlightenment_penetration: float = 0.0,
+    team: Iterable[str] = (),
+    enlightenment: str | None = None,
+    fuuka_carry_penetration: float = 0.0,
+    manual_crit_rate: float = 0.0
+) -> DefenseTotals:
+    """
+    calculateTotals 的Python版本。
+
+    :param buffs: 已勾选的Buff，每项为 {"type": "penetration" | "reduction" | "critRate", "value": 数值}。
+    :param main_penetration: 主C手动输入的穿透。
+    :param enlightenment_penetration: 解明角色手动输入的启示穿透。
+    :param team: 支援位和解明位上的角色名 (用于判断是否有桐条美鹤)。
+    :param enlightenment: 解明位上的角色名 (为山岸风花时计入深清加成)。
+    :param fuuka_carry_penetration: 风花支援槽位的穿透。
+    :param manual_crit_rate: 主C/解明手动输入的暴击率之和。
+    """
+    penetration = reduction = 0.0
+    crit_rate = manual_crit_rate
+    for buff in buffs:
+        if not isinstance(buff, dict):
+            raise ValueError("每个Buff都必须是包含 'type' 和 'value' 的对象")
+        value = float(buff.get('value', 0) or 0)
+        kind = buff.get('type')
+        if kind == 'penetration':
+            penetration += value
+        elif kind == 'reduction':
+            reduction += value
+        elif kind == 'critRate':
+            crit_rate += value
+        else:
+            raise ValueError(f"未知的Buff类型 '{kind}'")
+    penetration += main_penetration + enlightenment_penetration
+
+    mitsuru_bonus = enlightenment_penetration * MITSURU_PENETRATION_RATIO if MITSURU in set(team) else 0.0
+    fuuka_bonus = fuuka_carry_penetration * FUUKA_PENETRATION_RATIO if enlightenment == FUUKA else 0.0
+    penetration += max(mitsuru_bonus, 0.0) + max(fuuka_bonus, 0.0)
+    return DefenseTotals(penetration, reduction, crit_rate, mitsuru_bonus, fuuka_bonus)
+
+def final_defense_coefficient(base_coeff, penetration, reduction) -> np.ndarray:
+    """最终防御系数 (可能为负，表示防御已被完全抵消)。"""
+    return np.asarray(base_coeff, dtype=np.float64) * (1 - np.asarray(penetration, dtype=np.float64)) \
+        - np.asarray(reduction, dtype=np.float64)
+
+def damage_increase(base_coeff, penetration, reduction) -> np.ndarray:
+    """穿透和减防带来的伤害提升 (相对于无穿透、无减防)。"""
+    final = final_defense_coefficient(base_coeff, penetration, reduction)
+    return (1 + np.asarray(base_coeff, dtype=np.float64)) / (1 + np.maximum(final, 0.0)) - 1
+
+def needed_values(base_coeff, penetration, reduction) -> Dict[str, np.ndarray]:
+    """calculateNeededValues 的向量化版本: 把防御系数降到0还需要的减防和穿透。"""
+    base_coeff = np.asarray(base_coeff, dtype=np.float64)
+    final = final_defense_coefficient(base_coeff, penetration, reduction)
+    remaining = np.maximum(final, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        needed_penetration = np.where(base_coeff > 0, remaining / base_coeff, 0.0)
+    return {
+        "final_coeff": final,
+        "damage_increase": (1 + base_coeff) / (1 + remaining) - 1,
+        "needed_reduction": remaining,
+        "needed_penetration": needed_penetration,
+    }
+
+def engine_damage_increase(defense, base_coeff, penetration, reduction) -> np.ndarray:
+    """用伤害引擎的防御步骤 (乘法减防) 计算的伤害提升，作为对照。"""
+    with_buffs = calculate_defense_multiplier_batch(defense, reduction, penetration, base_coeff)
+    without = calculate_defense_multiplier_batch(defense, 0.0, 0.0, base_coeff)
+    with np.errstate(invalid='ignore'):
+        return with_buffs / without - 1
+
+def evaluate_grid(
+    base_coeffs: List[float],
+    penetrations: List[float],
+    reductions: List[float],
+    defense: float | None = None
+) -> Dict[str, np.ndarray]:
+    """
+    在 (Boss防御系数, 穿透, 减防) 的完整网格上一次性计算所有指标，
+    返回的每个数组形状均为 (len(base_coeffs), len(penetrations), len(reductions))。
+    提供Boss基础防御时额外给出引擎模型的伤害提升 (engine_damage_increase)。
+    """
+    coeff_axis = np.asarray(base_coeffs, dtype=np.float64)[:, None, None]
+    pen_axis = np.asarray(penetrations, dtype=np.float64)[None, :, None]
+    red_axis = np.asarray(reductions, dtype=np.float64)[None, None, :]
+    results = needed_values(coeff_axis, pen_axis, red_axis)
+    if defense is not None:
+        results["engine_damage_increase"] = engine_damage_increase(defense, coeff_axis, pen_axis, red_axis)
+    shape = (len(base_coeffs), len(penetrations), len(reductions))
+    return {name: np.broadcast_to(values, shape) for name, values in results.items()}
+
+def to_json_list(values: np.ndarray) -> list:
+    """把数组转换为可以直接JSON序列化的嵌套列表，非有限值 (如减防超过100%时引擎模型的无穷大) 转换为None。"""
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isfinite(values), values, None).tolist()
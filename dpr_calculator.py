@@ -1,10 +1,49 @@
 # dpr_calculator.py
-import copy
-from typing import List, Dict
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Tuple
+
+import numpy as np
 
 # 导入所有需要的数据模型和类
 from models import BattleState, Action, Skill
 from simulator import BattleSimulator
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 蒙特卡洛暴击采样的默认试验次数和返回的伤害分位数
+DEFAULT_MONTE_CARLO_TRIALS = 10000
+MONTE_CARLO_PERCENTILES = (5, 25, 50, 75, 95)
+# 每批采样的随机数个数上限 (试验次数 × 命中次数)，用于限制内存占用
+MONTE_CARLO_BATCH_ELEMENTS = 1 << 20
+# 前缀树评估器默认最多缓存的中间节点数
+DEFAULT_PREFIX_CACHE_NODES = 100000
+
+def _initial_kills(state: BattleState) -> Dict[str, int]:
+    """[内部辅助函数] 开始时就已被击败的敌人记为第0动击败。"""
+    return {enemy_id: 0 for enemy_id, enemy in state.enemies.items() if enemy.hp <= 0}
+
+def _updated_kills(kills: Dict[str, int], action_number: int, state: BattleState) -> Dict[str, int]:
+    """[内部辅助函数] 返回加入本动新击败的敌人后的击杀记录 {敌人ID: 第几动}；没有新的击杀时原样返回，不复制。"""
+    if len(kills) == len(state.enemies):
+        return kills
+    new_kills = {enemy_id: action_number for enemy_id, enemy in state.enemies.items() if enemy.hp <= 0 and enemy_id not in kills}
+    return {**kills, **new_kills} if new_kills else kills
+
+def encounter_summary(kills: Dict[str, int], final_state: BattleState) -> Dict:
+    """
+    开启HP追踪时附加到DPR结果中的战斗结果:
+    kills (每个敌人在第几动被击败)、time_to_kill (击败全部敌人用的行动数，未全部击败时为None)
+    和 overkill (每个被击败敌人承受的溢出伤害)。
+    """
+    enemies = final_state.enemies
+    cleared = bool(enemies) and len(kills) == len(enemies)
+    return {
+        "kills": dict(kills),
+        "time_to_kill": max(kills.values()) if cleared else None,
+        "overkill": {enemy_id: -enemy.hp for enemy_id, enemy in enemies.items() if enemy.hp < 0},
+    }
 
 class DprCalculator:
     """
@@ -17,7 +56,7 @@ class DprCalculator:
         这是一种依赖注入的体现，使得DPR计算器不关心模拟器如何被创建。
         """
         self.simulator = simulator
-        print("DPR 计算器已初始化。")
+        logger.debug("DPR 计算器已初始化。")
 
     def calculate_team_dpr(self, team_rotation: List[Action], initial_state: BattleState) -> Dict:
         """
@@ -26,25 +65,35 @@ class DprCalculator:
 
         :param team_rotation: 一个包含多个Action对象的列表，定义了团队的行动顺序。
         :param initial_state: 模拟开始时的战斗状态。
-        :return: 一个包含详细分析结果的字典。
+        :return: 一个包含详细分析结果的字典；模拟器开启了HP追踪时还包含击杀信息 (见 encounter_summary)。
         """
-        print(f"\n>>>>>> 开始计算团队排轴DPR... <<<<<<")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        track_hp = self.simulator.track_enemy_hp
+        if debug:
+            logger.debug(">>>>>> 开始计算团队排轴DPR... <<<<<<")
         total_damage = 0.0
         turn_count = len(team_rotation)
-        # 使用深度复制来保证每次计算都从一个纯净的初始状态开始
-        current_state = copy.deepcopy(initial_state)
+        # 派生一个写时复制的副本，保证每次计算都从一个纯净的初始状态开始
+        current_state = initial_state.fork()
+        kills = _initial_kills(current_state) if track_hp else None
 
         # 如果排轴为空，直接返回零值结果，避免除以零的错误
         if not team_rotation:
-            print("[警告] 团队排轴为空，无法计算DPR。")
-            return {"total_damage": 0, "dpr": 0, "final_state": current_state}
+            logger.warning("团队排轴为空，无法计算DPR。")
+            results = {"total_damage": 0, "dpr": 0, "final_state": current_state}
+            if track_hp:
+                results.update(encounter_summary(kills, current_state))
+            return results
 
         # 遍历排轴中的每一个行动
         for i, action in enumerate(team_rotation):
-            print(f"\n[团队排轴 - 第 {i+1} 动]")
+            if debug:
+                logger.debug("[团队排轴 - 第 %d 动]", i + 1)
             # 调用模拟器处理单个行动，并接收造成的伤害和行动后的新状态
             damage, next_state = self.simulator.process_action(current_state, action)
             total_damage += damage
+            if track_hp:
+                kills = _updated_kills(kills, i + 1, next_state)
             # 更新当前状态，用于下一次循环
             current_state = next_state
         
@@ -52,8 +101,242 @@ class DprCalculator:
         dpr = total_damage / turn_count if turn_count else 0
         
         # 将所有分析结果打包成一个字典并返回
-        return {
+        results = {
             "total_damage": total_damage, 
             "dpr": dpr, 
             "final_state": current_state
         }
+        if track_hp:
+            results.update(encounter_summary(kills, current_state))
+        return results
+
+    def calculate_rounds_dpr(self, rounds: List[List[Action]], initial_state: BattleState) -> Dict:
+        """
+        按回合计算一个团队排轴的表现: 同一回合内的行动不推进回合数，每个回合结束时统一移除到期的Buff
+        (与团队排轴查找器的回合模型一致，calculate_team_dpr 则是每个行动各为一个回合)。
+        返回格式与 calculate_team_dpr 相同，DPR仍按行动数平均。
+
+        :param rounds: 每个回合的行动列表，空列表表示该回合无人行动。
+        """
+        track_hp = self.simulator.track_enemy_hp
+        total_damage = 0.0
+        turn_count = 0
+        current_state = initial_state.fork()
+        kills = _initial_kills(current_state) if track_hp else None
+        for round_actions in rounds:
+            for action in round_actions:
+                damage, current_state = self.simulator.process_action(current_state, action, end_turn=False)
+                total_damage += damage
+                turn_count += 1
+                if track_hp:
+                    kills = _updated_kills(kills, turn_count, current_state)
+            current_state = self.simulator.end_turn(current_state)
+
+        results = {
+            "total_damage": total_damage,
+            "dpr": total_damage / turn_count if turn_count else 0,
+            "final_state": current_state
+        }
+        if track_hp:
+            results.update(encounter_summary(kills, current_state))
+        return results
+
+    def calculate_batch_dpr(
+        self,
+        rotations: List[List[Action]],
+        initial_state: BattleState,
+        max_nodes: int = DEFAULT_PREFIX_CACHE_NODES
+    ) -> List[Dict]:
+        """
+        批量计算多个排轴的表现，共享前缀只模拟一次 (见 PrefixTreeEvaluator)。
+        返回与输入顺序一致的结果列表，每个结果与 calculate_team_dpr 的返回值完全相同。
+        """
+        evaluator = PrefixTreeEvaluator(self.simulator, initial_state, max_nodes)
+        return evaluator.evaluate_batch(rotations)
+
+    def simulate_damage_distribution(
+        self,
+        team_rotation: List[Action],
+        initial_state: BattleState,
+        trials: int = DEFAULT_MONTE_CARLO_TRIALS,
+        seed: int | None = None
+    ) -> Dict:
+        """
+        蒙特卡洛模式: 逐次命中独立采样暴击，估计排轴总伤害的分布。
+
+        排轴只重放一次，记录每次命中的 (未暴击伤害, 暴击率, 额外暴伤)；
+        之后所有试验在 (试验数 × 命中数) 的NumPy数组上分批向量化采样，不逐次循环。
+        相同的 seed 得到完全相同的结果。
+
+        :param trials: 试验次数。
+        :param seed: 随机数种子，为None时每次结果不同。
+        :return: 包含期望伤害、总伤害与DPR的统计量和分位数、以及对每个目标敌人的击杀概率
+                 (总伤害不低于其初始HP的试验比例) 的字典。
+        """
+        if trials < 1:
+            raise ValueError("试验次数必须至少为1")
+
+        # 第1步: 重放排轴，收集每次命中的构成 (全体技能对每个目标各算一次命中)
+        hits, targets = [], []
+        expected_total = 0.0
+        current_state = initial_state.fork()
+        for action in team_rotation:
+            damage, hit_state, next_state = self.simulator.process_action_with_hit_state(current_state, action)
+            expected_total += damage
+            for target_id, *profile in self.simulator.hit_profiles(current_state, hit_state, action):
+                hits.append(profile)
+                targets.append(target_id)
+            current_state = next_state
+        turn_count = len(team_rotation)
+
+        # 第2步: 分批采样；每行是一次试验，每列是一次命中
+        enemy_ids = list(dict.fromkeys(targets))
+        totals = np.zeros(trials)
+        per_target = np.zeros((len(enemy_ids), trials))
+        if hits:
+            base, crit_rate, crit_damage = (np.array(column, dtype=np.float64) for column in zip(*hits))
+            crit_multiplier = 1 + crit_damage
+            target_index = np.array([enemy_ids.index(t) for t in targets])
+            rng = np.random.default_rng(seed)
+            batch = max(1, MONTE_CARLO_BATCH_ELEMENTS // len(hits))
+            for start in range(0, trials, batch):
+                stop = min(start + batch, trials)
+                crits = rng.random((stop - start, len(hits))) < crit_rate
+                damage = base * np.where(crits, crit_multiplier, 1.0)
+                totals[start:stop] = damage.sum(axis=1)
+                for i in range(len(enemy_ids)):
+                    per_target[i, start:stop] = damage[:, target_index == i].sum(axis=1)
+
+        def summarize(values: np.ndarray) -> Dict:
+            percentiles = np.percentile(values, MONTE_CARLO_PERCENTILES)
+            summary = {
+                "mean": float(values.mean()),
+                "std": float(values.std()),
+                "min": float(values.min()),
+                "max": float(values.max()),
+            }
+            summary.update({f"p{p}": float(v) for p, v in zip(MONTE_CARLO_PERCENTILES, percentiles)})
+            return summary
+
+        enemy_hp = {e.enemy_id: e.hp for e in initial_state.enemies.values()}
+        kill_probability = {
+            enemy_id: float((per_target[i] >= enemy_hp[enemy_id]).mean())
+            for i, enemy_id in enumerate(enemy_ids) if enemy_id in enemy_hp
+        }
+        logger.debug("蒙特卡洛采样完成: %d 次试验, %d 次命中。", trials, len(hits))
+        return {
+            "trials": trials,
+            "seed": seed,
+            "hits": len(hits),
+            "expected_total_damage": expected_total,
+            "total_damage": summarize(totals),
+            "dpr": summarize(totals / turn_count) if turn_count else None,
+            "kill_probability": kill_probability,
+        }
+
+
+class _PrefixNode:
+    """前缀树节点: 执行完某个行动前缀后的状态、累计伤害和击杀记录 (未开启HP追踪时为None)。"""
+    __slots__ = ("parent", "key", "skill", "state", "total_damage", "kills", "children")
+
+    def __init__(self, parent, key, skill, state: BattleState, total_damage: float, kills: Dict[str, int] | None = None):
+        self.parent = parent
+        self.key = key
+        self.skill = skill # 持有技能对象的引用，保证键中的 id(skill) 不被复用
+        self.state = state
+        self.total_damage = total_damage
+        self.kills = kills
+        self.children: Dict[Tuple, "_PrefixNode"] = {}
+
+class PrefixTreeEvaluator:
+    """
+    前缀树增量评估器: 对同一个初始状态评估大量排轴时，每个不同的行动前缀只模拟一次。
+
+    每个树节点缓存 (执行该前缀后的状态, 累计伤害)；评估一个排轴时沿树向下查找最长的已缓存前缀，
+    只模拟剩余的行动。伤害按行动顺序逐个累加，结果与 calculate_team_dpr 逐位相同。
+
+    缓存节点数不超过 max_nodes，超出时按LRU淘汰。每次评估后沿路径从深到浅刷新使用顺序，
+    保证祖先总是比后代“更新”，因此被淘汰的总是最久未使用的叶子 (深层) 节点，树结构始终完整。
+    """
+    def __init__(self, simulator: BattleSimulator, initial_state: BattleState, max_nodes: int = DEFAULT_PREFIX_CACHE_NODES):
+        if max_nodes < 1:
+            raise ValueError("前缀树至少需要缓存1个节点")
+        self.simulator = simulator
+        self.max_nodes = max_nodes
+        self.track_hp = simulator.track_enemy_hp
+        root_state = initial_state.fork()
+        self.root = _PrefixNode(None, None, None, root_state, 0.0, _initial_kills(root_state) if self.track_hp else None)
+        self._lru: OrderedDict[int, _PrefixNode] = OrderedDict() # 不含根节点
+        # 统计: 实际模拟的行动数、复用缓存跳过的行动数、淘汰的节点数
+        self.simulated_actions = 0
+        self.reused_actions = 0
+        self.evictions = 0
+
+    def evaluate(self, team_rotation: List[Action]) -> Dict:
+        """评估一个排轴，返回与 calculate_team_dpr 相同格式的结果。"""
+        if not team_rotation:
+            logger.warning("团队排轴为空，无法计算DPR。")
+            return self._result(self.root, 0, self.root.state.fork())
+
+        node = self.root
+        path = []
+        for depth, action in enumerate(team_rotation, 1):
+            key = (action.character_id, id(action.skill_used), action.target_id)
+            child = node.children.get(key)
+            if child is None:
+                damage, next_state = self.simulator.process_action(node.state, action)
+                kills = _updated_kills(node.kills, depth, next_state) if self.track_hp else None
+                child = _PrefixNode(node, key, action.skill_used, next_state, node.total_damage + damage, kills)
+                node.children[key] = child
+                self.simulated_actions += 1
+            else:
+                self.reused_actions += 1
+            path.append(child)
+            node = child
+
+        # 从深到浅刷新使用顺序，然后淘汰多余的节点 (本次路径上的节点最后才会被淘汰)
+        lru = self._lru
+        for visited in reversed(path):
+            lru[id(visited)] = visited
+            lru.move_to_end(id(visited))
+        while len(lru) > self.max_nodes:
+            _, evicted = lru.popitem(last=False)
+            del evicted.parent.children[evicted.key]
+            self.evictions += 1
+
+        return self._result(node, len(team_rotation), node.state)
+
+    def _result(self, node: _PrefixNode, turn_count: int, final_state: BattleState) -> Dict:
+        """[内部辅助方法] 按 calculate_team_dpr 的格式打包一个节点的结果。"""
+        results = {
+            "total_damage": node.total_damage,
+            "dpr": node.total_damage / turn_count if turn_count else 0,
+            "final_state": final_state
+        }
+        if self.track_hp:
+            results.update(encounter_summary(node.kills, final_state))
+        return results
+
+    def evaluate_batch(self, rotations: List[List[Action]]) -> List[Dict]:
+        """
+        评估一批排轴，返回与输入顺序一致的结果列表。
+        内部按行动序列的字典序处理，使共享前缀的排轴相邻，最大化缓存命中。
+        """
+        def sort_key(i):
+            return [(a.character_id, a.skill_used.name, id(a.skill_used), a.target_id) for a in rotations[i]]
+        results: List[Dict | None] = [None] * len(rotations)
+        for i in sorted(range(len(rotations)), key=sort_key):
+            results[i] = self.evaluate(rotations[i])
+        logger.debug("前缀树批量评估完成: %d 个排轴，模拟 %d 个行动，复用 %d 个行动。",
+                     len(rotations), self.simulated_actions, self.reused_actions)
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        """返回缓存节点数和模拟/复用/淘汰统计。"""
+        return {
+            "nodes": len(self._lru),
+            "max_nodes": self.max_nodes,
+            "simulated_actions": self.simulated_actions,
+            "reused_actions": self.reused_actions,
+            "evictions": self.evictions,
+        }
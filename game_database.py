@@ -2,10 +2,18 @@
 from dataclasses import dataclass
 from typing import Callable, Dict, Any
 from models import Buff, CharacterStats, BattleState, Action
+from buff_lifecycle import apply_buff, CHARACTER
+from tracing import get_logger
+
+logger = get_logger(__name__)
 
 # --- 类型提示定义 ---
 # 使用类型提示可以帮助IDE和静态分析工具理解代码，提高开发效率。
 BonusApplicator = Callable[[CharacterStats], CharacterStats]
+# 技能效果函数接收的是一个写时复制的新状态，修改其子容器时必须使用
+# BattleState.resources_for_write / buffs_for_write 等方法，不能直接修改共享的字典或列表。
+# 施加Buff应使用 buff_lifecycle.apply_buff，以便处理叠层并登记到期回合。
+# 这些数据库以名称为键，便于扩展；BattleSimulator 在初始化时会把它们编译为直接的函数引用。
 SkillEffectApplicator = Callable[[BattleState, Action], BattleState]
 PassiveEffectApplicator = Callable[[CharacterStats, BattleState, str], CharacterStats]
 DynamicBuffApplicator = Callable[[CharacterStats, Buff], CharacterStats]
@@ -24,7 +32,7 @@ class RevelationSet:
 # 这些函数接收一个临时的bonuses对象，并修改它来添加套装效果。
 def power_2p(stats_bonuses: CharacterStats) -> CharacterStats:
     """力量2件套: 攻击力提升12%"""
-    print("[套装效果] '力量' 2件套生效: 攻击力提升 12%")
+    logger.debug("[套装效果] '力量' 2件套生效: 攻击力提升 12%")
     stats_bonuses.attack_percent_bonus += 0.12
     return stats_bonuses
 
@@ -44,20 +52,18 @@ REVELATION_SETS_DB: Dict[str, RevelationSet] = {
 def generate_shaqi(state: BattleState, action: Action) -> BattleState:
     """实现为角色生成'煞气'的效果。"""
     actor_id = action.character_id
-    print(f"[技能效果] '{actor_id}' 正在生成1个『煞气』...")
-    # setdefault会确保字典和内部的字典存在
-    resources = state.character_resources.setdefault(actor_id, {})
+    logger.debug("[技能效果] '%s' 正在生成1个『煞气』...", actor_id)
+    # resources_for_write会确保资源字典存在，并在写入前将其与旧状态分离
+    resources = state.resources_for_write(actor_id)
     resources["煞气"] = resources.get("煞气", 0) + 1
     return state
 
 def apply_attack_up_to_joker(state: BattleState, action: Action) -> BattleState:
     """实现'激励之舞'的效果：为Joker施加'攻击力提升'Buff。"""
     target_char_id = "Joker"
-    print(f"[技能效果] '{action.character_id}' 对 '{target_char_id}' 施加 '攻击力提升' Buff!")
-    buffs = state.character_buffs.setdefault(target_char_id, [])
-    # 为避免重复叠加，先移除已有的同名buff
-    buffs[:] = [b for b in buffs if b.name != "攻击力提升"]
-    buffs.append(Buff(name="攻击力提升", duration=3)) # 假设持续3回合
+    logger.debug("[技能效果] '%s' 对 '%s' 施加 '攻击力提升' Buff!", action.character_id, target_char_id)
+    # 最多1层，重复施加时只刷新持续时间
+    apply_buff(state, CHARACTER, target_char_id, "攻击力提升", duration=3) # 假设持续3回合
     return state
 
 # --- "规则库" 本身 ---
@@ -74,7 +80,7 @@ def apply_joker_shaqi_passive(stats: CharacterStats, state: BattleState, char_id
     shaqi_count = state.character_resources.get(char_id, {}).get("煞气", 0)
     if shaqi_count > 0:
         bonus = shaqi_count * 0.18
-        print(f"[被动技能] '复仇' 生效: 持有 {shaqi_count} 个『煞气』, 攻击力提升 {bonus:.0%}")
+        logger.debug("[被动技能] '复仇' 生效: 持有 %d 个『煞气』, 攻击力提升 %.0f%%", shaqi_count, bonus * 100)
         stats.attack *= (1 + bonus)
     return stats
 
@@ -88,8 +94,8 @@ CHARACTER_PASSIVE_DB: Dict[str, PassiveEffectApplicator] = {
 # ===================================================================
 def apply_attack_up_buff(stats: CharacterStats, buff: Buff) -> CharacterStats:
     """实现'攻击力提升'Buff的具体效果。"""
-    bonus = 0.20  # 假设这是一个20%的攻击力加成
-    print(f"[动态Buff] '{buff.name}'生效: 攻击力提升 {bonus:.0%}")
+    bonus = 0.20 * buff.stacks  # 假设每层是一个20%的攻击力加成
+    logger.debug("[动态Buff] '%s'生效: 攻击力提升 %.0f%%", buff.name, bonus * 100)
     stats.attack *= (1 + bonus)
     return stats
 
@@ -0,0 +1,175 @@
+# jobs.py
+"""
+进程内的异步任务队列，用于运行耗时较长的排轴搜索。
+
+- 任务提交后立即返回任务ID，由有界的本地线程池执行，同时运行的任务数受 max_workers 限制;
+- 排队中的任务数受 max_pending 限制，超出时提交失败 (JobQueueFull);
+- 任务状态保存在内存中，已结束的任务最多保留 max_finished 个，超出时淘汰最早提交的;
+- 任务运行时可以挂载一个进度来源 (如 RotationFinder)，轮询时返回其 progress_snapshot();
+- 取消通过 threading.Event 通知任务，排队中的任务直接取消，运行中的任务在下一次检查时退出。
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Tuple
+
+from rotation_finder import SearchCancelled
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+class JobQueueFull(Exception):
+    """排队中的任务数已达上限时抛出。"""
+
+@dataclass
+class Job:
+    """一个异步任务及其状态。"""
+    job_id: str
+    kind: str
+    status: str = PENDING
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: Any = None
+    error: str | None = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    progress_source: Any = field(default=None, repr=False) # 提供 progress_snapshot() 的对象
+
+    def attach_finder(self, finder):
+        """挂载排轴查找器: 作为进度来源，并让它在任务被取消时停止搜索。"""
+        finder.should_cancel = self.cancel_event.is_set
+        self.progress_source = finder
+
+    def to_dict(self) -> Dict[str, Any]:
+        """返回任务的状态、进度以及 (已结束时的) 结果或错误信息。"""
+        data = {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.progress_source.progress_snapshot() if self.progress_source else None,
+        }
+        if self.status == SUCCEEDED:
+            data["result"] = self.result
+        elif self.status == FAILED:
+            data["error"] = self.error
+        return data
+
+class JobManager:
+    """
+    有界的本地任务队列。任务函数接收Job对象，返回 (结果, HTTP状态码)；
+    状态码不是200时，任务以失败结束，结果中的 'error' 字段作为错误信息。
+    """
+    def __init__(self, max_workers: int = 2, max_pending: int = 32, max_finished: int = 256):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="p5x-job")
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, func: Callable[[Job], Tuple[Dict, int]]) -> Job:
+        """提交一个任务，返回新建的Job。排队任务过多时抛出 JobQueueFull。"""
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job.status == PENDING)
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"排队中的任务已达上限 ({self.max_pending})")
+            job = Job(job_id=uuid.uuid4().hex, kind=kind)
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._executor.submit(self._run, job, func)
+        logger.info("任务 %s (%s) 已提交。", job.job_id, kind)
+        return job
+
+    def submit_completed(self, kind: str, result: Dict) -> Job:
+        """登记一个已有结果的任务 (如命中结果缓存)，直接以成功状态返回。"""
+        now = time.time()
+        job = Job(job_id=uuid.uuid4().hex, kind=kind, status=SUCCEEDED,
+                  started_at=now, finished_at=now, result=result)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        """
+        请求取消任务。排队中的任务立即变为已取消；运行中的任务会在搜索下一次检查时退出。
+        任务不存在时返回None。
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.cancel_event.set()
+            if job.status == PENDING:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+        logger.info("任务 %s 已请求取消。", job_id)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        """返回各状态的任务数量和队列配置。"""
+        with self._lock:
+            counts = {status: 0 for status in (PENDING, RUNNING) + TERMINAL_STATUSES}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return {"max_workers": self.max_workers, "max_pending": self.max_pending, "jobs": counts}
+
+    def shutdown(self):
+        """取消所有未结束的任务并关闭线程池。"""
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel_event.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self, job: Job, func: Callable[[Job], Tuple[Dict, int]]):
+        """[内部辅助方法] 在线程池中执行任务，并记录其最终状态。"""
+        with self._lock:
+            if job.status != PENDING:
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+        try:
+            result, status_code = func(job)
+        except SearchCancelled:
+            self._finish(job, CANCELLED)
+        except Exception:
+            logger.exception("任务 %s 执行失败", job.job_id)
+            self._finish(job, FAILED, error="服务器在执行任务时遇到内部错误。")
+        else:
+            if status_code == 200:
+                self._finish(job, SUCCEEDED, result=result)
+            else:
+                self._finish(job, FAILED, error=result.get('error'))
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: str | None = None):
+        """[内部辅助方法] 将任务标记为已结束。"""
+        with self._lock:
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+        logger.info("任务 %s 已结束，状态: %s", job.job_id, status)
+
+    def _prune(self):
+        """[内部辅助方法] 淘汰最早创建的已结束任务，调用方需持有锁。"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in TERMINAL_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
@@ -6,12 +6,15 @@ from models import BattleState, Enemy, Action
 from data_loader import DataLoader
 from simulator import BattleSimulator
 from dpr_calculator import DprCalculator
+from tracing import configure_logging
 
 def main():
     """
     程序主入口。
     负责组织和协调所有模块，以执行一次完整的团队协同分析。
     """
+    # 默认输出INFO级别日志；设置环境变量 P5X_LOG_LEVEL=DEBUG 可以查看每个行动的详细过程
+    configure_logging()
     print("--- P5X 智能分析工具 v4.1 (最终版) ---")
     
     # --- 第1步: 初始化工具并加载团队成员 ---
@@ -69,7 +72,7 @@ def main():
     print(f"\n团队总伤害: {results['total_damage']:.2f}")
     # 这里我们用“团队总伤害”除以“行动次数”来得到一个平均每次行动的伤害值
     print(f"**团队平均每次行动伤害 (DPA): {results['dpr']:.2f}**")
-    print(f"结束时Joker的Buff: {results['final_state'].character_buffs.get('Joker', [])}")
+    print(f"结束时Joker的Buff: {list(results['final_state'].character_buffs.get('Joker', {}).values())}")
     print("##################################")
 
 
@@ -1,6 +1,8 @@
 # models.py
-from dataclasses import dataclass, field
-from typing import List, Dict, Any
+import copy
+import threading
+from dataclasses import dataclass, field, fields, replace
+from typing import List, Dict, Any, Set, Tuple
 from enum import Enum, auto
 from collections import Counter
 
@@ -18,11 +20,12 @@ class RevelationPosition(Enum):
 # --- 核心数据结构 ---
 # 使用@dataclass装饰器可以自动生成__init__, __repr__等方法，让代码更简洁。
 
-@dataclass
+@dataclass(slots=True)
 class CharacterStats:
     """
     角色的属性模型。
     这个类作为所有属性的容器，无论是角色的基础属性、装备加成，还是最终面板。
+    使用 __slots__ 存储 (没有 __dict__)，需要按字段遍历时使用 as_dict() / as_tuple()。
     """
     # 基础属性
     attack: float = 0.0
@@ -40,6 +43,21 @@ class CharacterStats:
     hp_percent_bonus: float = 0.0
     crit_rate_bonus: float = 0.0
 
+    def as_dict(self) -> Dict[str, Any]:
+        """按字段定义顺序返回 {字段名: 值}。"""
+        return {name: getattr(self, name) for name in STATS_FIELDS}
+
+    def as_tuple(self) -> Tuple:
+        """按字段定义顺序返回所有字段值。"""
+        return tuple(getattr(self, name) for name in STATS_FIELDS)
+
+    def copy(self) -> "CharacterStats":
+        """返回一个浅拷贝。"""
+        return CharacterStats(*self.as_tuple())
+
+# CharacterStats 的字段名，按定义顺序
+STATS_FIELDS: Tuple[str, ...] = tuple(f.name for f in fields(CharacterStats))
+
 @dataclass
 class Enemy:
     """
@@ -53,53 +71,93 @@ class Enemy:
     vulnerability: float = 0.0        # 易伤总和, e.g., 10%易伤是0.1
     weakness_multiplier: float = 1.0  # 独立的弱点倍率, e.g., 1.5
 
-@dataclass
+    @property
+    def is_alive(self) -> bool:
+        """HP大于0的敌人仍然存活。开启HP追踪时HP可以为负，其绝对值即溢出伤害。"""
+        return self.hp > 0
+
+@dataclass(frozen=True)
 class Weapon:
-    """武器的数据模型。"""
+    """武器的数据模型 (不可变)。"""
     name: str
     base_attack: int
     crit_rate_bonus: float = 0.0
     crit_damage_bonus: float = 0.0
     penetration: float = 0.0
 
-@dataclass
+@dataclass(frozen=True)
 class Revelation:
-    """单个启示的数据模型。"""
+    """单个启示的数据模型 (不可变，主词条属性也不应被原地修改)。"""
     name: str
     set_name: str  # 所属套装名称, e.g., "力量"
     position: RevelationPosition
     main_stat: CharacterStats = field(default_factory=CharacterStats) # 主词条属性
 
-@dataclass
+@dataclass(frozen=True)
 class Skill:
-    """技能的数据模型，现在包含了类型和消耗。"""
+    """技能的数据模型，现在包含了类型和消耗 (不可变)。"""
     name: str
     multiplier: float
     sp_cost: int = 0
     skill_type: str = "NORMAL"  # 技能类型, 'NORMAL' 或 'HIGHLIGHT'
     damage_type: str = "物理"   # 伤害属性, e.g., "物理", "诅咒", "火焰"
-    effect_names: List[str] = field(default_factory=list) # 技能附带的效果名称列表
+    effect_names: Tuple[str, ...] = () # 技能附带的效果名称 (传入列表时转换为元组)
+    target_type: str = "SINGLE" # 攻击范围, 'SINGLE' (单体) 或 'ALL' (全体，命中所有存活的敌人)
 
-@dataclass
+    def __post_init__(self):
+        object.__setattr__(self, "effect_names", tuple(self.effect_names))
+
+@dataclass(frozen=True)
 class CharacterPanel:
     """
     角色面板，负责将角色的基础属性、武器和启示组合起来。
     这是一个“组装器”，本身不存储状态，只负责计算。
+
+    面板是不可变的 (启示和技能保存为元组)，可以在多个请求和线程之间共享；
+    需要更换装备时使用 dataclasses.replace 派生新的面板。
     """
     character_id: str
     base_stats: CharacterStats
     equipped_weapon: Weapon
-    revelations: List[Revelation] = field(default_factory=list)
-    skills: List[Skill] = field(default_factory=list)
+    revelations: Tuple[Revelation, ...] = ()
+    skills: Tuple[Skill, ...] = ()
+
+    # 静态面板缓存: (输入指纹, 计算结果)。不参与比较和打印。
+    _static_cache: Tuple[Tuple, CharacterStats] | None = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "revelations", tuple(self.revelations))
+        object.__setattr__(self, "skills", tuple(self.skills))
+
+    def _static_fingerprint(self) -> Tuple:
+        """
+        [内部辅助方法] 生成影响静态面板的所有输入的指纹。
+        基础属性、武器或启示被修改(包括替换对象或原地修改字段)后，指纹随之改变，缓存自动失效。
+        """
+        return (
+            self.base_stats.as_tuple(),
+            tuple(self.equipped_weapon.__dict__.values()),
+            tuple((r.set_name, r.main_stat.as_tuple()) for r in self.revelations),
+        )
 
     def get_final_stats(self) -> CharacterStats:
         """
         计算并返回应用了武器和启示套装加成后的最终【静态】属性。
         注意：此方法不计算战斗中的动态buff或被动。
+
+        静态面板在输入不变时只计算一次，之后每次返回缓存结果的副本，
+        调用方可以放心地修改返回值。
         """
+        fingerprint = self._static_fingerprint()
+        if self._static_cache is None or self._static_cache[0] != fingerprint:
+            object.__setattr__(self, "_static_cache", (fingerprint, self._compute_static_stats()))
+        return self._static_cache[1].copy()
+
+    def _compute_static_stats(self) -> CharacterStats:
+        """[内部辅助方法] 从基础属性、武器和启示套装实际计算静态面板。"""
         import game_database  # 局部导入以避免循环依赖
 
-        final_stats = CharacterStats(**self.base_stats.__dict__)
+        final_stats = self.base_stats.copy()
         final_stats.attack += self.equipped_weapon.base_attack
 
         # 创建一个临时对象来累积所有加成
@@ -108,6 +166,19 @@ class CharacterPanel:
         all_bonuses.crit_rate_bonus += self.equipped_weapon.crit_rate_bonus
         final_stats.crit_damage += self.equipped_weapon.crit_damage_bonus
 
+        # 处理启示主词条: 固定值直接计入面板，百分比类加成与武器、套装加成一起累积
+        for revelation in self.revelations:
+            main_stat = revelation.main_stat
+            final_stats.attack += main_stat.attack
+            final_stats.hp += main_stat.hp
+            final_stats.crit_damage += main_stat.crit_damage
+            final_stats.additive_damage_bonus += main_stat.additive_damage_bonus
+            final_stats.final_damage_bonus += main_stat.final_damage_bonus
+            all_bonuses.attack_percent_bonus += main_stat.attack_percent_bonus
+            all_bonuses.hp_percent_bonus += main_stat.hp_percent_bonus
+            all_bonuses.crit_rate_bonus += main_stat.crit_rate + main_stat.crit_rate_bonus
+            all_bonuses.penetration += main_stat.penetration
+
         # 处理启示套装效果
         set_counts = Counter(r.set_name for r in self.revelations)
         for name, count in set_counts.items():
@@ -121,21 +192,47 @@ class CharacterPanel:
 
         # 将累积的加成应用到最终属性上
         final_stats.attack *= (1 + all_bonuses.attack_percent_bonus)
+        final_stats.hp *= (1 + all_bonuses.hp_percent_bonus)
         final_stats.crit_rate += all_bonuses.crit_rate_bonus
         final_stats.penetration += all_bonuses.penetration
         return final_stats
 
 # --- 战斗模拟相关的数据结构 ---
 
-@dataclass
+# Buff名称到整数ID的驻留表。战斗状态中的Buff以ID为键存储，热路径上不再做名称匹配。
+_BUFF_IDS: Dict[str, int] = {}
+_BUFF_IDS_LOCK = threading.Lock()
+
+def intern_buff_name(name: str) -> int:
+    """
+    返回Buff名称对应的整数ID，首次出现的名称会被分配一个新ID。
+    已驻留的名称直接查表；分配新ID时加锁，避免多个线程同时首次使用不同名称时得到相同的ID。
+    """
+    buff_id = _BUFF_IDS.get(name)
+    if buff_id is None:
+        with _BUFF_IDS_LOCK:
+            buff_id = _BUFF_IDS.get(name)
+            if buff_id is None:
+                buff_id = _BUFF_IDS[name] = len(_BUFF_IDS)
+    return buff_id
+
+@dataclass(slots=True)
 class Buff:
-    """代表一个临时的增益或减益效果，现在支持叠加。"""
+    """
+    代表一个临时的增益或减益效果，现在支持叠加。
+    持续时间由到期回合 expires_at 表示 (见 buff_lifecycle)，为None时永久有效。
+    """
     name: str
-    duration: int
+    duration: int         # 施加时的持续回合数
     stacks: int = 1       # 当前层数
     max_stacks: int = 1   # 最大可叠加层数
+    expires_at: int | None = None # 在这个回合结束时移除
+    buff_id: int = field(init=False, repr=False, compare=False) # 由名称驻留得到的ID
 
-@dataclass
+    def __post_init__(self):
+        self.buff_id = intern_buff_name(self.name)
+
+@dataclass(slots=True)
 class Action:
     """代表一个单一的行动，包含了行动者、技能和目标。"""
     character_id: str
@@ -146,9 +243,118 @@ class Action:
 class BattleState:
     """
     代表战斗在某一时刻的完整快照，是所有动态数据的“单一数据源”。
+
+    状态采用“写时复制”(copy-on-write)的方式演进:
+    fork() 只复制外层容器，内部的资源字典、Buff列表和敌人对象在新旧状态之间共享；
+    需要修改某个子容器时，必须通过 *_for_write 系列方法获取，它们会在第一次写入前复制该子容器。
+    这样既保证了旧状态不被修改，又避免了每次行动都深度复制整个状态。
+
+    每个角色/敌人身上的Buff以 {Buff ID: Buff} 的字典存储 (ID见 intern_buff_name)，
+    同名Buff至多一个，按ID即可直接查找或替换。
+
+    敌人以 {敌人ID: 敌人} 的字典存储 (保持登场顺序)，按ID直接查找；
+    构造时也可以传入敌人列表，会自动转换为字典 (敌人ID不能重复)。
+
+    buff_expiry 是按到期回合分桶的Buff索引 {到期回合: ((种类, 单位ID, Buff ID), ...)}，
+    种类为 "buffs" (角色) 或 "debuffs" (敌人)。桶是不可变的元组，fork() 只需复制外层字典。
+    索引可能含有过期条目 (Buff已被刷新或移除)，使用时需要核对 (见 buff_lifecycle.advance_turn)。
+    构造时不提供索引，则根据传入的Buff的 expires_at 自动建立。
     """
     turn_number: int
-    character_buffs: Dict[str, List[Buff]] = field(default_factory=dict)
-    enemy_debuffs: Dict[str, List[Buff]] = field(default_factory=dict)
+    character_buffs: Dict[str, Dict[int, Buff]] = field(default_factory=dict)
+    enemy_debuffs: Dict[str, Dict[int, Buff]] = field(default_factory=dict)
     character_resources: Dict[str, Dict[str, Any]] = field(default_factory=dict)
-    enemies: List[Enemy] = field(default_factory=list)
+    enemies: Dict[str, Enemy] = field(default_factory=dict)
+    buff_expiry: Dict[int, Tuple[Tuple[str, str, int], ...]] | None = field(default=None, compare=False)
+    # 记录当前状态已经独占(已复制过、不与其他状态共享)的子容器
+    _owned: Set[Tuple[str, str]] = field(default_factory=set, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not isinstance(self.enemies, dict):
+            enemies = {}
+            for enemy in self.enemies:
+                if enemy.enemy_id in enemies:
+                    raise ValueError(f"敌人ID重复: '{enemy.enemy_id}'")
+                enemies[enemy.enemy_id] = enemy
+            self.enemies = enemies
+        if self.buff_expiry is None:
+            self.buff_expiry = {}
+            for kind, owners in (("buffs", self.character_buffs), ("debuffs", self.enemy_debuffs)):
+                for owner_id, buffs in owners.items():
+                    for buff_id, buff in buffs.items():
+                        if buff.expires_at is not None:
+                            self.schedule_expiry(kind, owner_id, buff_id, buff.expires_at)
+
+    def fork(self) -> "BattleState":
+        """
+        创建一个与当前状态结构共享的新状态。
+        调用后两个状态共享所有子容器，因此双方都放弃对子容器的独占权。
+        """
+        self._owned.clear()
+        return BattleState(
+            turn_number=self.turn_number,
+            character_buffs=dict(self.character_buffs),
+            enemy_debuffs=dict(self.enemy_debuffs),
+            character_resources=dict(self.character_resources),
+            enemies=dict(self.enemies),
+            buff_expiry=dict(self.buff_expiry),
+        )
+
+    def schedule_expiry(self, kind: str, owner_id: str, buff_id: int, turn: int):
+        """在到期索引中登记一个Buff的到期回合。"""
+        self.buff_expiry[turn] = self.buff_expiry.get(turn, ()) + ((kind, owner_id, buff_id),)
+
+    def pop_expiring(self, turn: int) -> Tuple[Tuple[str, str, int], ...]:
+        """取出并删除到期索引中登记在该回合的所有条目 (可能含有过期条目)。"""
+        return self.buff_expiry.pop(turn, ())
+
+    def get_enemy(self, enemy_id: str) -> Enemy | None:
+        """按ID查找敌人 (包括已被击败的)，找不到时返回None。"""
+        return self.enemies.get(enemy_id)
+
+    def alive_enemies(self) -> List[Enemy]:
+        """按登场顺序返回所有存活的敌人。"""
+        return [enemy for enemy in self.enemies.values() if enemy.is_alive]
+
+    def all_enemies_defeated(self) -> bool:
+        """场上有敌人且全部被击败时返回True。"""
+        return bool(self.enemies) and not any(enemy.is_alive for enemy in self.enemies.values())
+
+    def resources_for_write(self, char_id: str) -> Dict[str, Any]:
+        """获取角色资源字典的可写版本 (不存在时自动创建)。"""
+        key = ("resources", char_id)
+        if key not in self._owned:
+            self.character_resources[char_id] = dict(self.character_resources.get(char_id, {}))
+            self._owned.add(key)
+        return self.character_resources[char_id]
+
+    def buffs_for_write(self, char_id: str) -> Dict[int, Buff]:
+        """获取角色Buff字典的可写版本 (不存在时自动创建)。字典中的Buff对象也会被复制。"""
+        key = ("buffs", char_id)
+        if key not in self._owned:
+            self.character_buffs[char_id] = {
+                buff_id: copy.copy(b) for buff_id, b in self.character_buffs.get(char_id, {}).items()
+            }
+            self._owned.add(key)
+        return self.character_buffs[char_id]
+
+    def debuffs_for_write(self, enemy_id: str) -> Dict[int, Buff]:
+        """获取敌人Debuff字典的可写版本 (不存在时自动创建)。字典中的Buff对象也会被复制。"""
+        key = ("debuffs", enemy_id)
+        if key not in self._owned:
+            self.enemy_debuffs[enemy_id] = {
+                buff_id: copy.copy(b) for buff_id, b in self.enemy_debuffs.get(enemy_id, {}).items()
+            }
+            self._owned.add(key)
+        return self.enemy_debuffs[enemy_id]
+
+    def enemy_for_write(self, enemy_id: str) -> Enemy | None:
+        """获取敌人对象的可写版本，找不到时返回None。"""
+        enemy = self.enemies.get(enemy_id)
+        if enemy is None:
+            return None
+        key = ("enemy", enemy_id)
+        if key not in self._owned:
+            enemy = self.enemies[enemy_id] = replace(enemy, resistances=dict(enemy.resistances))
+            self._owned.add(key)
+        return enemy
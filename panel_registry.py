@@ -0,0 +1,383 @@
+# panel_registry.py
+"""
+角色面板注册表: 启动时一次性解析并校验全部角色，之后按角色ID以O(1)查找不可变的面板对象。
+
+- 校验: 除了数据格式，还会检查属性名、数值类型、技能类型、效果名称和技能名称是否重复等，
+  校验失败的角色不会进入注册表，错误信息记录在 errors 中 (启动时即可发现数据问题);
+- 热重载: reload_if_changed() 检测数据文件的 (修改时间, 大小)，变化时构建一份新的快照并整体替换。
+  面板不可变，正在处理的请求继续使用已经取得的旧面板；同一时刻只有一个线程执行重载，
+  其他线程不会等待，而是继续使用旧快照;
+- 内容摘要: 每个角色保存一份原始数据的摘要，用作结果缓存键的一部分，数据变化后缓存键随之改变;
+- 二进制快照: 解析和校验后的结果可以保存为压缩的二进制快照文件 (zlib压缩的pickle)，
+  启动时若数据文件未变化 (修改时间和大小与快照记录的一致)，直接加载快照，跳过JSON解析和校验。
+  快照文件只应从可信的位置加载;
+- 角色数据库: 数据文件为列式角色数据库 (见 character_store) 时，启动只读取角色索引，
+  面板在第一次查找时才读取和构建 (LazyPanels)，此时不使用二进制快照 (数据库已经校验过，读取本身就很快)。
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Tuple
+
+import game_database
+from character_store import CharacterStore, CharacterStoreError, is_character_store
+from data_loader import DataLoader
+from models import CharacterPanel, RevelationPosition, STATS_FIELDS
+from result_cache import make_cache_key
+from snapshot_file import load_snapshot_file, save_snapshot_file
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 面板快照文件的魔数和版本号 (文件格式见 snapshot_file)
+SNAPSHOT_MAGIC = b"P5XPANEL"
+SNAPSHOT_VERSION = 2
+# 通过该环境变量指定快照文件路径后，应用启动时会优先加载快照，并在重新解析后更新快照
+SNAPSHOT_ENV = "P5X_PANEL_SNAPSHOT"
+
+VALID_SKILL_TYPES = ("NORMAL", "HIGHLIGHT")
+VALID_TARGET_TYPES = ("SINGLE", "ALL")
+
+class PanelValidationError(ValueError):
+    """角色数据未通过校验时抛出。"""
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _check_stats(where: str, stats: Any, problems: List[str]):
+    """[内部辅助方法] 检查属性字典: 只能包含已知属性，且值必须是数字。"""
+    if not isinstance(stats, dict):
+        problems.append(f"{where} 必须是对象")
+        return
+    for name, value in stats.items():
+        if name not in STATS_FIELDS:
+            problems.append(f"{where} 中存在未知属性 '{name}'")
+        elif not _is_number(value):
+            problems.append(f"{where}.{name} 必须是数字")
+
+def validate_character(character_id: str, char_data: Any) -> CharacterPanel:
+    """校验一个角色的原始数据并构建面板。数据不合法时抛出 PanelValidationError (列出全部问题)。"""
+    if not isinstance(char_data, dict):
+        raise PanelValidationError(f"角色 '{character_id}' 的数据必须是对象")
+    problems: List[str] = []
+    _check_stats("base_stats", char_data.get('base_stats', {}), problems)
+
+    weapon = char_data.get('weapon')
+    if not isinstance(weapon, dict):
+        problems.append("缺少 weapon")
+    else:
+        if not isinstance(weapon.get('name'), str):
+            problems.append("weapon.name 必须是字符串")
+        for name in ('base_attack', 'crit_rate_bonus', 'crit_damage_bonus', 'penetration'):
+            if name in weapon and not _is_number(weapon[name]):
+                problems.append(f"weapon.{name} 必须是数字")
+
+    skills = char_data.get('skills', [])
+    if not isinstance(skills, list):
+        problems.append("skills 必须是列表")
+        skills = []
+    seen_names = set()
+    for i, skill in enumerate(skills):
+        where = f"skills[{i}]"
+        if not isinstance(skill, dict):
+            problems.append(f"{where} 必须是对象")
+            continue
+        name = skill.get('name')
+        if not isinstance(name, str) or not name:
+            problems.append(f"{where}.name 必须是非空字符串")
+        elif name in seen_names:
+            problems.append(f"技能名称 '{name}' 重复")
+        seen_names.add(name)
+        if not _is_number(skill.get('multiplier')) or skill['multiplier'] < 0:
+            problems.append(f"{where}.multiplier 必须是非负数")
+        sp_cost = skill.get('sp_cost', 0)
+        if not isinstance(sp_cost, int) or isinstance(sp_cost, bool) or sp_cost < 0:
+            problems.append(f"{where}.sp_cost 必须是非负整数")
+        if skill.get('skill_type', "NORMAL") not in VALID_SKILL_TYPES:
+            problems.append(f"{where}.skill_type 必须是 {VALID_SKILL_TYPES} 之一")
+        if skill.get('target_type', "SINGLE") not in VALID_TARGET_TYPES:
+            problems.append(f"{where}.target_type 必须是 {VALID_TARGET_TYPES} 之一")
+        for effect_name in skill.get('effect_names', []):
+            if effect_name not in game_database.SKILL_EFFECT_DB:
+                problems.append(f"{where} 的效果 '{effect_name}' 在规则库中不存在")
+
+    revelations = char_data.get('revelations', [])
+    if not isinstance(revelations, list):
+        problems.append("revelations 必须是列表")
+        revelations = []
+    for i, rev in enumerate(revelations):
+        where = f"revelations[{i}]"
+        if not isinstance(rev, dict):
+            problems.append(f"{where} 必须是对象")
+            continue
+        if rev.get('position') not in RevelationPosition.__members__:
+            problems.append(f"{where}.position 必须是 {list(RevelationPosition.__members__)} 之一")
+        _check_stats(f"{where}.main_stat", rev.get('main_stat', {}), problems)
+
+    if problems:
+        raise PanelValidationError(f"角色 '{character_id}' 的数据不合法: " + "; ".join(problems))
+    try:
+        return DataLoader.parse_character(character_id, char_data)
+    except (KeyError, TypeError) as e:
+        raise PanelValidationError(f"角色 '{character_id}' 的数据格式错误: {e}")
+
+class LazyPanels(Mapping):
+    """
+    由角色数据库支持的只读面板映射: 面板在第一次访问时从数据库读取并构建，之后缓存。
+    register / unregister 通过 derive() 得到新的映射 (覆盖或移除个别角色)，与原映射共享数据库和面板缓存。
+    """
+    def __init__(self, store: CharacterStore, overrides: Mapping[str, CharacterPanel] | None = None,
+                 removed: frozenset = frozenset(), cache: Dict[str, CharacterPanel] | None = None):
+        self.store = store
+        self._overrides = dict(overrides or {})
+        self._removed = removed
+        self._cache = cache if cache is not None else {}
+        self._cache_lock = threading.Lock()
+
+    def __getitem__(self, character_id: str) -> CharacterPanel:
+        panel = self._overrides.get(character_id)
+        if panel is not None:
+            return panel
+        if character_id in self._removed:
+            raise KeyError(character_id)
+        panel = self._cache.get(character_id)
+        if panel is None:
+            # 在锁外读取和构建 (其他角色的查找不必等待)，并发构建同一角色时保留先写入缓存的面板
+            panel = DataLoader.parse_character(character_id, self.store[character_id])
+            with self._cache_lock:
+                panel = self._cache.setdefault(character_id, panel)
+        return panel
+
+    def __contains__(self, character_id: object) -> bool:
+        return character_id in self._overrides or (character_id not in self._removed and character_id in self.store)
+
+    def __iter__(self) -> Iterator[str]:
+        for character_id in self.store:
+            if character_id not in self._removed:
+                yield character_id
+        for character_id in self._overrides:
+            if character_id not in self.store or character_id in self._removed:
+                yield character_id
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def derive(self, add: Tuple[str, CharacterPanel] | None = None, remove: str | None = None) -> 'LazyPanels':
+        """返回添加(或覆盖)一个角色、或移除一个角色后的新映射，原映射不变。"""
+        overrides, removed = dict(self._overrides), set(self._removed)
+        if add is not None:
+            overrides[add[0]] = add[1]
+            removed.discard(add[0])
+        if remove is not None:
+            overrides.pop(remove, None)
+            removed.add(remove)
+        return LazyPanels(self.store, overrides, frozenset(removed), self._cache)
+
+@dataclass(frozen=True)
+class RegistrySnapshot:
+    """注册表在某一时刻的完整内容。整体替换，从不原地修改。"""
+    signature: Tuple | None # 数据文件的 (修改时间, 大小)
+    panels: Mapping[str, CharacterPanel] = field(default_factory=dict)
+    digests: Mapping[str, str] = field(default_factory=dict) # 通过校验的角色 -> 原始数据的摘要 (用于生成缓存键)
+    errors: Mapping[str, str] = field(default_factory=dict) # 未通过校验的角色 -> 错误信息
+
+def build_snapshot(raw_data: Dict[str, Any], signature: Tuple | None) -> RegistrySnapshot:
+    """解析并校验全部角色，构建一份快照。未通过校验的角色记录在 errors 中。"""
+    panels, digests, errors = {}, {}, {}
+    for character_id, char_data in raw_data.items():
+        try:
+            panels[character_id] = validate_character(character_id, char_data)
+            digests[character_id] = make_cache_key(char_data)
+        except PanelValidationError as e:
+            errors[character_id] = str(e)
+            logger.error("%s", e)
+    return RegistrySnapshot(signature, MappingProxyType(panels), MappingProxyType(digests), MappingProxyType(errors))
+
+def save_snapshot(snapshot: RegistrySnapshot, path: str):
+    """将快照写入二进制文件 (格式见 snapshot_file)。"""
+    payload = (snapshot.signature, dict(snapshot.panels), dict(snapshot.digests), dict(snapshot.errors))
+    save_snapshot_file(path, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, payload)
+
+def load_snapshot(path: str) -> RegistrySnapshot | None:
+    """从二进制文件加载快照。文件不存在、格式或版本不符时返回None。"""
+    payload = load_snapshot_file(path, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, "面板快照")
+    if payload is None:
+        return None
+    signature, panels, digests, errors = payload
+    return RegistrySnapshot(signature, MappingProxyType(panels), MappingProxyType(digests), MappingProxyType(errors))
+
+class PanelRegistry:
+    """
+    预加载、已校验的角色面板注册表。提供与 DataLoader 相同的 load_character_panel / reload_if_changed 接口，
+    但返回的面板是共享的不可变对象，查找时不再解析数据。
+    """
+    def __init__(self, data_filepath: str, snapshot_path: str | None = None):
+        self.data_filepath = data_filepath
+        self.snapshot_path = snapshot_path
+        self._snapshot = RegistrySnapshot(signature=None)
+        self._reload_lock = threading.Lock()
+        self.reload()
+
+    @property
+    def snapshot(self) -> RegistrySnapshot:
+        return self._snapshot
+
+
+    @property
+    def errors(self) -> Mapping[str, str]:
+        """未通过校验的角色及其错误信息。"""
+        return self._snapshot.errors
+
+    def ids(self) -> List[str]:
+        return list(self._snapshot.panels)
+
+    def __contains__(self, character_id: str) -> bool:
+        return character_id in self._snapshot.panels
+
+    def digest(self, character_id: str) -> str | None:
+        """返回角色原始数据的摘要，角色不存在时返回None。"""
+        return self._snapshot.digests.get(character_id)
+
+    def get(self, character_id: str) -> CharacterPanel | None:
+        """返回角色的面板，不存在时返回None。"""
+        return self._snapshot.panels.get(character_id)
+
+    def load_character_panel(self, character_id: str) -> CharacterPanel | None:
+        """与 DataLoader.load_character_panel 相同，但直接返回预先构建的面板。"""
+        panel = self._snapshot.panels.get(character_id)
+        if panel is None:
+            error = self._snapshot.errors.get(character_id)
+            logger.error("%s", error or f"在数据文件中找不到角色: '{character_id}'")
+        return panel
+
+    def _file_signature(self) -> Tuple | None:
+        """[内部辅助方法] 数据文件的 (修改时间, 大小)，文件不存在时返回None。"""
+        try:
+            stat = os.stat(self.data_filepath)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self):
+        """重新加载数据文件 (数据文件未变化且存在快照时直接加载快照)。"""
+        with self._reload_lock:
+            self._load(self._file_signature())
+
+    def reload_if_changed(self) -> bool:
+        """
+        如果数据文件自上次加载后被修改过，则重新加载。返回是否发生了重新加载。
+        已有其他线程在重新加载时立即返回False，调用方继续使用当前快照。
+        """
+        if self._file_signature() == self._snapshot.signature:
+            return False
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            signature = self._file_signature()
+            if signature == self._snapshot.signature:
+                return False
+            logger.info("检测到数据文件 '%s' 已变化，重新加载。", self.data_filepath)
+            self._load(signature)
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def _load(self, signature: Tuple | None):
+        """[内部辅助方法] 构建新的快照并整体替换当前快照，调用方需持有重载锁。"""
+        if is_character_store(self.data_filepath):
+            self._load_store(signature)
+            return
+
+        if self.snapshot_path and signature is not None:
+            snapshot = load_snapshot(self.snapshot_path)
+            if snapshot is not None and snapshot.signature == signature:
+                self._snapshot = snapshot
+                logger.info("从快照 '%s' 加载了 %d 个角色面板。", self.snapshot_path, len(snapshot.panels))
+                return
+
+        try:
+            with open(self.data_filepath, 'r', encoding='utf-8') as f:
+                raw_data = json.load(f)
+        except FileNotFoundError:
+            logger.error("数据文件未找到: %s", self.data_filepath)
+            raw_data = {}
+        except json.JSONDecodeError:
+            # 保留当前快照: 数据文件可能正在被写入，下一次变化时会再次尝试
+            logger.error("解析JSON文件失败: %s，继续使用之前加载的数据。", self.data_filepath)
+            self._snapshot = RegistrySnapshot(signature, self._snapshot.panels, self._snapshot.digests, self._snapshot.errors)
+            return
+
+        snapshot = build_snapshot(raw_data, signature)
+        self._snapshot = snapshot
+        logger.info("成功从 '%s' 加载并校验了 %d 个角色面板 (%d 个未通过校验)。",
+                    self.data_filepath, len(snapshot.panels), len(snapshot.errors))
+        if self.snapshot_path and signature is not None:
+            try:
+                save_snapshot(snapshot, self.snapshot_path)
+            except OSError as e:
+                logger.warning("写入面板快照 '%s' 失败: %s", self.snapshot_path, e)
+
+    def _load_store(self, signature: Tuple | None):
+        """[内部辅助方法] 打开角色数据库，构建延迟加载面板的快照，调用方需持有重载锁。"""
+        try:
+            store = CharacterStore(self.data_filepath)
+        except CharacterStoreError as e:
+            logger.error("%s，继续使用之前加载的数据。", e)
+            self._snapshot = RegistrySnapshot(signature, self._snapshot.panels, self._snapshot.digests, self._snapshot.errors)
+            return
+        self._snapshot = RegistrySnapshot(
+            signature, LazyPanels(store), MappingProxyType(dict(store.digests)), MappingProxyType(dict(store.errors))
+        )
+        logger.info("成功打开角色数据库 '%s': %d 个角色面板 (%d 个未通过校验)，面板在首次使用时加载。",
+                    self.data_filepath, len(store.digests), len(store.errors))
+
+    def register(self, character_id: str, char_data: Dict[str, Any]) -> CharacterPanel:
+        """
+        在内存中添加或替换一个角色 (不修改数据文件)，主要用于测试和基准测试。
+        数据不合法时抛出 PanelValidationError。数据文件重新加载后该角色会被丢弃。
+        """
+        panel = validate_character(character_id, char_data)
+        with self._reload_lock:
+            current = self._snapshot
+            self._snapshot = RegistrySnapshot(
+                current.signature,
+                _with_panel(current.panels, character_id, panel),
+                MappingProxyType({**current.digests, character_id: make_cache_key(char_data)}),
+                MappingProxyType({k: v for k, v in current.errors.items() if k != character_id}),
+            )
+        return panel
+
+    def unregister(self, character_id: str):
+        """从内存中移除一个角色。"""
+        with self._reload_lock:
+            current = self._snapshot
+            self._snapshot = RegistrySnapshot(
+                current.signature,
+                _without_panel(current.panels, character_id),
+                MappingProxyType({k: v for k, v in current.digests.items() if k != character_id}),
+                current.errors,
+            )
+
+def _with_panel(panels: Mapping[str, CharacterPanel], character_id: str, panel: CharacterPanel) -> Mapping[str, CharacterPanel]:
+    """[内部辅助方法] 返回添加了一个面板的新映射 (延迟加载的映射不会因此读取全部角色)。"""
+    if isinstance(panels, LazyPanels):
+        return panels.derive(add=(character_id, panel))
+    return MappingProxyType({**panels, character_id: panel})
+
+def _without_panel(panels: Mapping[str, CharacterPanel], character_id: str) -> Mapping[str, CharacterPanel]:
+    """[内部辅助方法] 返回移除了一个面板的新映射。"""
+    if isinstance(panels, LazyPanels):
+        return panels.derive(remove=character_id)
+    return MappingProxyType({k: v for k, v in panels.items() if k != character_id})
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="解析并校验角色数据文件，生成二进制面板快照。")
+    parser.add_argument('data_file', help='角色数据JSON文件')
+    parser.add_argument('snapshot_file', help='输出的快照文件路径')
+    args = parser.parse_args()
+    registry = PanelRegistry(args.data_file, snapshot_path=args.snapshot_file)
+    print(f"快照 '{args.snapshot_file}' 包含 {len(registry.snapshot.panels)} 个角色面板，"
+          f"{len(registry.errors)} 个角色未通过校验。")
@@ -0,0 +1,180 @@
+# profiling.py
+"""
+性能剖析: 模拟器的分阶段计时/计数器、单次请求的cProfile采集，以及Prometheus文本格式的指标导出。
+
+- 分阶段计时: SimulatorMetrics 记录每个阶段的调用次数和累计耗时。模拟器开启计量时 (BattleSimulator.enable_metrics)
+  用计时包装替换实例上的各阶段函数；未开启时模拟器的代码路径完全不变，热路径上没有任何额外判断。
+  阶段之间可以嵌套 (如 final_stats 包含 dynamic_buffs 和 passives)，各阶段的耗时分别统计;
+- 按请求汇总: capture_metrics() 在当前上下文中开启计量，期间创建的模拟器自动计入同一个 SimulatorMetrics。
+  并行搜索的工作进程和异步任务线程中创建的模拟器不会被计入；多个线程共用一个模拟器时计数为近似值;
+- cProfile: capture_profile() 在当前线程中运行cProfile，结束后给出按累计耗时排序的pstats文本。
+  cProfile 不支持多个剖析同时进行，同一时刻只允许一个采集，其余请求跳过剖析并返回说明;
+- Prometheus: MetricsRegistry 汇总所有请求的阶段计数和HTTP请求计数，render_prometheus() 输出文本格式。
+"""
+import contextvars
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+# 设置该环境变量为 1 时，所有请求中模拟器的阶段计数都会汇总到 /metrics (默认只统计带 "profile": true 的请求)
+METRICS_ENV = "P5X_SIMULATOR_METRICS"
+# pstats 文本中保留的函数条数
+DEFAULT_PROFILE_LIMIT = 40
+
+# Prometheus 指标族: (名称, 类型, 说明, [(标签, 数值), ...])
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+# 当前上下文(线程/协程)中的阶段计量，为None表示未开启
+_current_metrics: contextvars.ContextVar = contextvars.ContextVar("p5x_simulator_metrics", default=None)
+_profile_lock = threading.Lock()
+
+class SimulatorMetrics:
+    """一组阶段计时器: 阶段名 -> 调用次数 / 累计耗时(秒)。"""
+    def __init__(self):
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.seconds: Dict[str, float] = defaultdict(float)
+
+    def timed(self, phase: str, func: Callable) -> Callable:
+        """返回计时包装后的函数，每次调用计入给定阶段。"""
+        calls, seconds, clock = self.calls, self.seconds, time.perf_counter
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds[phase] += clock() - start
+                calls[phase] += 1
+        return wrapper
+
+    def count(self, name: str, n: int = 1):
+        """只计数、不计时的事件 (如失败的行动)。"""
+        self.calls[name] += n
+
+    def merge(self, other: 'SimulatorMetrics'):
+        for name, n in list(other.calls.items()):
+            self.calls[name] += n
+        for name, s in list(other.seconds.items()):
+            self.seconds[name] += s
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """按累计耗时从高到低列出各阶段的调用次数、累计耗时和平均耗时(微秒)。"""
+        names = sorted(self.calls, key=lambda name: self.seconds.get(name, 0.0), reverse=True)
+        result = {}
+        for name in names:
+            entry = {"calls": self.calls[name]}
+            if name in self.seconds:
+                entry["seconds"] = self.seconds[name]
+                entry["mean_us"] = self.seconds[name] / self.calls[name] * 1e6 if self.calls[name] else 0.0
+            result[name] = entry
+        return result
+
+def current_metrics() -> SimulatorMetrics | None:
+    """返回当前上下文中开启的阶段计量 (见 capture_metrics)，未开启时返回None。"""
+    return _current_metrics.get()
+
+@contextmanager
+def capture_metrics() -> Iterator[SimulatorMetrics]:
+    """
+    在当前上下文中开启阶段计量，期间创建的模拟器都计入返回的 SimulatorMetrics。
+
+    用法:
+        with capture_metrics() as metrics:
+            ...
+        response['profile'] = metrics.to_dict()
+    """
+    metrics = SimulatorMetrics()
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+@dataclass
+class ProfileCapture:
+    """一次cProfile采集的结果: 成功时为pstats文本，无法采集时为说明。"""
+    text: str | None = None
+    error: str | None = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"stats": self.text} if self.error is None else {"error": self.error}
+
+@contextmanager
+def capture_profile(limit: int = DEFAULT_PROFILE_LIMIT) -> Iterator[ProfileCapture]:
+    """在当前线程中运行cProfile，结束后在返回的 ProfileCapture 中给出按累计耗时排序的前 limit 个函数。"""
+    capture = ProfileCapture()
+    if not _profile_lock.acquire(blocking=False):
+        capture.error = "另一个请求正在进行cProfile采集，本次请求未采集。"
+        yield capture
+        return
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield capture
+        finally:
+            profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+        capture.text = stream.getvalue()
+    finally:
+        _profile_lock.release()
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_family(name: str, kind: str, help_text: str, samples: List[Tuple[Dict[str, str], float]]) -> List[str]:
+    """[内部辅助函数] 按Prometheus文本格式输出一个指标族。"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return lines
+
+class MetricsRegistry:
+    """进程内的指标汇总 (线程安全): 模拟器阶段计数和HTTP请求计数。"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.simulator = SimulatorMetrics()
+        self.requests: Dict[Tuple[str, int], int] = defaultdict(int)
+        self.request_seconds: Dict[str, float] = defaultdict(float)
+
+    def record_simulator(self, metrics: SimulatorMetrics):
+        with self._lock:
+            self.simulator.merge(metrics)
+
+    def record_request(self, endpoint: str, status: int, seconds: float):
+        with self._lock:
+            self.requests[endpoint, status] += 1
+            self.request_seconds[endpoint] += seconds
+
+    def render_prometheus(self, extra: Iterable[MetricFamily] = ()) -> str:
+        """输出Prometheus文本格式 (0.0.4) 的全部指标，extra 为调用方附加的指标族 (如缓存和任务队列统计)。"""
+        with self._lock:
+            calls = dict(self.simulator.calls)
+            seconds = dict(self.simulator.seconds)
+            requests = dict(self.requests)
+            request_seconds = dict(self.request_seconds)
+        families: List[MetricFamily] = [
+            ("p5x_simulator_phase_calls_total", "counter", "模拟器各阶段的调用次数。",
+             [({"phase": name}, n) for name, n in sorted(calls.items())]),
+            ("p5x_simulator_phase_seconds_total", "counter", "模拟器各阶段的累计耗时(秒)，阶段之间可以嵌套。",
+             [({"phase": name}, s) for name, s in sorted(seconds.items())]),
+            ("p5x_http_requests_total", "counter", "按接口和状态码统计的HTTP请求数。",
+             [({"endpoint": endpoint, "status": str(status)}, n) for (endpoint, status), n in sorted(requests.items())]),
+            ("p5x_http_request_seconds_total", "counter", "按接口统计的请求处理累计耗时(秒)，流式响应只计到开始返回为止。",
+             [({"endpoint": endpoint}, s) for endpoint, s in sorted(request_seconds.items())]),
+            *extra,
+        ]
+        lines = []
+        for family in families:
+            lines.extend(_format_family(*family))
+        return "\n".join(lines) + "\n"
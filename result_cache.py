@@ -0,0 +1,97 @@
+# result_cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    根据任意可JSON序列化的输入生成规范化的缓存键。
+    字典按键排序后序列化，因此内容相同、键顺序不同的输入会得到相同的键。
+    """
+    canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class ResultCache:
+    """
+    线程安全的LRU + TTL结果缓存，用于缓存API的计算结果。
+    - 条目数和总大小(按结果的JSON序列化长度估算)都有上限，超出时淘汰最久未使用的条目;
+    - 条目超过TTL后视为失效;
+    - 记录命中、未命中和淘汰次数。
+    缓存的值应当是可JSON序列化的数据，读取时返回的是独立的副本。
+    """
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024, ttl_seconds: float = 600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple] = OrderedDict() # 键 -> (过期时间, 大小, 序列化后的值)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any | None:
+        """读取缓存，未命中或已过期时返回None。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            payload = entry[2]
+        return json.loads(payload)
+
+    def put(self, key: str, value: Any):
+        """写入缓存。单个结果超过总大小上限时不缓存。"""
+        payload = json.dumps(value, ensure_ascii=False)
+        size = len(payload)
+        if size > self.max_bytes:
+            logger.debug("结果大小 %d 超过缓存上限，跳过缓存。", size)
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, payload)
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        """清空所有条目 (统计计数保留)。"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存的统计信息。"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key: str):
+        """[内部辅助方法] 删除条目并更新总大小，调用方需持有锁。"""
+        _, size, _ = self._entries.pop(key)
+        self._total_bytes -= size
@@ -1,10 +1,120 @@
 # rotation_finder.py
 import copy
-from typing import List, Dict, Tuple
+import math
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Iterator, List, Dict, Tuple
 
 from models import CharacterPanel, BattleState, Skill, Action # 确保导入Action
-from dpr_calculator import DprCalculator
+from dpr_calculator import DprCalculator, PrefixTreeEvaluator
 from simulator import BattleSimulator, HIGHLIGHT_MAX_ENERGY
+from search_state import StateEncoder
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 支持的搜索模式:
+#   'exhaustive' - 穷举所有技能序列，在每个叶子节点评估整个排轴 (原始实现，作为基准；
+#                  排轴经前缀树评估器评估，共享的前缀只模拟一次)
+#   'memo'       - 记忆化状态空间搜索 + 分支定界，合并等价状态并剪除不可能更优的分支
+SEARCH_MODES = ("exhaustive", "memo")
+
+# 支持的搜索目标:
+#   'dpr' - 在给定回合内造成的总伤害 (DPR) 最高
+#   'ttk' - 用最少的行动击败所有敌人 (击杀时间)，需要模拟器开启敌人HP追踪；
+#           回合内无法击败所有敌人时，退化为总伤害最高
+ROTATION_OBJECTIVES = ("dpr", "ttk")
+
+# 分支定界剪枝时使用的相对容差，用于吸收浮点数求和顺序带来的微小误差，
+# 保证被剪掉的分支在数值上确实严格劣于当前最优解。
+BOUND_TOLERANCE = 1e-9
+
+# 并行搜索时默认的切分深度: 每个长度为该值的可行技能前缀作为一个独立的子任务
+DEFAULT_SPLIT_DEPTH = 2
+
+# 每访问这么多个搜索节点检查一次取消请求，避免在热路径上频繁调用检查函数
+CANCEL_CHECK_INTERVAL = 1024
+
+# 并行搜索时主进程等待子任务的轮询间隔(秒)，期间会检查取消请求
+PARALLEL_POLL_SECONDS = 0.2
+
+# 流式搜索 (iter_search) 在没有新的最优解时推送进度事件的间隔(秒)
+STREAM_HEARTBEAT_SECONDS = 0.1
+
+class SearchCancelled(Exception):
+    """搜索被调用方 (通过 should_cancel) 取消时抛出。"""
+
+class SearchBudgetExhausted(Exception):
+    """[内部] 搜索用完了时间或节点预算。find_best_rotation 会捕获它并返回当前最优解。"""
+
+# 并行搜索的工作进程中，由所有进程共享的“当前最优DPR”，用于跨进程剪枝
+_worker_shared_best = None
+# 并行搜索的工作进程中共享的取消标志，非0表示主进程已取消本次搜索
+_worker_cancel_flag = None
+
+def _init_worker(shared_best, cancel_flag):
+    """[进程池初始化函数] 在工作进程中保存共享的最优DPR和取消标志。"""
+    global _worker_shared_best, _worker_cancel_flag
+    _worker_shared_best = shared_best
+    _worker_cancel_flag = cancel_flag
+
+def _search_prefix_in_worker(
+    panels: List[CharacterPanel],
+    character_id: str,
+    turns: int,
+    initial_state: BattleState,
+    target_id: str,
+    search_mode: str,
+    prefix: List[Action],
+    prefix_state: BattleState,
+    prefix_damage: float,
+    track_enemy_hp: bool = False
+) -> Tuple[Dict | None, int]:
+    """
+    [工作进程入口] 在独立进程中搜索以给定前缀开头的子树。
+    返回该子树内的最优排轴和访问过的节点数。
+    """
+    simulator = BattleSimulator(panels, track_enemy_hp=track_enemy_hp)
+    finder = RotationFinder(simulator, DprCalculator(simulator))
+    finder.target_id = target_id
+    finder.initial_state = initial_state
+    finder.shared_best = _worker_shared_best
+    if _worker_cancel_flag is not None:
+        finder.should_cancel = lambda: _worker_cancel_flag.value != 0
+    finder._search_subtree(simulator.characters[character_id], turns, search_mode, prefix, prefix_state, prefix_damage)
+    return finder.best_rotation_info, finder.nodes_explored
+
+def _path_actions(path: Tuple | None) -> List[Action]:
+    """
+    [内部辅助函数] 将链式路径还原为行动列表。
+    搜索过程中路径以 (行动, 父路径) 的嵌套元组表示，子节点共享父节点的路径，
+    扩展一步只需创建一个二元组，而不是复制整个列表；只有需要输出时才还原。
+    """
+    actions = []
+    while path is not None:
+        action, path = path
+        actions.append(action)
+    actions.reverse()
+    return actions
+
+def _path_from_actions(actions: List[Action]) -> Tuple | None:
+    """[内部辅助函数] 将行动列表转换为链式路径。"""
+    path = None
+    for action in actions:
+        path = (action, path)
+    return path
+
+def _rotation_info(actions: List[Action], dpr_results: Dict) -> Dict:
+    """[内部辅助函数] 打包一个排轴的结果: 技能名称、每个行动的目标、行动列表和DPR结果。"""
+    return {
+        "rotation": [action.skill_used.name for action in actions],
+        "targets": [action.target_id for action in actions],
+        "actions": actions,
+        "dpr_results": dpr_results,
+    }
 
 class RotationFinder:
     """
@@ -15,101 +125,698 @@ class RotationFinder:
         self.dpr_calculator = dpr_calculator
         self.best_dpr = -1.0
         self.best_rotation_info = None
-        self.target_id = None # 新增一个实例变量来存储本次搜索的目标ID
-        print("智能排轴查找器已初始化 (带目标感知)。")
+        self.target_id = None # 默认目标: 全体/辅助技能以及没有存活敌人时使用
+        self.shared_best = None # 并行搜索时由多个进程共享的最优DPR (multiprocessing.Value)
+        self._encoder: StateEncoder | None = None # 记忆化搜索期间的状态编码器/驻留表
+        self._prefix_evaluator: PrefixTreeEvaluator | None = None # 穷举搜索期间评估叶子排轴
+        # 进度信息: 可以在搜索进行中从其他线程读取 (见 progress_snapshot)
+        self.nodes_explored = 0
+        self.progress = 0.0 # 已完成的搜索树比例，0~1
+        self.started_at = None
+        self.finished_at = None
+        # 可选的取消检查函数，返回True时搜索抛出SearchCancelled
+        self.should_cancel: Callable[[], bool] | None = None
+        # 可选的回调: 每发现一个更优的排轴时以 improvement_event() 的结果调用 (在搜索线程中)
+        self.on_improvement: Callable[[Dict], None] | None = None
+        # 随时终止 (anytime) 的搜索预算: 截止时间 (time.monotonic()) 和节点数上限，由 find_best_rotation 设置
+        self._deadline: float | None = None
+        self._node_limit: int | None = None
+        self.budget_exhausted = False # 本次搜索是否因预算用完而提前结束 (结果为当前最优，不保证全局最优)
+        self._seed_pending = False # 当前最优解是否为贪心种子 (见 _seed_greedy)
+        logger.debug("智能排轴查找器已初始化 (带目标感知)。")
+
+    def _count_node(self):
+        """[内部辅助方法] 统计访问过的节点数，并检查节点预算；定期检查是否已被取消或超出时间预算。"""
+        self.nodes_explored += 1
+        if self._node_limit is not None and self.nodes_explored > self._node_limit:
+            raise SearchBudgetExhausted()
+        if self.nodes_explored % CANCEL_CHECK_INTERVAL == 0:
+            if self.should_cancel is not None and self.should_cancel():
+                raise SearchCancelled()
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                raise SearchBudgetExhausted()
+
+    def _budget_exceeded(self) -> bool:
+        """[内部辅助方法] 并行搜索的主进程在轮询时检查预算 (节点数按已完成的子任务累计)。"""
+        return ((self._deadline is not None and time.monotonic() >= self._deadline)
+                or (self._node_limit is not None and self.nodes_explored > self._node_limit))
+
+    def _elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def _improves(self, dpr: float) -> bool:
+        """
+        [内部辅助方法] 判断叶子排轴是否应取代当前最优解。搜索得到的排轴之间严格大于才替换 (平局保留遍历顺序靠前的)；
+        贪心种子在平局 (含浮点求和误差) 时让位于搜索得到的排轴，因此种子不会改变最终结果。
+        """
+        if self._seed_pending:
+            return dpr >= self.best_dpr - BOUND_TOLERANCE * max(1.0, abs(self.best_dpr))
+        return dpr > self.best_dpr
+
+    def _record_best(self, info: Dict, seed: bool = False):
+        """[内部辅助方法] 记录新的最优排轴，并通知 on_improvement。"""
+        self.best_dpr = info["dpr_results"]["dpr"]
+        self.best_rotation_info = info
+        self._seed_pending = seed
+        logger.debug("*** 新的最优DPR被发现: %.2f ***", self.best_dpr)
+        if self.on_improvement is not None:
+            self.on_improvement(self.improvement_event())
+
+    def improvement_event(self) -> Dict:
+        """当前最优排轴及发现它时的节点数和已用时间 (可JSON序列化)。"""
+        info = self.best_rotation_info
+        return {
+            "dpr": info["dpr_results"]["dpr"],
+            "total_damage": info["dpr_results"]["total_damage"],
+            "rotation": info["rotation"],
+            "targets": info["targets"],
+            "nodes_explored": self.nodes_explored,
+            "elapsed_seconds": self._elapsed(),
+        }
+
+    def progress_snapshot(self) -> Dict:
+        """
+        返回当前搜索进度: 已访问节点数、已完成比例、当前最优DPR和排轴、已用时间和预计剩余时间。
+        完成比例按搜索树的分支均分估算 (每个节点的权重平均分给其可行的子节点)，
+        被剪枝的分支视为立即完成，因此预计剩余时间只是一个粗略估计。
+        """
+        elapsed = self._elapsed()
+        progress = min(self.progress, 1.0)
+        eta = None
+        if self.finished_at is not None:
+            eta = 0.0
+        elif progress > 0:
+            eta = elapsed * (1 - progress) / progress
+        best_info = self.best_rotation_info
+        return {
+            "nodes_explored": self.nodes_explored,
+            "progress": progress,
+            "best_dpr": best_info["dpr_results"]["dpr"] if best_info else None,
+            "best_rotation": best_info["rotation"] if best_info else None,
+            "elapsed_seconds": elapsed,
+            "eta_seconds": eta,
+            "budget_exhausted": self.budget_exhausted,
+        }
+
+    def _is_skill_possible(self, character_panel: CharacterPanel, skill: Skill, state: BattleState) -> bool:
+        """
+        [内部辅助方法] 检查角色在给定状态下的资源是否足以使用该技能。
+        """
+        resources = state.character_resources.get(character_panel.character_id, {})
+        if skill.skill_type == "HIGHLIGHT":
+            return resources.get("h_energy", 0) >= HIGHLIGHT_MAX_ENERGY
+        return resources.get("sp", 0) >= skill.sp_cost
+
+    def _candidate_actions(self, character_panel: CharacterPanel, state: BattleState) -> List[Action]:
+        """
+        [内部辅助方法] 列出角色在给定状态下所有可行的行动 (技能 × 目标)，按技能顺序、再按敌人登场顺序排列。
+        单体伤害技能对每个存活的敌人各生成一个行动 (目标选择)；全体技能和辅助技能只以默认目标生成一个行动。
+        没有存活的敌人时，所有技能都以默认目标生成一个行动。
+        """
+        char_id = character_panel.character_id
+        target_ids = [enemy.enemy_id for enemy in state.alive_enemies()] or [self.target_id]
+        actions = []
+        for skill in character_panel.skills:
+            if not self._is_skill_possible(character_panel, skill, state):
+                continue
+            if skill.damage_type == "辅助" or skill.target_type == "ALL":
+                actions.append(Action(char_id, skill, self.target_id))
+            else:
+                actions.extend(Action(char_id, skill, target_id) for target_id in target_ids)
+        return actions
 
     def _find_rotations_recursive(
         self,
         character_panel: CharacterPanel,
         turns_left: int,
-        current_path: List[Skill],
-        current_state: BattleState
+        current_path: Tuple | None,
+        current_state: BattleState,
+        progress_weight: float = 0.0
     ):
         """
         [核心] 使用递归深度优先搜索来查找所有可行的排轴。
+        current_path 为链式路径 (见 _path_actions)。
+        progress_weight 为该子树在整棵搜索树中所占的进度比例。
         """
+        self._count_node()
         # 基本情况: 如果没有剩余回合，说明我们找到了一个完整的、可行的排轴
         if turns_left == 0:
             # 使用DPR计算器评估这个排轴的性能
-            result = self.dpr_calculator.calculate_team_dpr(
-                team_rotation=[Action(character_panel.character_id, skill, self.target_id) for skill in current_path],
-                initial_state=self.initial_state
-            )
+            path_actions = _path_actions(current_path)
+            result = self._prefix_evaluator.evaluate(path_actions)
             
             # 如果找到了一个更高DPR的排轴，就更新记录
-            if result and result.get('dpr', -1) > self.best_dpr:
-                self.best_dpr = result['dpr']
-                self.best_rotation_info = {
-                    "rotation": [skill.name for skill in current_path],
-                    "dpr_results": result
-                }
-                print(f"*** 新的最优DPR被发现: {self.best_dpr:.2f} ***")
+            if result and self._improves(result.get('dpr', -1)):
+                self._record_best(_rotation_info(path_actions, result))
+            self.progress += progress_weight
             return
 
-        # 递归步骤: 尝试在当前状态下使用每一个可用技能
-        for skill in character_panel.skills:
-            resources = current_state.character_resources.get(character_panel.character_id, {})
-            is_possible = False
-            
-            # 智能检查资源是否足够
-            if skill.skill_type == "HIGHLIGHT":
-                if resources.get("h_energy", 0) >= HIGHLIGHT_MAX_ENERGY:
-                    is_possible = True
-            elif resources.get("sp", 0) >= skill.sp_cost:
-                is_possible = True
+        # 智能检查资源是否足够，只保留当前可用的技能 (单体技能对每个存活的敌人各尝试一次)
+        possible_actions = self._candidate_actions(character_panel, current_state)
+        if not possible_actions:
+            self.progress += progress_weight
+            return
+        child_weight = progress_weight / len(possible_actions)
+
+        # 递归步骤: 尝试在当前状态下执行每一个可行的行动
+        for action in possible_actions:
+            # 将Action对象传递给模拟器，以推演下一步的状态
+            damage, next_state = self.simulator.process_action(current_state, action)
             
-            if is_possible:
-                # --- FIX: 此处是关键修正 ---
-                # 1. 创建一个包含正确目标ID的Action对象
-                action_to_process = Action(
-                    character_id=character_panel.character_id, 
-                    skill_used=skill, 
-                    target_id=self.target_id # 使用我们已锁定的目标ID
+            # 只有在行动有效时才继续
+            if damage >= 0:
+                self._find_rotations_recursive(
+                    character_panel=character_panel,
+                    turns_left=turns_left - 1,
+                    current_path=(action, current_path),
+                    current_state=next_state,
+                    progress_weight=child_weight
                 )
-                
-                # 2. 将这个Action对象传递给模拟器，以推演下一步的状态
-                damage, next_state = self.simulator.process_action(current_state, action_to_process)
-                
-                # 只有在行动有效时才继续
+            else:
+                self.progress += child_weight
+
+    def _expand(self, character_panel: CharacterPanel, state_key: Tuple, state: BattleState) -> List[Tuple]:
+        """
+        [内部辅助方法] 返回一个状态的所有合法后继 (行动, 伤害, 新状态, 新状态键)。
+        每个等价状态只会被模拟器推演一次，结果缓存在转移表中。
+        新状态按编码驻留: 编码相同的状态只保留最先到达的那一个对象，转移表中只存引用。
+        """
+        transitions = self._transitions.get(state_key)
+        if transitions is None:
+            transitions = []
+            for action in self._candidate_actions(character_panel, state):
+                damage, next_state = self.simulator.process_action(state, action)
                 if damage >= 0:
-                    self._find_rotations_recursive(
-                        character_panel=character_panel,
-                        turns_left=turns_left - 1,
-                        current_path=current_path + [skill],
-                        current_state=next_state
-                    )
+                    next_key, next_state = self._encoder.intern(next_state)
+                    transitions.append((action, damage, next_state, next_key))
+            self._transitions[state_key] = transitions
+        return transitions
+
+    def _best_future_damage(
+        self,
+        character_panel: CharacterPanel,
+        turns_left: int,
+        state_key: Tuple,
+        state: BattleState,
+        progress_weight: float = 0.0
+    ) -> float:
+        """
+        [内部辅助方法] 动态规划: 计算从给定状态出发、在剩余回合内能造成的最大总伤害。
+        若不存在任何可行的完整排轴，则返回负无穷。
+        该值作为分支定界的上界，对每个(剩余回合, 状态)只计算一次。
+        """
+        if turns_left == 0:
+            self.progress += progress_weight
+            return 0.0
+        memo_key = (turns_left, state_key)
+        cached = self._future_memo.get(memo_key)
+        if cached is not None:
+            self.progress += progress_weight
+            return cached
+
+        self._count_node()
+        best = float('-inf')
+        transitions = self._expand(character_panel, state_key, state)
+        if not transitions:
+            self.progress += progress_weight
+        child_weight = progress_weight / len(transitions) if transitions else 0.0
+        for _, damage, next_state, next_key in transitions:
+            future = self._best_future_damage(character_panel, turns_left - 1, next_key, next_state, child_weight)
+            best = max(best, damage + future)
+        self._future_memo[memo_key] = best
+        return best
+
+    def _find_rotations_memoized(
+        self,
+        character_panel: CharacterPanel,
+        turns_left: int,
+        current_path: Tuple | None,
+        current_state: BattleState,
+        state_key: Tuple,
+        accumulated_damage: float,
+        progress_weight: float = 0.0
+    ):
+        """
+        [核心] 记忆化分支定界搜索。
+        - 沿路径累加伤害，叶子节点无需重放整个排轴;
+        - 同一深度下的等价状态，只保留累计伤害最高(且最先到达)的那条路径;
+        - 若 "已累计伤害 + 剩余回合最大伤害" 无法超过当前最优，直接剪枝。
+        遍历顺序与穷举搜索一致，因此返回的最优排轴也完全相同。
+        """
+        self._count_node()
+        if turns_left == 0:
+            dpr = accumulated_damage / self.total_turns if self.total_turns else 0
+            if self._improves(dpr):
+                self._record_best(_rotation_info(_path_actions(current_path), {
+                    "total_damage": accumulated_damage,
+                    "dpr": dpr,
+                    "final_state": current_state
+                }))
+                self._publish_best(dpr)
+            self.progress += progress_weight
+            return
+
+        # 等价状态去重: 同一深度、同一状态下，累计伤害不高于已访问路径的分支不可能更优
+        table_key = (turns_left, state_key)
+        seen_damage = self._transposition_table.get(table_key)
+        if seen_damage is not None and accumulated_damage <= seen_damage:
+            self.progress += progress_weight
+            return
+        self._transposition_table[table_key] = accumulated_damage
+
+        # 上界剪枝
+        future = self._best_future_damage(character_panel, turns_left, state_key, current_state)
+        upper_bound = (accumulated_damage + future) / self.total_turns
+        best_dpr = self.best_dpr
+        if self.shared_best is not None:
+            best_dpr = max(best_dpr, self.shared_best.value)
+        if upper_bound < best_dpr - BOUND_TOLERANCE * max(1.0, abs(best_dpr)):
+            self.progress += progress_weight
+            return
+
+        transitions = self._expand(character_panel, state_key, current_state)
+        if not transitions:
+            self.progress += progress_weight
+            return
+        child_weight = progress_weight / len(transitions)
+        for action, damage, next_state, next_key in transitions:
+            self._find_rotations_memoized(
+                character_panel=character_panel,
+                turns_left=turns_left - 1,
+                current_path=(action, current_path),
+                current_state=next_state,
+                state_key=next_key,
+                accumulated_damage=accumulated_damage + damage,
+                progress_weight=child_weight
+            )
+
+    def _min_kill_actions(
+        self,
+        character_panel: CharacterPanel,
+        turns_left: int,
+        state_key: Tuple,
+        state: BattleState,
+        progress_weight: float = 0.0
+    ) -> float:
+        """
+        [内部辅助方法] 动态规划: 从给定状态出发击败所有敌人最少还需要多少个行动；
+        剩余回合内无法做到时返回正无穷。对每个(剩余回合, 状态)只计算一次。
+        """
+        if state.all_enemies_defeated():
+            self.progress += progress_weight
+            return 0
+        if turns_left == 0:
+            self.progress += progress_weight
+            return math.inf
+        memo_key = (turns_left, state_key)
+        cached = self._kill_memo.get(memo_key)
+        if cached is not None:
+            self.progress += progress_weight
+            return cached
+
+        self._count_node()
+        best = math.inf
+        transitions = self._expand(character_panel, state_key, state)
+        if not transitions:
+            self.progress += progress_weight
+        child_weight = progress_weight / len(transitions) if transitions else 0.0
+        for _, _, next_state, next_key in transitions:
+            best = min(best, 1 + self._min_kill_actions(character_panel, turns_left - 1, next_key, next_state, child_weight))
+        self._kill_memo[memo_key] = best
+        return best
+
+    def _find_fastest_kill_recursive(
+        self,
+        character_panel: CharacterPanel,
+        turns_left: int,
+        current_path: Tuple | None,
+        current_state: BattleState,
+        depth: int,
+        progress_weight: float = 0.0
+    ):
+        """
+        [核心] 击杀时间目标的穷举搜索: 遍历所有可行的行动序列，击败所有敌人时该路径结束，
+        记录行动数最少 (且最先到达) 的路径。
+        """
+        self._count_node()
+        if current_state.all_enemies_defeated():
+            if self._fastest_kill is None or depth < self._fastest_kill[0]:
+                self._fastest_kill = (depth, current_path)
+                logger.debug("*** 新的最短击杀被发现: %d 动 ***", depth)
+            self.progress += progress_weight
+            return
+        possible_actions = self._candidate_actions(character_panel, current_state) if turns_left else []
+        if not possible_actions:
+            self.progress += progress_weight
+            return
+        child_weight = progress_weight / len(possible_actions)
+        for action in possible_actions:
+            damage, next_state = self.simulator.process_action(current_state, action)
+            self._find_fastest_kill_recursive(
+                character_panel, turns_left - 1, (action, current_path), next_state, depth + 1, child_weight
+            )
+
+    def _search_fastest_kill(self, character_panel: CharacterPanel, turns: int, search_mode: str) -> List[Action] | None:
+        """
+        [内部辅助方法] 寻找在给定回合内击败所有敌人所需行动最少的排轴，做不到时返回None。
+        记忆化模式先用动态规划求出最少行动数，再按遍历顺序取第一条达到该值的路径，
+        因此与穷举搜索返回的排轴完全相同。
+        """
+        if search_mode == "memo":
+            self._encoder = StateEncoder(self.simulator.characters)
+            self._transitions: Dict[Tuple, List[Tuple]] = {}
+            self._kill_memo: Dict[Tuple, float] = {}
+            try:
+                state_key, state = self._encoder.intern(self.initial_state)
+                needed = self._min_kill_actions(character_panel, turns, state_key, state, progress_weight=1.0)
+                if needed == math.inf:
+                    return None
+                actions = []
+                for turns_left in range(turns, turns - needed, -1):
+                    for action, _, next_state, next_key in self._expand(character_panel, state_key, state):
+                        if 1 + self._min_kill_actions(character_panel, turns_left - 1, next_key, next_state) == needed:
+                            break
+                    actions.append(action)
+                    state_key, state, needed = next_key, next_state, needed - 1
+                return actions
+            finally:
+                self._transitions, self._kill_memo = {}, {}
+                self._encoder = None
+        self._fastest_kill = None
+        self._find_fastest_kill_recursive(character_panel, turns, None, self.initial_state, 0, progress_weight=1.0)
+        return _path_actions(self._fastest_kill[1]) if self._fastest_kill else None
+
+    def _publish_best(self, dpr: float):
+        """[内部辅助方法] 并行搜索时，将本进程发现的更优DPR同步给其他进程用于剪枝。"""
+        if self.shared_best is None:
+            return
+        with self.shared_best.get_lock():
+            if dpr > self.shared_best.value:
+                self.shared_best.value = dpr
+
+    def _search_subtree(
+        self,
+        character_panel: CharacterPanel,
+        turns: int,
+        search_mode: str,
+        prefix: List[Action],
+        prefix_state: BattleState,
+        prefix_damage: float
+    ):
+        """
+        [内部辅助方法] 从给定的行动前缀(及其对应的状态和累计伤害)出发，搜索剩余回合。
+        串行搜索使用空前缀；并行搜索时每个工作进程负责一个前缀。
+        进度权重为1: 记忆化模式下动态规划(计算上界)和分支定界各占一半。
+        """
+        turns_left = turns - len(prefix)
+        if search_mode == "memo":
+            self.total_turns = turns
+            self._encoder = StateEncoder(self.simulator.characters)
+            self._transitions: Dict[Tuple, List[Tuple]] = {}
+            self._future_memo: Dict[Tuple, float] = {}
+            self._transposition_table: Dict[Tuple, float] = {}
+            try:
+                state_key, prefix_state = self._encoder.intern(prefix_state)
+                self._best_future_damage(character_panel, turns_left, state_key, prefix_state, progress_weight=0.5)
+                self._find_rotations_memoized(
+                    character_panel=character_panel,
+                    turns_left=turns_left,
+                    current_path=_path_from_actions(prefix),
+                    current_state=prefix_state,
+                    state_key=state_key,
+                    accumulated_damage=prefix_damage,
+                    progress_weight=0.5
+                )
+            finally:
+                # 搜索结束后释放缓存，避免查找器实例长期占用内存
+                self._transitions, self._future_memo, self._transposition_table = {}, {}, {}
+                self._encoder = None
+        else:
+            self._prefix_evaluator = PrefixTreeEvaluator(self.simulator, self.initial_state)
+            try:
+                self._find_rotations_recursive(
+                    character_panel=character_panel,
+                    turns_left=turns_left,
+                    current_path=_path_from_actions(prefix),
+                    current_state=prefix_state,
+                    progress_weight=1.0
+                )
+            finally:
+                self._prefix_evaluator = None
+
+    def _enumerate_prefixes(self, character_panel: CharacterPanel, depth: int, search_mode: str) -> List[Tuple]:
+        """
+        [内部辅助方法] 按深度优先顺序列出所有长度为depth的可行行动前缀。
+        返回 (前缀, 前缀结束时的状态, 前缀累计伤害) 的列表，顺序与串行搜索的遍历顺序一致。
+        记忆化模式下，到达等价状态且累计伤害不更高的前缀会被直接丢弃。
+        """
+        prefixes = []
+        best_seen: Dict[Tuple, float] = {}
+        encoder = StateEncoder(self.simulator.characters)
+
+        def walk(path: List[Action], state: BattleState, damage_so_far: float):
+            if len(path) == depth:
+                if search_mode == "memo":
+                    key = encoder.encode(state)
+                    if key in best_seen and damage_so_far <= best_seen[key]:
+                        return
+                    best_seen[key] = damage_so_far
+                prefixes.append((path, state, damage_so_far))
+                return
+            for action in self._candidate_actions(character_panel, state):
+                damage, next_state = self.simulator.process_action(state, action)
+                if damage >= 0:
+                    walk(path + [action], next_state, damage_so_far + damage)
+
+        walk([], self.initial_state, 0.0)
+        return prefixes
+
+    def _search_parallel(
+        self,
+        character_panel: CharacterPanel,
+        turns: int,
+        search_mode: str,
+        workers: int,
+        split_depth: int
+    ):
+        """
+        [内部辅助方法] 在指定深度将搜索树切分为多个前缀子树，交给进程池并行搜索。
+        各进程通过共享的最优DPR互相剪枝；合并时DPR相同者取遍历顺序靠前的前缀，
+        因此结果与串行搜索完全一致。
+        进度按已完成的子任务比例计算；取消时通过共享标志通知所有工作进程尽快退出。
+        """
+        prefixes = self._enumerate_prefixes(character_panel, min(split_depth, turns), search_mode)
+        logger.info("搜索树已在深度 %d 处切分为 %d 个子任务，使用 %d 个进程并行搜索。", min(split_depth, turns), len(prefixes), workers)
+        if not prefixes:
+            return
+
+        context = multiprocessing.get_context()
+        shared_best = context.Value('d', -1.0)
+        cancel_flag = context.Value('b', 0)
+        panels = list(self.simulator.characters.values())
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(shared_best, cancel_flag)
+        ) as pool:
+            futures = [
+                pool.submit(
+                    _search_prefix_in_worker, panels, character_panel.character_id, turns,
+                    self.initial_state, self.target_id, search_mode, prefix, prefix_state, prefix_damage,
+                    self.simulator.track_enemy_hp
+                )
+                for prefix, prefix_state, prefix_damage in prefixes
+            ]
+            pending = set(futures)
+            while pending:
+                cancelled = self.should_cancel is not None and self.should_cancel()
+                if cancelled or self._budget_exceeded():
+                    cancel_flag.value = 1
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    # 预算用完时保留已完成子任务中的最优解
+                    raise SearchCancelled() if cancelled else SearchBudgetExhausted()
+                done, pending = wait(pending, timeout=PARALLEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    info, nodes = future.result()
+                    self.nodes_explored += nodes
+                    # 搜索进行中先展示任意一个最优解，最终结果在下面按前缀顺序重新合并
+                    if info and self._improves(info['dpr_results']['dpr']):
+                        self._record_best(info)
+                self.progress = 1 - len(pending) / len(futures)
+
+        # 按前缀顺序合并，严格大于才替换，保证与串行搜索相同的平局处理
+        self.best_dpr = -1.0
+        self.best_rotation_info = None
+        self._seed_pending = False
+        for future in futures:
+            info, _ = future.result()
+            if info and info['dpr_results']['dpr'] > self.best_dpr:
+                self.best_dpr = info['dpr_results']['dpr']
+                self.best_rotation_info = info
+
+    def _greedy_rotation(self, character_panel: CharacterPanel, turns: int) -> List[Action] | None:
+        """[内部辅助方法] 每一步都选择立即伤害最高的可行行动 (平局取靠前的)，无法走满回合时返回None。"""
+        state, actions = self.initial_state, []
+        for _ in range(turns):
+            best = None
+            for action in self._candidate_actions(character_panel, state):
+                damage, next_state = self.simulator.process_action(state, action)
+                if damage >= 0 and (best is None or damage > best[0]):
+                    best = (damage, action, next_state)
+            if best is None:
+                return None
+            actions.append(best[1])
+            state = best[2]
+        return actions
+
+    def _seed_greedy(self, character_panel: CharacterPanel, turns: int):
+        """
+        [内部辅助方法] 以贪心排轴作为初始的当前最优解，使流式搜索在开始后立即就有结果可以展示
+        (记忆化搜索要先完成上界的动态规划才会到达第一个叶子)，同时也让分支定界更早开始剪枝。
+        """
+        if turns <= 0:
+            return
+        actions = self._greedy_rotation(character_panel, turns)
+        if actions is not None:
+            self._record_best(_rotation_info(actions, self.dpr_calculator.calculate_team_dpr(actions, self.initial_state)), seed=True)
 
     def find_best_rotation(
         self, 
         character_panel: CharacterPanel, 
         turns: int, 
-        initial_state: BattleState
+        initial_state: BattleState,
+        search_mode: str = "exhaustive",
+        workers: int = 1,
+        split_depth: int = DEFAULT_SPLIT_DEPTH,
+        objective: str = "dpr",
+        time_budget: float | None = None,
+        node_budget: int | None = None
     ) -> Dict | None:
         """
-        在给定的回合数内，为角色寻找DPR最高的【可行】技能排轴。
+        在给定的回合数内，为角色寻找最优的【可行】排轴 (技能及其目标)。
+
+        :param search_mode: 搜索模式，'exhaustive' (穷举) 或 'memo' (记忆化分支定界)。
+        :param workers: 并行搜索使用的进程数，为1时在当前进程中串行搜索。
+        :param split_depth: 并行搜索时切分搜索树的深度。
+        :param objective: 搜索目标，'dpr' (总伤害最高) 或 'ttk' (击败所有敌人所需的行动最少，串行搜索)。
+        :param time_budget: 可选的时间预算(秒)。用完后停止搜索，返回当前最优解并设置 budget_exhausted。
+        :param node_budget: 可选的节点预算 (访问的搜索节点数)，语义同上。
+        若设置了 should_cancel 且其在搜索过程中返回True，将抛出 SearchCancelled。
         """
-        print(f"\n>>>>>> 开始为 '{character_panel.character_id}' 在 {turns} 回合内【高度智能】寻找最优排轴... <<<<<<")
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"未知的搜索模式: '{search_mode}'，可选值为 {SEARCH_MODES}")
+        if objective not in ROTATION_OBJECTIVES:
+            raise ValueError(f"未知的搜索目标: '{objective}'，可选值为 {ROTATION_OBJECTIVES}")
+        if objective == "ttk" and not self.simulator.track_enemy_hp:
+            raise ValueError("击杀时间目标需要模拟器开启敌人HP追踪 (track_enemy_hp=True)")
+        if workers < 1 or split_depth < 1:
+            raise ValueError("进程数和切分深度都必须至少为1")
+        if (time_budget is not None and time_budget <= 0) or (node_budget is not None and node_budget < 1):
+            raise ValueError("时间预算必须为正数，节点预算必须至少为1")
+
+        logger.info(">>>>>> 开始为 '%s' 在 %d 回合内【高度智能】寻找最优排轴... <<<<<<", character_panel.character_id, turns)
         
-        # --- NEW: 在搜索开始前，锁定目标 ---
+        # --- 在搜索开始前，确定默认目标 (第一个存活的敌人)；单体技能的目标在搜索中选择 ---
         if not initial_state.enemies:
-            print("[错误] 无法开始排轴查找：战场上没有敌人。")
+            logger.error("无法开始排轴查找：战场上没有敌人。")
             return None
-        # 假设总是攻击战场上的第一个敌人
-        self.target_id = initial_state.enemies[0].enemy_id
-        print(f"智能搜索目标已锁定: {self.target_id}")
+        alive = initial_state.alive_enemies()
+        self.target_id = (alive[0] if alive else next(iter(initial_state.enemies.values()))).enemy_id
+        logger.debug("智能搜索默认目标: %s，可选目标: %s", self.target_id, [e.enemy_id for e in alive])
 
         self.best_dpr = -1.0
         self.best_rotation_info = None
+        self.nodes_explored = 0
+        self.progress = 0.0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.budget_exhausted = False
+        self._seed_pending = False
+        self._deadline = self.started_at + time_budget if time_budget is not None else None
+        self._node_limit = node_budget
         self.initial_state = copy.deepcopy(initial_state)
 
-        # 启动递归搜索
-        self._find_rotations_recursive(
-            character_panel=character_panel,
-            turns_left=turns,
-            current_path=[],
-            current_state=self.initial_state
-        )
+        # 启动搜索
+        try:
+            if objective == "ttk":
+                kill_rotation = self._search_fastest_kill(character_panel, turns, search_mode)
+                if kill_rotation is not None:
+                    dpr_results = self.dpr_calculator.calculate_team_dpr(kill_rotation, self.initial_state)
+                    self._record_best(_rotation_info(kill_rotation, dpr_results))
+                    logger.info("最短击杀: %d 动击败所有敌人。", len(kill_rotation))
+                else:
+                    logger.info("无法在 %d 回合内击败所有敌人，改为寻找总伤害最高的排轴。", turns)
+                    self.progress = 0.0
+            if self.best_rotation_info is None:
+                self._seed_greedy(character_panel, turns)
+                if workers > 1 and turns > 0:
+                    self._search_parallel(character_panel, turns, search_mode, workers, split_depth)
+                else:
+                    self._search_subtree(character_panel, turns, search_mode, [], self.initial_state, 0.0)
+                if self.best_rotation_info and self.simulator.track_enemy_hp:
+                    # 重放一次最优排轴，补充击杀信息 (记忆化搜索只累计伤害)
+                    actions = self.best_rotation_info["actions"]
+                    self.best_rotation_info = _rotation_info(
+                        actions, self.dpr_calculator.calculate_team_dpr(actions, self.initial_state)
+                    )
+        except SearchBudgetExhausted:
+            self.budget_exhausted = True
+            logger.info("智能排轴搜索的预算已用完，返回当前最优解。已访问 %d 个节点。", self.nodes_explored)
+            if self.best_rotation_info is None:
+                # 击杀时间搜索在找到结果前用完预算时，以贪心排轴作为结果
+                self._seed_greedy(character_panel, turns)
+        except SearchCancelled:
+            logger.info("智能排轴搜索已被取消。已访问 %d 个节点。", self.nodes_explored)
+            raise
+        finally:
+            self.finished_at = time.monotonic()
+            self._deadline = self._node_limit = None
+        if not self.budget_exhausted:
+            self.progress = 1.0
 
-        print("\n==========================================")
-        print("智能排轴搜索完成。")
+        logger.info("智能排轴搜索完成。最优DPR: %.2f", self.best_dpr)
         return self.best_rotation_info
+
+    def iter_search(self, search: Callable[[], Any], heartbeat_seconds: float = STREAM_HEARTBEAT_SECONDS) -> Iterator[Tuple[str, Any]]:
+        """
+        在后台线程中执行 search() (调用本查找器的某个搜索方法)，以 (事件类型, 数据) 的形式流式产出:
+        - ('improved', improvement_event()): 每发现一个更优的排轴 (包括开始时的贪心种子);
+        - ('progress', progress_snapshot()): 超过 heartbeat_seconds 没有新事件时推送一次;
+        - ('done', search() 的返回值) 或 ('error', 异常): 搜索结束，之后生成器结束。
+        生成器被提前关闭时 (如客户端断开) 会取消搜索并等待后台线程退出。
+        """
+        events: queue.Queue = queue.Queue()
+        stop = threading.Event()
+        previous_cancel, previous_hook = self.should_cancel, self.on_improvement
+        self.should_cancel = lambda: stop.is_set() or (previous_cancel is not None and previous_cancel())
+        self.on_improvement = lambda event: events.put(("improved", event))
+
+        def run():
+            try:
+                events.put(("done", search()))
+            except Exception as e: # 包括 SearchCancelled，交给调用方处理
+                events.put(("error", e))
+
+        worker = threading.Thread(target=run, name="p5x-search-stream", daemon=True)
+        worker.start()
+        try:
+            while True:
+                try:
+                    kind, payload = events.get(timeout=heartbeat_seconds)
+                except queue.Empty:
+                    yield "progress", self.progress_snapshot()
+                    continue
+                yield kind, payload
+                if kind in ("done", "error"):
+                    return
+        finally:
+            stop.set()
+            worker.join()
+            self.should_cancel, self.on_improvement = previous_cancel, previous_hook
+
+    def iter_best_rotation(self, *args, heartbeat_seconds: float = STREAM_HEARTBEAT_SECONDS, **kwargs) -> Iterator[Tuple[str, Any]]:
+        """find_best_rotation 的流式版本 (参数相同)，事件格式见 iter_search。"""
+        return self.iter_search(lambda: self.find_best_rotation(*args, **kwargs), heartbeat_seconds)
@@ -2,6 +2,9 @@
 from dataclasses import dataclass
 from typing import Dict
 from models import CharacterStats
+from tracing import get_logger
+
+logger = get_logger(__name__)
 
 @dataclass
 class ScoringModel:
@@ -13,12 +16,17 @@ class ScoringModel:
     w_attack: float = 0.2       # 每点攻击力的价值
     w_crit_rate: float = 200.0  # 每1%暴击率的价值 (乘以200)
     w_crit_damage: float = 100.0 # 每1%暴击伤害的价值 (乘以100)
+    # 以下属性默认不计分，由数据驱动的模型 (SensitivityReport.to_scoring_model) 设置
+    w_hp: float = 0.0
+    w_penetration: float = 0.0
+    w_additive_damage_bonus: float = 0.0
+    w_final_damage_bonus: float = 0.0
 
 class Scorer:
     """根据给定的评分模型为角色配置打分。"""
     def __init__(self, model: ScoringModel):
         self.model = model
-        print("评分器已初始化。")
+        logger.debug("评分器已初始化。")
 
     def calculate_score(self, dpr_results: Dict, final_stats: CharacterStats) -> float:
         """
@@ -35,10 +43,34 @@ class Scorer:
         attack_score = final_stats.attack * self.model.w_attack
         crit_rate_score = final_stats.crit_rate * self.model.w_crit_rate
         crit_damage_score = final_stats.crit_damage * self.model.w_crit_damage
+        other_score = self._other_stats_score(final_stats)
 
         # 加总得到最终分数
-        total_score = dpr_score + attack_score + crit_rate_score + crit_damage_score
+        total_score = dpr_score + attack_score + crit_rate_score + crit_damage_score + other_score
         
-        print(f"  - 分数详情: DPR部分({dpr_score:.0f}) + 攻击力部分({attack_score:.0f}) + 暴击率部分({crit_rate_score:.0f}) + 暴伤部分({crit_damage_score:.0f})")
+        logger.debug("分数详情: DPR部分(%.0f) + 攻击力部分(%.0f) + 暴击率部分(%.0f) + 暴伤部分(%.0f) + 其他属性部分(%.0f)",
+                     dpr_score, attack_score, crit_rate_score, crit_damage_score, other_score)
 
         return total_score
+
+    def calculate_score_batch(self, dpr, final_stats: CharacterStats):
+        """
+        calculate_score 的批量版本，供配装优化等场景使用。
+        dpr 和 final_stats 的各个字段都可以是NumPy数组，返回逐元素的综合得分；不输出分数详情。
+        """
+        return (
+            dpr * self.model.w_dpr
+            + final_stats.attack * self.model.w_attack
+            + final_stats.crit_rate * self.model.w_crit_rate
+            + final_stats.crit_damage * self.model.w_crit_damage
+            + self._other_stats_score(final_stats)
+        )
+
+    def _other_stats_score(self, final_stats: CharacterStats):
+        """[内部辅助方法] 生命、穿透和增伤类属性的得分 (支持NumPy数组)。"""
+        return (
+            final_stats.hp * self.model.w_hp
+            + final_stats.penetration * self.model.w_penetration
+            + final_stats.additive_damage_bonus * self.model.w_additive_damage_bonus
+            + final_stats.final_damage_bonus * self.model.w_final_damage_bonus
+        )
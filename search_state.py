@@ -0,0 +1,126 @@
+# search_state.py
+"""
+搜索引擎使用的紧凑状态编码。
+
+排轴搜索需要判断两个BattleState是否等价 (用作置换表/记忆化的键)。
+StateEncoder 把状态编码为固定布局的嵌套元组:
+
+    (回合数,
+     每个角色的资源   (sp, h_energy, 煞气, 其他资源),   # 按角色顺序，位置固定
+     每个角色的Buff   ((Buff ID, 持续时间, 到期回合, 层数, 最大层数), ...),
+     每个敌人的Debuff (同上),
+     每个敌人的属性   (ID, HP, 防御, 抗性, 减防, 易伤, 弱点倍率),   # 按登场顺序
+     布局之外的单位   (很少出现，如效果作用于模拟器外的角色))
+
+编码结果可哈希，编码相同的两个状态在搜索中完全等价。
+
+intern() 同时充当状态驻留表: 编码相同的状态只保留最先到达的那一个对象，
+搜索的转移表和记忆化表只需引用它，重复到达的等价状态可以立即被回收。
+
+由于BattleState采用写时复制，未被修改的子容器在父子状态之间是同一个对象，
+因此驻留状态的子容器编码按对象身份缓存: 每次只需重新编码本次行动实际写入的部分，
+相同的子编码元组也在所有状态间共享，进一步节省内存。
+缓存会持有子容器的引用 (保证对象ID不被复用)，因此编码器应在一次搜索结束后丢弃。
+注意: 被编码过的状态不应再被原地修改 (模拟器只会修改新派生的状态，满足这一点)。
+"""
+from typing import Any, Dict, Iterable, Tuple
+
+from models import BattleState, Enemy
+
+# 固定布局中的核心资源，其余资源按名称排序追加在末尾
+CORE_RESOURCES = ("sp", "h_energy", "煞气")
+
+class StateEncoder:
+    """将BattleState编码为紧凑、可哈希的固定布局元组，并按编码驻留状态。"""
+    __slots__ = ("character_ids", "states", "_known_characters", "_cache")
+
+    def __init__(self, character_ids: Iterable[str]):
+        self.character_ids = tuple(character_ids)
+        self.states: Dict[Tuple, BattleState] = {} # 编码 -> 驻留的状态
+        self._known_characters = frozenset(self.character_ids)
+        self._cache: Dict[int, Tuple[Any, Tuple]] = {} # id(子容器) -> (子容器, 编码)
+
+    def encode(self, state: BattleState, remember: bool = False) -> Tuple:
+        """
+        返回状态的编码。remember为True时缓存该状态所有子容器的编码
+        (只对会长期保留的状态使用，否则缓存会让已丢弃状态的子容器无法回收)。
+        """
+        resources = state.character_resources
+        buffs = state.character_buffs
+        debuffs = state.enemy_debuffs
+        enemies = state.enemies.values()
+        return (
+            state.turn_number,
+            tuple(self._resources(resources.get(char_id), remember) for char_id in self.character_ids),
+            tuple(self._buffs(buffs.get(char_id), remember) for char_id in self.character_ids),
+            tuple(self._buffs(debuffs.get(enemy.enemy_id), remember) for enemy in enemies),
+            tuple(self._enemy(enemy, remember) for enemy in enemies),
+            self._outside_layout(state),
+        )
+
+    def intern(self, state: BattleState) -> Tuple[Tuple, BattleState]:
+        """返回 (编码, 驻留的状态)。首次出现的编码会驻留当前状态。"""
+        key = self.encode(state)
+        existing = self.states.get(key)
+        if existing is not None:
+            return key, existing
+        self.states[key] = state
+        self.encode(state, remember=True)
+        return key, state
+
+    def _resources(self, resources: Dict[str, Any] | None, remember: bool = False) -> Tuple:
+        """[内部辅助方法] 编码一个角色的资源字典: 核心资源位置固定，缺失为None。"""
+        if not resources:
+            return ()
+        cached = self._cache.get(id(resources))
+        if cached is not None and cached[0] is resources:
+            return cached[1]
+        encoded = tuple(resources.get(name) for name in CORE_RESOURCES)
+        if len(resources) > sum(1 for name in CORE_RESOURCES if name in resources):
+            encoded += (tuple(sorted((k, v) for k, v in resources.items() if k not in CORE_RESOURCES)),)
+        if remember:
+            self._cache[id(resources)] = (resources, encoded)
+        return encoded
+
+    def _buffs(self, buffs: Dict[int, Any] | None, remember: bool = False) -> Tuple:
+        """[内部辅助方法] 编码一个单位的Buff字典，按Buff ID排序。空字典与缺失等价。"""
+        if not buffs:
+            return ()
+        cached = self._cache.get(id(buffs))
+        if cached is not None and cached[0] is buffs:
+            return cached[1]
+        encoded = tuple(sorted((b.buff_id, b.duration, b.expires_at, b.stacks, b.max_stacks) for b in buffs.values()))
+        if remember:
+            self._cache[id(buffs)] = (buffs, encoded)
+        return encoded
+
+    def _enemy(self, enemy: Enemy, remember: bool = False) -> Tuple:
+        """[内部辅助方法] 编码一个敌人的可变属性。"""
+        cached = self._cache.get(id(enemy))
+        if cached is not None and cached[0] is enemy:
+            return cached[1]
+        encoded = (enemy.enemy_id, enemy.hp, enemy.defense, tuple(sorted(enemy.resistances.items())),
+                   enemy.defense_reduction, enemy.vulnerability, enemy.weakness_multiplier)
+        if remember:
+            self._cache[id(enemy)] = (enemy, encoded)
+        return encoded
+
+    def _outside_layout(self, state: BattleState) -> Tuple:
+        """[内部辅助方法] 编码不在固定布局中的角色资源/Buff和不在场敌人的Debuff (通常为空)。"""
+        known = self._known_characters
+        extra = []
+        for kind, owners in (("resources", state.character_resources), ("buffs", state.character_buffs)):
+            if known.issuperset(owners):
+                continue
+            encode = self._resources if kind == "resources" else self._buffs
+            for owner_id in sorted(owners.keys() - known):
+                encoded = encode(owners[owner_id])
+                if encoded:
+                    extra.append((kind, owner_id, encoded))
+        debuffs = state.enemy_debuffs
+        if debuffs:
+            for enemy_id in sorted(debuffs.keys() - state.enemies.keys()):
+                encoded = self._buffs(debuffs[enemy_id])
+                if encoded:
+                    extra.append(("debuffs", enemy_id, encoded))
+        return tuple(extra)
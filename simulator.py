@@ -1,13 +1,18 @@
 # simulator.py
-import copy
+import logging
 from typing import List, Dict, Tuple
 from collections import Counter
 
 # 导入所有需要的模型和类
-from models import CharacterPanel, BattleState, Action, Skill, CharacterStats, Buff, Enemy
+from models import CharacterPanel, BattleState, Action, Skill, CharacterStats, Buff, Enemy, intern_buff_name
 # 导入伤害计算器和游戏规则数据库
-from calculator import calculate_expected_damage
+from calculator import calculate_expected_damage, calculate_hit_components
 import game_database
+from buff_lifecycle import advance_turn
+from profiling import SimulatorMetrics, current_metrics
+from tracing import get_logger
+
+logger = get_logger(__name__)
 
 # --- 全局游戏常量 ---
 # 定义了与资源相关的核心平衡数值
@@ -17,11 +22,99 @@ ENERGY_PER_ACTION = 35 # 每次普通行动回复的能量
 class BattleSimulator:
     """
     模拟引擎的最终版本，支持团队作战、目标选择、资源系统和被动效果。
+
+    单体技能命中行动指定的目标，全体技能 (target_type 为 'ALL') 命中所有存活的敌人，
+    每个目标按其自身的防御和抗性分别结算伤害。
+
+    track_enemy_hp 为True时，每次命中都会扣减目标的HP: 造成的伤害按剩余HP截断 (溢出部分不计入)，
+    HP可以降为负数 (其绝对值即溢出伤害)，HP不大于0的敌人被视为已击败，不再被任何技能命中。
+    默认关闭，此时敌人是不会倒下的木桩，排轴搜索中的等价状态不会因HP不同而无法合并。
+
+    分阶段计时见 enable_metrics；在 profiling.capture_metrics() 的上下文中创建的模拟器会自动开启。
     """
-    def __init__(self, character_panels: List[CharacterPanel]):
+    # 状态派生和单次伤害计算通过实例属性调用，开启计量时可以在实例上替换为计时版本
+    _fork = staticmethod(BattleState.fork)
+    _damage = staticmethod(calculate_expected_damage)
+
+    def __init__(self, character_panels: List[CharacterPanel], track_enemy_hp: bool = False):
         # 模拟器在初始化时，需要知道所有参与战斗的角色的“面板蓝图”
         self.characters: Dict[str, CharacterPanel] = {p.character_id: p for p in character_panels}
-        print("战斗模拟器已初始化 (最终版)。")
+        self.track_enemy_hp = track_enemy_hp
+        self.metrics: SimulatorMetrics | None = None
+        self._compile_rules()
+        metrics = current_metrics()
+        if metrics is not None:
+            self.enable_metrics(metrics)
+        logger.debug("战斗模拟器已初始化 (最终版)。")
+
+    def enable_metrics(self, metrics: SimulatorMetrics):
+        """
+        开启分阶段计时: 用计时包装替换本实例上的各阶段函数，之后的调用计入 metrics。
+        阶段: process_action (整个行动，另计 failed_actions)、fork (派生新状态)、effects (技能效果)、
+        final_stats (最终属性，包含 dynamic_buffs 和 passives)、damage (单次伤害公式)、apply_hit (扣减HP)、end_turn (回合结束)。
+        未开启时这些函数保持原样，没有任何额外开销。
+        """
+        if self.metrics is not None:
+            return
+        self.metrics = metrics
+        timed = metrics.timed
+        process_action = self.process_action
+
+        def counted_process_action(state: BattleState, action: Action, end_turn: bool = True) -> Tuple[float, BattleState]:
+            result = process_action(state, action, end_turn)
+            if result[1] is state:
+                metrics.count("failed_actions")
+            return result
+
+        self.process_action = timed("process_action", counted_process_action)
+        self._fork = timed("fork", BattleState.fork)
+        self._damage = timed("damage", calculate_expected_damage)
+        self._get_final_stats = timed("final_stats", self._get_final_stats)
+        self._apply_hit = timed("apply_hit", self._apply_hit)
+        self._advance_turn = timed("end_turn", self._advance_turn)
+        # 重新编译规则，使效果函数、被动技能和动态Buff也使用计时版本
+        self._compile_rules()
+
+    def _instrument(self, phase: str, func):
+        """[内部辅助方法] 开启计量时返回计时包装后的函数，否则原样返回。"""
+        return self.metrics.timed(phase, func) if self.metrics is not None and func is not None else func
+
+    def _compile_rules(self):
+        """
+        [内部辅助方法] 将 game_database 中以名称为键的规则库“编译”为直接的函数引用:
+        - 每个技能的 effect_names 解析为效果函数元组 (按技能对象索引);
+        - 每个角色的被动技能解析为函数 (或None);
+        - 动态Buff效果按Buff ID索引。
+        这样每次行动时都不需要再按名称查找规则。注意: 初始化之后对规则库的修改不会生效。
+        """
+        self._skill_effects: Dict[int, Tuple[Skill, Tuple]] = {}
+        for panel in self.characters.values():
+            for skill in panel.skills:
+                self._skill_effects[id(skill)] = (skill, self._resolve_skill_effects(skill))
+        self._passives: Dict[str, game_database.PassiveEffectApplicator | None] = {
+            char_id: self._instrument("passives", game_database.CHARACTER_PASSIVE_DB.get(char_id)) for char_id in self.characters
+        }
+        self._buff_functions: Dict[int, game_database.DynamicBuffApplicator] = {
+            intern_buff_name(name): self._instrument("dynamic_buffs", func) for name, func in game_database.DYNAMIC_BUFF_DB.items()
+        }
+
+    def _resolve_skill_effects(self, skill: Skill) -> Tuple:
+        """[内部辅助方法] 将技能的效果名称解析为效果函数元组，未知的效果名称会被忽略并记录警告。"""
+        effects = []
+        for effect_name in skill.effect_names:
+            effect_function = game_database.SKILL_EFFECT_DB.get(effect_name)
+            if effect_function:
+                effects.append(self._instrument("effects", effect_function))
+            else:
+                logger.warning("技能 '%s' 的效果 '%s' 在规则库中不存在，已忽略。", skill.name, effect_name)
+        return tuple(effects)
+
+    def _effects_for(self, skill: Skill) -> Tuple:
+        """[内部辅助方法] 获取技能已编译的效果函数；不属于任何面板的技能会在首次使用时编译。"""
+        compiled = self._skill_effects.get(id(skill))
+        if compiled is None or compiled[0] is not skill:
+            compiled = self._skill_effects[id(skill)] = (skill, self._resolve_skill_effects(skill))
+        return compiled[1]
 
     def _get_final_stats(self, actor_panel: CharacterPanel, state: BattleState) -> CharacterStats:
         """
@@ -30,27 +123,81 @@ class BattleSimulator:
         """
         # 1. 获取包含装备和套装效果的静态面板属性
         final_stats = actor_panel.get_final_stats()
-        
+        # 2 & 3. 应用动态Buff和被动技能
+        return self.apply_dynamic_effects(final_stats, actor_panel.character_id, state)
+
+    def apply_dynamic_effects(self, stats: CharacterStats, character_id: str, state: BattleState) -> CharacterStats:
+        """
+        在静态面板属性之上，应用角色在给定战斗状态下的动态Buff和被动技能。
+        stats 的字段也可以是NumPy数组 (一次处理一批配装)，只要效果函数只做算术运算即可。
+        """
         # 2. 应用来自BattleState的动态Buff
-        active_buffs = state.character_buffs.get(actor_panel.character_id, [])
-        for buff in active_buffs:
-            buff_function = game_database.DYNAMIC_BUFF_DB.get(buff.name)
-            if buff_function:
-                final_stats = buff_function(final_stats, buff)
+        active_buffs = state.character_buffs.get(character_id)
+        if active_buffs:
+            buff_functions = self._buff_functions
+            for buff_id, buff in active_buffs.items():
+                buff_function = buff_functions.get(buff_id)
+                if buff_function:
+                    stats = buff_function(stats, buff)
 
         # 3. 应用基于资源的被动技能 (例如 Joker的'复仇')
-        passive_func = game_database.CHARACTER_PASSIVE_DB.get(actor_panel.character_id)
+        passive_func = self._passives.get(character_id)
         if passive_func:
-            final_stats = passive_func(final_stats, state, actor_panel.character_id)
+            stats = passive_func(stats, state, character_id)
             
-        return final_stats
+        return stats
+
+    def action_targets(self, state: BattleState, action: Action) -> List[Enemy]:
+        """
+        返回行动在给定状态下会命中的敌人: 全体技能命中所有存活的敌人，单体技能命中存活的指定目标；
+        辅助技能不命中任何敌人。
+        """
+        skill = action.skill_used
+        if skill.damage_type == "辅助":
+            return []
+        if skill.target_type == "ALL":
+            return state.alive_enemies()
+        target = state.get_enemy(action.target_id)
+        return [target] if target is not None and target.is_alive else []
 
-    def process_action(self, state: BattleState, action: Action) -> Tuple[float, BattleState]:
+    def hit_profiles(self, state: BattleState, hit_state: BattleState, action: Action) -> List[Tuple[str, float, float, float]]:
+        """
+        返回一次行动对每个目标的命中构成 (敌人ID, 未暴击伤害, 暴击率, 额外暴伤)，用于蒙特卡洛暴击采样。
+        state 为行动前的状态，hit_state 为造成伤害时 (回合结束前) 的状态，见 process_action_with_hit_state；
+        行动失败 (资源不足，状态未推进)、辅助技能或没有可命中的目标时返回空列表。
+        """
+        targets = self.action_targets(state, action) if hit_state is not state else []
+        if not targets:
+            return []
+        final_stats = self._get_final_stats(self.characters[action.character_id], hit_state)
+        return [
+            (target.enemy_id, *calculate_hit_components(final_stats, action.skill_used, hit_state.enemies[target.enemy_id]))
+            for target in targets
+        ]
+
+    def process_action_with_hit_state(self, state: BattleState, action: Action) -> Tuple[float, BattleState, BattleState]:
+        """
+        与 process_action(state, action) 相同，但额外返回造成伤害时 (回合结束、到期Buff被移除之前) 的状态:
+        (伤害, 造成伤害时的状态, 回合结束后的状态)。
+        需要在行动之后重新计算同一次伤害的调用方 (蒙特卡洛采样、配装批量计算) 必须使用前者，
+        否则在行动回合到期的Buff会被漏算。行动失败时三者中的两个状态都是输入状态。
+        """
+        damage, hit_state = self.process_action(state, action, end_turn=False)
+        if hit_state is state:
+            return damage, state, state
+        return damage, hit_state, self.end_turn(hit_state)
+
+    def process_action(self, state: BattleState, action: Action, end_turn: bool = True) -> Tuple[float, BattleState]:
         """
         处理单个行动，包含完整的资源检查、状态演进和Buff持续时间管理。
         这是模拟器的核心方法。
+
+        :param end_turn: 行动后是否结束当前回合 (移除到期的Buff并推进回合数)。
+                         按回合组织多个行动的调用方传入False，并在回合结束时调用 end_turn()。
         """
         actor_id, skill, target_id = action.character_id, action.skill_used, action.target_id
+        # 每次行动只检查一次日志级别，未开启调试时热路径上不产生任何日志开销
+        debug = logger.isEnabledFor(logging.DEBUG)
         
         # --- 资源检查 ---
         # 检查行动是否可行，如果资源不足，则行动失败，返回0伤害和原始状态
@@ -58,19 +205,21 @@ class BattleSimulator:
         # 检查HIGHLIGHT技能
         if skill.skill_type == "HIGHLIGHT":
             if resources.get("h_energy", 0) < HIGHLIGHT_MAX_ENERGY:
-                print(f"[行动失败] {actor_id} 尝试使用 'HIGHLIGHT', 但能量不足。")
+                if debug:
+                    logger.debug("[行动失败] %s 尝试使用 'HIGHLIGHT', 但能量不足。", actor_id)
                 return 0.0, state
         # 检查普通技能的SP消耗
         elif resources.get("sp", 0) < skill.sp_cost:
-            print(f"[行动失败] {actor_id} 尝试使用 '{skill.name}', 但SP不足。")
+            if debug:
+                logger.debug("[行动失败] %s 尝试使用 '%s', 但SP不足。", actor_id, skill.name)
             return 0.0, state
         
         # --- 正常处理流程 ---
-        # 复制状态，准备进行修改，以保证“不可变性”
-        next_state = copy.deepcopy(state)
+        # 以写时复制的方式派生新状态，只有被修改的子容器才会被复制，以保证“不可变性”
+        next_state = self._fork(state)
         
         # --- 状态演进: 第1部分 - 资源消耗与生成 ---
-        res = next_state.character_resources.setdefault(actor_id, {})
+        res = next_state.resources_for_write(actor_id)
         if skill.skill_type == "HIGHLIGHT":
             res["h_energy"] = 0
         else:
@@ -78,25 +227,49 @@ class BattleSimulator:
             res["h_energy"] = min(HIGHLIGHT_MAX_ENERGY, res.get("h_energy", 0) + ENERGY_PER_ACTION)
 
         # --- 状态演进: 第2部分 - 触发技能效果 ---
-        for effect_name in skill.effect_names:
-            effect_function = game_database.SKILL_EFFECT_DB.get(effect_name)
-            if effect_function:
-                next_state = effect_function(next_state, action)
+        for effect_function in self._effects_for(skill):
+            next_state = effect_function(next_state, action)
         
         # --- 伤害计算 ---
         damage = 0.0
         # 辅助技能不造成伤害
         if skill.damage_type != "辅助":
-            target = next((e for e in next_state.enemies if e.enemy_id == target_id), None)
-            if not target:
-                print(f"[行动失败] 找不到目标 {target_id}。")
-                return 0.0, next_state
-
-            # 获取计入所有效果后的最终属性，并计算伤害
-            final_stats = self._get_final_stats(self.characters[actor_id], next_state)
-            damage = calculate_expected_damage(final_stats, skill, target)
+            targets = self.action_targets(next_state, action)
+            if targets:
+                # 获取计入所有效果后的最终属性 (对所有目标相同)，并逐个目标计算伤害
+                final_stats = self._get_final_stats(self.characters[actor_id], next_state)
+                for target in targets:
+                    hit = self._damage(final_stats, skill, target)
+                    if self.track_enemy_hp:
+                        hit = self._apply_hit(next_state, target.enemy_id, hit, debug)
+                    damage += hit
+            elif debug:
+                logger.debug("[行动失败] 找不到可命中的目标 %s。", target_id)
         
-        # --- 状态演进: 第3部分 - Buff持续时间递减 ---
-        # (这部分逻辑可以添加在这里，以确保在每次行动后所有buff都正确地减少持续时间)
+        # --- 状态演进: 第3部分 - 回合结束，移除到期的Buff ---
+        if end_turn:
+            self._advance_turn(next_state, debug)
         
         return damage, next_state
+
+    def end_turn(self, state: BattleState) -> BattleState:
+        """不执行行动，直接结束当前回合 (移除到期的Buff并推进回合数)，返回新状态。"""
+        next_state = state.fork()
+        self._advance_turn(next_state, logger.isEnabledFor(logging.DEBUG))
+        return next_state
+
+    def _advance_turn(self, state: BattleState, debug: bool = False):
+        """[内部辅助方法] 在写时复制的新状态上结束当前回合。"""
+        expired = advance_turn(state)
+        if debug and expired:
+            logger.debug("[回合结束] 第 %d 回合结束，到期的Buff: %s",
+                         state.turn_number - 1, [(owner_id, buff.name) for _, owner_id, buff in expired])
+
+    def _apply_hit(self, state: BattleState, enemy_id: str, damage: float, debug: bool = False) -> float:
+        """[内部辅助方法] 扣减敌人的HP，返回实际造成的伤害 (不超过剩余HP)。"""
+        enemy = state.enemy_for_write(enemy_id)
+        dealt = min(damage, enemy.hp)
+        enemy.hp -= damage
+        if debug and not enemy.is_alive:
+            logger.debug("[击败] 敌人 %s 被击败，溢出伤害 %.2f。", enemy_id, -enemy.hp)
+        return dealt
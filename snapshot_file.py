@@ -0,0 +1,50 @@
+# snapshot_file.py
+"""
+二进制快照文件: 面板快照 (panel_registry) 和断点表缓存 (breakpoints) 共用的文件格式和读写逻辑。
+
+文件格式: 魔数 + 版本号(uint16, 小端) + zlib压缩的pickle数据。
+写入时先写临时文件再替换，保证读取方不会看到写了一半的文件；
+读取时魔数或版本号不符的文件直接忽略 (返回None)，调用方随后重新构建并覆盖。
+pickle可以执行任意代码，快照文件只应从可信的位置加载。
+"""
+import os
+import pickle
+import struct
+import zlib
+from typing import Any
+
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+def save_snapshot_file(path: str, magic: bytes, version: int, payload: Any):
+    """将任意可pickle的对象写入快照文件。写入失败时抛出OSError。"""
+    blob = zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+    temp_path = f"{path}.tmp{os.getpid()}"
+    with open(temp_path, 'wb') as f:
+        f.write(magic + struct.pack("<H", version) + blob)
+    os.replace(temp_path, path)
+
+def load_snapshot_file(path: str, magic: bytes, version: int, description: str) -> Any | None:
+    """
+    从快照文件读取对象。文件不存在、魔数或版本号不符、内容无法解析时返回None，
+    description (如 "面板快照") 用于日志信息。
+    """
+    try:
+        with open(path, 'rb') as f:
+            blob = f.read()
+    except OSError:
+        return None
+    header_size = len(magic) + 2
+    if blob[:len(magic)] != magic or len(blob) < header_size:
+        logger.warning("'%s' 不是有效的%s文件，已忽略。", path, description)
+        return None
+    (file_version,) = struct.unpack("<H", blob[len(magic):header_size])
+    if file_version != version:
+        logger.info("%s '%s' 的版本 (%d) 与当前版本 (%d) 不符，已忽略。", description, path, file_version, version)
+        return None
+    try:
+        return pickle.loads(zlib.decompress(blob[header_size:]))
+    except Exception as e:
+        logger.warning("读取%s '%s' 失败: %s", description, path, e)
+        return None
@@ -0,0 +1,141 @@
+# stat_sensitivity.py
+"""
+属性敏感度分析: 计算给定面板、排轴和敌人下，每个面板属性每增加一单位带来的DPR边际收益。
+
+- 排轴只模拟一次，记录角色每次造成伤害时的战斗状态 (与配装优化器相同，见 record_damaging_actions);
+- 所有扰动后的面板 (基准、每个属性的 ±h 和 +参考增量) 组成一批，
+  通过向量化的伤害公式一次算完，动态Buff和被动技能同样按数组处理;
+- 梯度使用中心差分；伤害公式对穿透以外的属性都是多重线性的，中心差分几乎没有截断误差。
+
+结果给出属性优先级表 (按增加一个参考增量带来的DPR收益排序)，并可转换为数据驱动的 ScoringModel 权重。
+"""
+from dataclasses import dataclass, asdict
+from typing import Dict, List
+
+import numpy as np
+
+from build_optimizer import record_damaging_actions, rotation_damage_batch
+from models import CharacterPanel, CharacterStats, BattleState, Action
+from score import ScoringModel
+from simulator import BattleSimulator
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 参与分析的面板属性 (CharacterStats 中用于中间计算的临时字段除外)
+SENSITIVITY_STATS = ("attack", "hp", "crit_rate", "crit_damage", "penetration", "additive_damage_bonus", "final_damage_bonus")
+
+# 优先级表中比较各属性时使用的参考增量 (大致相当于一条副词条)
+REFERENCE_INCREMENTS: Dict[str, float] = {
+    "attack": 100.0,
+    "hp": 500.0,
+    "crit_rate": 0.05,
+    "crit_damage": 0.10,
+    "penetration": 0.05,
+    "additive_damage_bonus": 0.10,
+    "final_damage_bonus": 0.05,
+}
+
+# 中心差分的步长，为参考增量的这一比例
+DIFFERENCE_STEP_FRACTION = 1e-3
+
+@dataclass
+class StatSensitivity:
+    """一个属性的敏感度。"""
+    stat: str
+    value: float         # 当前静态面板上的属性值
+    gradient: float      # 每单位属性的DPR边际收益
+    increment: float     # 参考增量
+    dpr_gain: float      # 增加一个参考增量后的DPR收益 (精确值，属性收益非线性时不等于 gradient * increment)
+    relative_gain: float # dpr_gain 相对于当前DPR的比例
+
+@dataclass
+class SensitivityReport:
+    """属性敏感度分析的结果。stats 按 dpr_gain 从高到低排列。"""
+    character_id: str
+    dpr: float
+    stats: List[StatSensitivity]
+
+    def gradient(self, stat: str) -> float:
+        return next(s.gradient for s in self.stats if s.stat == stat)
+
+    def to_scoring_model(self, scale: float = 1.0) -> ScoringModel:
+        """
+        将梯度转换为评分模型的权重: 每个属性 (SENSITIVITY_STATS 中的全部属性) 的权重等于它的DPR边际收益乘以 scale，
+        DPR本身的权重为0，即得分 = Σ 梯度 × 属性值，是面板属性以“等价的DPR”计的价值。
+        不再额外计入DPR，否则属性对DPR的贡献会被重复计算。
+
+        梯度固定在被分析的面板上 (一阶线性近似)，适合比较与该面板相近的配装；
+        属性变化较大时 (尤其是收益非线性的穿透)，得分与实际DPR的排序可能不同，应以DPR为优化目标。
+        """
+        return ScoringModel(
+            w_dpr=0.0,
+            **{f"w_{stat}": self.gradient(stat) * scale for stat in SENSITIVITY_STATS},
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "character_id": self.character_id,
+            "dpr": self.dpr,
+            "priorities": [asdict(s) for s in self.stats],
+            "scoring_model": asdict(self.to_scoring_model()),
+        }
+
+class StatSensitivityAnalyzer:
+    """计算面板属性对DPR的边际收益。"""
+    def __init__(self, simulator: BattleSimulator, increments: Dict[str, float] | None = None):
+        self.simulator = simulator
+        self.increments = {**REFERENCE_INCREMENTS, **(increments or {})}
+        unknown = set(self.increments) - set(SENSITIVITY_STATS)
+        if unknown:
+            raise ValueError(f"未知的属性: {sorted(unknown)}")
+        if any(value <= 0 for value in self.increments.values()):
+            raise ValueError("参考增量必须为正数")
+
+    def analyze(self, character_panel: CharacterPanel, rotation: List[Action], initial_state: BattleState) -> SensitivityReport:
+        """
+        分析角色在给定排轴中的属性敏感度。
+
+        :param character_panel: 被分析角色的面板 (必须在模拟器中)。
+        :param rotation: 用于评估的团队排轴，其他角色的伤害视为常数。
+        :param initial_state: 排轴开始时的战斗状态。
+        """
+        character_id = character_panel.character_id
+        damaging_actions, other_damage = record_damaging_actions(self.simulator, character_id, rotation, initial_state)
+        rotation_length = len(rotation) or 1
+        base = character_panel.get_final_stats()
+
+        # 第0行为基准面板，之后每个属性依次为 +h、-h、+参考增量 三行
+        num_stats = len(SENSITIVITY_STATS)
+        columns = {name: np.full(1 + 3 * num_stats, float(value)) for name, value in base.as_dict().items()}
+        steps = {}
+        for i, stat in enumerate(SENSITIVITY_STATS):
+            increment = self.increments[stat]
+            steps[stat] = h = increment * DIFFERENCE_STEP_FRACTION
+            row = 1 + 3 * i
+            columns[stat][row] += h
+            columns[stat][row + 1] -= h
+            columns[stat][row + 2] += increment
+
+        total_damage = other_damage + rotation_damage_batch(
+            self.simulator, character_id, damaging_actions, CharacterStats(**columns)
+        )
+        dpr = total_damage / rotation_length
+
+        baseline = float(dpr[0])
+        results = []
+        for i, stat in enumerate(SENSITIVITY_STATS):
+            row = 1 + 3 * i
+            gain = float(dpr[row + 2] - baseline)
+            results.append(StatSensitivity(
+                stat=stat,
+                value=getattr(base, stat),
+                gradient=float((dpr[row] - dpr[row + 1]) / (2 * steps[stat])),
+                increment=self.increments[stat],
+                dpr_gain=gain,
+                relative_gain=gain / baseline if baseline else 0.0,
+            ))
+        results.sort(key=lambda s: s.dpr_gain, reverse=True)
+        logger.info("属性敏感度分析完成: '%s' 基准DPR %.2f，优先级 %s",
+                    character_id, baseline, [s.stat for s in results])
+        return SensitivityReport(character_id, baseline, results)
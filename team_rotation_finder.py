@@ -0,0 +1,273 @@
+# team_rotation_finder.py
+import time
+from dataclasses import fields
+from typing import Dict, FrozenSet, List, Tuple
+
+from models import BattleState, Skill, Action
+from rotation_finder import RotationFinder
+from search_state import StateEncoder
+from simulator import HIGHLIGHT_MAX_ENERGY
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+Footprint = Tuple[FrozenSet[Tuple[str, str]], FrozenSet[Tuple[str, str]]] # (读集合, 写集合)
+
+class TeamRotationFinder(RotationFinder):
+    """
+    团队排轴查找器: 在多个回合内，为模拟器中的所有(或指定的)角色寻找总伤害最高的交错行动顺序。
+
+    回合模型: 每个回合中每名角色恰好行动一次，回合内的行动顺序可以任意安排；
+    角色没有任何可用技能时，本回合跳过行动。Buff的持续时间按回合 (而不是按行动) 推进，
+    回合内的行动不会让Buff到期，因此互相独立的角色在回合内交换顺序不影响结果。
+
+    为了让4人队伍、6回合以上的搜索保持可行，搜索使用了以下精确的约简 (不会丢失最优解):
+    - 对称性: 同一角色的多个技能若行为完全相同 (除名称外的所有字段)，只保留第一个;
+    - 独立分组: 按“读写足迹”把互不影响的角色划分为独立的组，各组分别搜索后再合并;
+    - 交换律: 回合内相邻的两名互相独立的角色，只搜索按队伍顺序排列的那一种先后次序;
+    - 记忆化: 对 (剩余回合, 本回合已行动的角色, 被交换律禁止的角色, 状态) 只求解一次。
+
+    读写足迹通过写时复制状态记录的已写入子容器得到 (BattleState._owned)。
+    这里假设技能效果只读取行动者自身、攻击目标或它所写入的数据，且足迹不随战斗状态变化。
+    """
+    def __init__(self, simulator, dpr_calculator):
+        super().__init__(simulator, dpr_calculator)
+        self._members: List[str] = []
+        self._member_skills: Dict[str, List[Skill]] = {}
+        self._dependent: Dict[Tuple[str, str], bool] = {}
+
+    def _distinct_skills(self, skills: List[Skill]) -> List[Skill]:
+        """
+        [内部辅助方法] 去除行为完全相同的重复技能 (对称性约简)，保持原有顺序。
+        除名称以外的所有字段 (包括攻击范围) 都相同才视为重复，Skill新增的字段自动计入。
+        """
+        seen = set()
+        distinct = []
+        for skill in skills:
+            signature = tuple(getattr(skill, f.name) for f in fields(skill) if f.name != "name")
+            if signature not in seen:
+                seen.add(signature)
+                distinct.append(skill)
+        return distinct
+
+    def _action_footprint(self, state: BattleState, action: Action) -> Footprint:
+        """
+        [内部辅助方法] 在一个资源充足的探测状态上执行行动，返回它的 (读集合, 写集合)。
+        写集合为行动后被复制(写入)过的子容器；读集合额外包含行动者自身的资源和Buff，
+        以及造成伤害时读取的目标敌人及其Debuff。
+        """
+        actor_id, skill = action.character_id, action.skill_used
+        probe = state.fork()
+        resources = probe.resources_for_write(actor_id)
+        resources["sp"] = max(resources.get("sp", 0), skill.sp_cost)
+        resources["h_energy"] = HIGHLIGHT_MAX_ENERGY
+        _, next_state = self.simulator.process_action(probe, action, end_turn=False)
+        writes = frozenset(next_state._owned)
+        reads = {("resources", actor_id), ("buffs", actor_id)}
+        if skill.damage_type != "辅助":
+            target_ids = state.enemies if skill.target_type == "ALL" else (action.target_id,)
+            reads |= {(kind, enemy_id) for enemy_id in target_ids for kind in ("enemy", "debuffs")}
+        return frozenset(reads) | writes, writes
+
+    def _build_dependency(self, initial_state: BattleState):
+        """
+        [内部辅助方法] 计算角色两两之间是否相互影响: 任一方的写集合与另一方的读集合相交即视为相关。
+        每个角色的足迹取其所有技能足迹的并集。
+        """
+        footprints = {}
+        for char_id in self._members:
+            reads, writes = set(), set()
+            for skill in self._member_skills[char_id]:
+                r, w = self._action_footprint(initial_state, Action(char_id, skill, self.target_id))
+                reads |= r
+                writes |= w
+            footprints[char_id] = (reads, writes)
+
+        self._dependent = {}
+        for a in self._members:
+            for b in self._members:
+                reads_a, writes_a = footprints[a]
+                reads_b, writes_b = footprints[b]
+                self._dependent[a, b] = a == b or bool(writes_a & reads_b) or bool(writes_b & reads_a)
+
+    def _independent_groups(self) -> List[List[str]]:
+        """[内部辅助方法] 按相关性划分连通分量，每组内保持队伍顺序。"""
+        groups = []
+        assigned = set()
+        for char_id in self._members:
+            if char_id in assigned:
+                continue
+            group, frontier = [], [char_id]
+            assigned.add(char_id)
+            while frontier:
+                current = frontier.pop()
+                group.append(current)
+                for other in self._members:
+                    if other not in assigned and self._dependent[current, other]:
+                        assigned.add(other)
+                        frontier.append(other)
+            groups.append(sorted(group, key=self._members.index))
+        return groups
+
+    def _best_team_future(
+        self,
+        group: List[str],
+        rounds_left: int,
+        acted: int,
+        blocked: int,
+        state_key: Tuple,
+        state: BattleState,
+        progress_weight: float = 0.0
+    ) -> float:
+        """
+        [核心] 记忆化动态规划: 计算组内角色从给定节点出发、在剩余回合内能造成的最大总伤害。
+        acted 为本回合已行动角色的位掩码 (按组内下标)，blocked 为因交换律约简而不允许紧接着行动的角色。
+        最优选择记录在 self._team_choice 中，用于还原排轴；平局时保留遍历顺序靠前的选择。
+        """
+        full = (1 << len(group)) - 1
+        if acted == full:
+            rounds_left, acted, blocked = rounds_left - 1, 0, 0
+        if rounds_left == 0:
+            self.progress += progress_weight
+            return 0.0
+        memo_key = (rounds_left, acted, blocked, state_key)
+        cached = self._team_memo.get(memo_key)
+        if cached is not None:
+            self.progress += progress_weight
+            return cached
+
+        self._count_node()
+        # 枚举所有 (角色, 技能) 子节点；没有可用技能的角色本回合跳过 (技能为None)
+        children = []
+        for index, char_id in enumerate(group):
+            bit = 1 << index
+            if acted & bit or blocked & bit:
+                continue
+            panel = self.simulator.characters[char_id]
+            skills = [s for s in self._member_skills[char_id] if self._is_skill_possible(panel, s, state)]
+            for skill in skills or [None]:
+                children.append((index, char_id, skill))
+
+        best, best_choice = float('-inf'), None
+        child_weight = progress_weight / len(children) if children else 0.0
+        if not children:
+            self.progress += progress_weight
+        for index, char_id, skill in children:
+            damage, next_state, next_key = 0.0, state, state_key
+            if skill is not None:
+                damage, next_state = self.simulator.process_action(
+                    state, Action(char_id, skill, self.target_id), end_turn=False
+                )
+                next_key, next_state = self._encoder.intern(next_state)
+            # 交换律约简: 紧接在该角色之后行动的、队伍顺序更靠前且与其独立的角色会被禁止，
+            # 因为交换两者得到的等价排轴已经在“先行动靠前角色”的分支中搜索过
+            next_acted = acted | (1 << index)
+            if next_acted == full:
+                # 本回合所有角色都已行动: 回合结束，统一移除到期的Buff
+                next_key, next_state = self._encoder.intern(self.simulator.end_turn(next_state))
+            next_blocked = 0
+            for other_index in range(index):
+                if not next_acted & (1 << other_index) and not self._dependent[char_id, group[other_index]]:
+                    next_blocked |= 1 << other_index
+            value = damage + self._best_team_future(
+                group, rounds_left, next_acted, next_blocked, next_key, next_state, child_weight
+            )
+            if value > best:
+                best = value
+                best_choice = (char_id, skill, next_acted, next_blocked, next_key, next_state)
+
+        self._team_memo[memo_key] = best
+        self._team_choice[memo_key] = best_choice
+        return best
+
+    def _reconstruct(self, group: List[str], rounds: int, state: BattleState) -> List[List[Action]]:
+        """[内部辅助方法] 沿记录的最优选择还原组内每个回合的行动列表 (跳过的行动不计入)。"""
+        full = (1 << len(group)) - 1
+        rounds_left, acted, blocked, state_key = rounds, 0, 0, self._encoder.encode(state)
+        per_round: List[List[Action]] = [[] for _ in range(rounds)]
+        while True:
+            if acted == full:
+                rounds_left, acted, blocked = rounds_left - 1, 0, 0
+            if rounds_left == 0:
+                return per_round
+            char_id, skill, acted, blocked, state_key, state = self._team_choice[(rounds_left, acted, blocked, state_key)]
+            if skill is not None:
+                per_round[rounds - rounds_left].append(Action(char_id, skill, self.target_id))
+
+    def find_best_team_rotation(
+        self,
+        initial_state: BattleState,
+        rounds: int,
+        character_ids: List[str] | None = None
+    ) -> Dict | None:
+        """
+        在给定回合数内，为团队寻找总伤害最高的交错行动顺序。
+
+        :param initial_state: 初始战斗状态，所有单体伤害技能攻击其中第一个存活的敌人。
+        :param rounds: 回合数，每个回合中每名角色行动一次。
+        :param character_ids: 参与搜索的角色，默认为模拟器中的全部角色 (按此顺序作为队伍顺序)。
+        :return: 包含排轴 (行动列表)、每回合行动、DPR结果和独立分组的字典；没有敌人时返回None。
+        若设置了 should_cancel 且其在搜索过程中返回True，将抛出 SearchCancelled。
+        """
+        members = list(character_ids) if character_ids is not None else list(self.simulator.characters)
+        unknown = [char_id for char_id in members if char_id not in self.simulator.characters]
+        if unknown:
+            raise ValueError(f"模拟器中不存在这些角色: {unknown}")
+        if not initial_state.enemies:
+            logger.error("无法开始团队排轴查找：战场上没有敌人。")
+            return None
+        logger.info(">>>>>> 开始为团队 %s 在 %d 回合内寻找最优团队排轴... <<<<<<", members, rounds)
+
+        alive = initial_state.alive_enemies()
+        self.target_id = (alive[0] if alive else next(iter(initial_state.enemies.values()))).enemy_id
+        self.initial_state = initial_state.fork()
+        self._members = members
+        self._member_skills = {
+            char_id: self._distinct_skills(self.simulator.characters[char_id].skills) for char_id in members
+        }
+        self.best_dpr = -1.0
+        self.best_rotation_info = None
+        self.nodes_explored = 0
+        self.progress = 0.0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+        try:
+            self._build_dependency(self.initial_state)
+            groups = self._independent_groups()
+            logger.info("团队被划分为 %d 个互相独立的组: %s", len(groups), groups)
+
+            per_round: List[List[Action]] = [[] for _ in range(rounds)]
+            for group in groups:
+                self._team_memo: Dict[Tuple, float] = {}
+                self._team_choice: Dict[Tuple, Tuple] = {}
+                self._encoder = StateEncoder(self._members)
+                try:
+                    root_key, root_state = self._encoder.intern(self.initial_state)
+                    self._best_team_future(
+                        group, rounds, 0, 0, root_key, root_state,
+                        progress_weight=1.0 / len(groups)
+                    )
+                    for round_actions, group_actions in zip(per_round, self._reconstruct(group, rounds, self.initial_state)):
+                        round_actions.extend(group_actions)
+                finally:
+                    # 搜索结束后释放缓存，避免查找器实例长期占用内存
+                    self._team_memo, self._team_choice = {}, {}
+                    self._encoder = None
+        finally:
+            self.finished_at = time.monotonic()
+
+        # 各组互不影响，按回合依次拼接各组的行动，并按回合完整重放一次得到最终结果
+        rotation = [action for round_actions in per_round for action in round_actions]
+        dpr_results = self.dpr_calculator.calculate_rounds_dpr(per_round, self.initial_state)
+        self.best_dpr = dpr_results["dpr"]
+        self.best_rotation_info = {
+            "rotation": [f"{a.character_id}: {a.skill_used.name}" for a in rotation],
+            "actions": rotation,
+            "rounds": [[(a.character_id, a.skill_used.name) for a in round_actions] for round_actions in per_round],
+            "groups": groups,
+            "dpr_results": dpr_results,
+        }
+        self.progress = 1.0
+        logger.info("团队排轴搜索完成。总伤害: %.2f，访问节点数: %d", dpr_results["total_damage"], self.nodes_explored)
+        return self.best_rotation_info
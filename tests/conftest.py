@@ -0,0 +1,25 @@
+# tests/conftest.py
+"""测试的公共夹具: 把仓库根目录加入模块搜索路径，并提供数据文件中的角色面板。"""
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_ROOT)
+
+from data_loader import DataLoader  # noqa: E402
+
+DATA_FILE_PATH = os.path.join(REPO_ROOT, 'character_data.json')
+
+@pytest.fixture(scope="session")
+def loader() -> DataLoader:
+    return DataLoader(DATA_FILE_PATH)
+
+@pytest.fixture(scope="session")
+def joker(loader):
+    return loader.load_character_panel("Joker")
+
+@pytest.fixture(scope="session")
+def li_yaoling(loader):
+    return loader.load_character_panel("Li Yaoling")
@@ -0,0 +1,25 @@
+# tests/test_batch_analysis.py
+"""批量分析: 单个任务的回合数和排轴长度与 /analyze 使用同样的上限。"""
+import pytest
+
+from batch_analysis import MAX_ROTATION_LENGTH, MAX_TURNS, parse_batch_job
+
+def test_job_within_limits_is_accepted():
+    job = parse_batch_job(0, {"character_id": "Joker", "turns": MAX_TURNS, "rotation": ["技能"] * MAX_ROTATION_LENGTH})
+    assert job.turns == MAX_TURNS
+
+@pytest.mark.parametrize("spec", [
+    {"character_id": "Joker", "turns": MAX_TURNS + 1},
+    {"character_id": "Joker", "turns": -1},
+    {"character_id": "Joker", "rotation": ["技能"] * (MAX_ROTATION_LENGTH + 1)},
+])
+def test_job_over_limits_is_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_batch_job(0, spec)
+
+def test_analyze_uses_the_same_limits():
+    from app import app
+    client = app.test_client()
+    assert client.post("/analyze", json={"character_id": "Joker", "turns": MAX_TURNS + 1}).status_code == 400
+    long_rotation = {"character_id": "Joker", "rotations": [["技能"] * (MAX_ROTATION_LENGTH + 1)]}
+    assert client.post("/analyze", json=long_rotation).status_code == 400
@@ -0,0 +1,55 @@
+# tests/test_breakpoints.py
+"""属性断点表: 反向查询 (所需穿透/减防) 代回防御公式后必须恰好达到目标伤害提升。"""
+import numpy as np
+import pytest
+
+from breakpoints import EnemyProfile, build_table
+from calculator import calculate_defense_multiplier_batch
+
+PROFILES = [EnemyProfile(1200.0), EnemyProfile(1549.0, 1.5), EnemyProfile(8000.0, 0.8)]
+
+def exact_gain(profile: EnemyProfile, penetration: float, reduction: float) -> float:
+    base = calculate_defense_multiplier_batch(profile.defense, 0.0, 0.0, profile.def_coeff)
+    return float(calculate_defense_multiplier_batch(profile.defense, reduction, penetration, profile.def_coeff) / base - 1)
+
+@pytest.mark.parametrize("profile", PROFILES)
+@pytest.mark.parametrize("other", [0.0, 0.137, 0.5, 0.93])
+def test_needed_values_reach_target_gain(profile, other):
+    table = build_table(profile)
+    for target in np.linspace(0.001, table.max_gain, 97):
+        penetration = table.needed_penetration(target, other)
+        reduction = table.needed_reduction(target, other)
+        assert penetration is not None and reduction is not None
+        # 所需值已被截断到 [0, 1]: 截断为0时另一项本身已超过目标
+        assert exact_gain(profile, penetration, other) >= target - 1e-9
+        assert exact_gain(profile, other, reduction) >= target - 1e-9
+        if penetration > 0:
+            assert exact_gain(profile, penetration, other) == pytest.approx(target, rel=1e-9, abs=1e-12)
+
+def test_unreachable_and_trivial_targets():
+    table = build_table(PROFILES[0])
+    assert table.needed_penetration(table.max_gain * 1.01) is None
+    assert table.needed_penetration(0.0) == 0.0
+    assert table.needed_penetration(table.max_gain) == pytest.approx(1.0)
+    # 减防已完全抵消防御时不再需要穿透
+    assert table.needed_penetration(0.5, reduction=1.0) == 0.0
+
+@pytest.fixture(scope="module")
+def client():
+    from app import app
+    return app.test_client()
+
+@pytest.mark.parametrize("body", [
+    {"enemy": {"defense": 1200}, "reduction": 1.0},
+    {"enemy": {"defense": 1200}, "penetration": "NaN"},
+    {"enemy": {"defense": "Infinity"}},
+    {"enemy": {"defense": 1200, "resistances": {"诅咒": "nan"}}},
+])
+def test_query_rejects_out_of_range_and_non_finite_inputs(client, body):
+    assert client.post("/breakpoints", json=body).status_code == 400
+
+def test_query_returns_null_for_unreachable_targets(client):
+    response = client.post("/breakpoints", json={"enemy": {"defense": 1200}, "targets": [0.1, 1000]})
+    assert response.status_code == 200
+    unreachable = response.get_json()["breakpoints"][1]
+    assert unreachable["needed_penetration"] is None and unreachable["needed_reduction"] is None
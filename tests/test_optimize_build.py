@@ -0,0 +1,13 @@
+# tests/test_optimize_build.py
+"""/optimize_build: 格式错误的库存返回400而不是500。"""
+import pytest
+
+@pytest.fixture(scope="module")
+def client():
+    from app import app
+    return app.test_client()
+
+@pytest.mark.parametrize("inventory", [[], "weapons", 3, {"weapons": 3}, {"revelations": [{"name": "x"}]}])
+def test_malformed_inventory_is_rejected(client, inventory):
+    response = client.post("/optimize_build", json={"character_id": "Joker", "inventory": inventory})
+    assert response.status_code == 400
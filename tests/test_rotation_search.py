@@ -0,0 +1,49 @@
+# tests/test_rotation_search.py
+"""排轴搜索: 记忆化分支定界搜索与穷举搜索的最优结果一致，且结果可以由完整模拟重现。"""
+import itertools
+
+import pytest
+
+from dpr_calculator import DprCalculator
+from models import Action, BattleState, Enemy
+from rotation_finder import RotationFinder
+from simulator import BattleSimulator
+from team_rotation_finder import TeamRotationFinder
+
+def make_state(character_ids, enemies=1) -> BattleState:
+    return BattleState(
+        turn_number=1,
+        enemies=[Enemy(f"沙袋{i}", 100000, 1200, {"诅咒": 0.1}) for i in range(enemies)],
+        character_resources={cid: {"sp": 1000, "h_energy": 0} for cid in character_ids},
+    )
+
+@pytest.mark.parametrize("turns", [1, 3, 4])
+@pytest.mark.parametrize("enemies", [1, 2])
+def test_memo_search_matches_exhaustive(joker, turns, enemies):
+    simulator = BattleSimulator([joker])
+    calculator = DprCalculator(simulator)
+    state = make_state([joker.character_id], enemies)
+    results = {
+        mode: RotationFinder(simulator, calculator).find_best_rotation(joker, turns, state, search_mode=mode)
+        for mode in ("exhaustive", "memo")
+    }
+    assert results["exhaustive"]["dpr_results"]["total_damage"] > 0
+    assert results["memo"]["dpr_results"]["total_damage"] == pytest.approx(
+        results["exhaustive"]["dpr_results"]["total_damage"], rel=1e-9)
+    replay = calculator.calculate_team_dpr(results["memo"]["actions"], state)
+    assert replay["total_damage"] == pytest.approx(results["memo"]["dpr_results"]["total_damage"], rel=1e-9)
+
+def test_team_search_beats_every_fixed_skill_choice(joker, li_yaoling):
+    simulator = BattleSimulator([joker, li_yaoling])
+    calculator = DprCalculator(simulator)
+    state = make_state([joker.character_id, li_yaoling.character_id])
+    best = TeamRotationFinder(simulator, calculator).find_best_team_rotation(state, rounds=2)
+    target = state.alive_enemies()[0].enemy_id
+    # 枚举每回合、每名角色的技能选择 (固定队伍顺序)，搜索结果不应低于其中任何一个
+    for choice in itertools.product(joker.skills, li_yaoling.skills, joker.skills, li_yaoling.skills):
+        rounds = [
+            [Action(joker.character_id, choice[0], target), Action(li_yaoling.character_id, choice[1], target)],
+            [Action(joker.character_id, choice[2], target), Action(li_yaoling.character_id, choice[3], target)],
+        ]
+        total = calculator.calculate_rounds_dpr(rounds, state)["total_damage"]
+        assert best["dpr_results"]["total_damage"] >= total - 1e-6
@@ -0,0 +1,33 @@
+# tests/test_snapshot_file.py
+"""快照文件: 面板快照和断点表缓存共用的读写逻辑。"""
+from breakpoints import BreakpointIndex, load_tables, preset_profiles, save_tables
+from panel_registry import PanelRegistry, load_snapshot, save_snapshot
+from snapshot_file import load_snapshot_file, save_snapshot_file
+
+def test_round_trip_and_rejects_foreign_or_stale_files(tmp_path):
+    path = str(tmp_path / "snapshot.bin")
+    save_snapshot_file(path, b"MAGIC", 3, {"a": 1})
+    assert load_snapshot_file(path, b"MAGIC", 3, "测试快照") == {"a": 1}
+    assert load_snapshot_file(path, b"OTHER", 3, "测试快照") is None
+    assert load_snapshot_file(path, b"MAGIC", 4, "测试快照") is None
+    assert load_snapshot_file(str(tmp_path / "missing.bin"), b"MAGIC", 3, "测试快照") is None
+
+def test_breakpoint_tables_round_trip(tmp_path):
+    path = str(tmp_path / "breakpoints.bin")
+    index = BreakpointIndex()
+    index.preload(preset_profiles().values())
+    save_tables(dict(index._tables), path)
+    loaded = load_tables(path)
+    assert loaded.keys() == index._tables.keys()
+    # 面板快照与断点表缓存的魔数不同，不能互相误读
+    assert load_snapshot(path) is None
+
+def test_panel_snapshot_round_trip(tmp_path):
+    from conftest import DATA_FILE_PATH
+    path = str(tmp_path / "panels.bin")
+    snapshot = PanelRegistry(DATA_FILE_PATH).snapshot
+    save_snapshot(snapshot, path)
+    loaded = load_snapshot(path)
+    assert loaded.signature == snapshot.signature
+    assert dict(loaded.panels) == dict(snapshot.panels)
+    assert load_tables(path) == {}
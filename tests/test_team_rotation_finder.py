@@ -0,0 +1,39 @@
+# tests/test_team_rotation_finder.py
+"""团队排轴查找器: 对称性约简只能合并行为完全相同的技能。"""
+import dataclasses
+
+import pytest
+
+from dpr_calculator import DprCalculator
+from models import BattleState, Enemy, Skill
+from simulator import BattleSimulator
+from team_rotation_finder import TeamRotationFinder
+
+SINGLE = Skill("单体", 1.0, sp_cost=10, damage_type="诅咒")
+AOE = dataclasses.replace(SINGLE, name="全体", target_type="ALL")
+
+def make_finder(panel) -> TeamRotationFinder:
+    simulator = BattleSimulator([panel])
+    return TeamRotationFinder(simulator, DprCalculator(simulator))
+
+def test_skills_differing_only_in_target_type_are_distinct(joker):
+    panel = dataclasses.replace(joker, skills=(SINGLE, AOE))
+    assert make_finder(panel)._distinct_skills([SINGLE, AOE]) == [SINGLE, AOE]
+
+def test_identical_skills_are_merged(joker):
+    duplicate = dataclasses.replace(SINGLE, name="单体(复制)")
+    panel = dataclasses.replace(joker, skills=(SINGLE, duplicate))
+    assert make_finder(panel)._distinct_skills([SINGLE, duplicate]) == [SINGLE]
+
+def test_aoe_variant_is_chosen_against_several_enemies(joker):
+    panel = dataclasses.replace(joker, skills=(SINGLE, AOE))
+    state = BattleState(
+        turn_number=1,
+        enemies=[Enemy(f"敌人{i}", 100000, 1200) for i in range(3)],
+        character_resources={"Joker": {"sp": 1000, "h_energy": 0}},
+    )
+    finder = make_finder(panel)
+    info = finder.find_best_team_rotation(state, rounds=3)
+    assert all(action.skill_used.target_type == "ALL" for action in info["actions"])
+    aoe_only = finder.dpr_calculator.calculate_rounds_dpr([[action] for action in info["actions"]], state)
+    assert info["dpr_results"]["total_damage"] == pytest.approx(aoe_only["total_damage"])
@@ -0,0 +1,47 @@
+# tests/test_turn_expiry.py
+"""
+在行动回合到期的Buff: 蒙特卡洛采样和配装批量计算必须按造成伤害时 (回合结束前) 的状态重算伤害，
+与完整模拟 (calculate_rounds_dpr) 的结果一致。
+"""
+import numpy as np
+import pytest
+
+from build_optimizer import record_damaging_actions, rotation_damage_batch
+from dpr_calculator import DprCalculator
+from models import Action, BattleState, CharacterStats, Enemy
+from simulator import BattleSimulator
+
+@pytest.fixture
+def setup(joker, li_yaoling):
+    simulator = BattleSimulator([joker, li_yaoling])
+    state = BattleState(
+        turn_number=1,
+        enemies=[Enemy("沙袋", 100000, 1200, {"诅咒": 0.1})],
+        character_resources={"Joker": {"sp": 1000, "h_energy": 0}, "Li Yaoling": {"sp": 1000}},
+    )
+    # 李瑶铃的攻击力提升持续3回合，之后Joker连续行动5次: 第3次行动时Buff在该回合结束时到期
+    rotation = [Action("Li Yaoling", li_yaoling.skills[0], "沙袋")] + [Action("Joker", joker.skills[0], "沙袋")] * 5
+    return simulator, state, rotation
+
+def test_buff_expires_within_rotation(setup):
+    """前提: 排轴中途确实有Buff到期 (否则下面的测试无法覆盖到期回合)。"""
+    simulator, state, rotation = setup
+    for action in rotation:
+        _, state = simulator.process_action(state, action)
+    assert not state.character_buffs.get("Joker")
+
+def test_monte_carlo_matches_full_simulation(setup):
+    simulator, state, rotation = setup
+    calculator = DprCalculator(simulator)
+    expected = calculator.calculate_rounds_dpr([[action] for action in rotation], state)["total_damage"]
+    distribution = calculator.simulate_damage_distribution(rotation, state, trials=200000, seed=7)
+    assert distribution["expected_total_damage"] == pytest.approx(expected)
+    assert distribution["total_damage"]["mean"] == pytest.approx(expected, rel=5e-3)
+
+def test_batch_damage_matches_full_simulation(setup, joker):
+    simulator, state, rotation = setup
+    expected = DprCalculator(simulator).calculate_rounds_dpr([[action] for action in rotation], state)["total_damage"]
+    damaging_actions, other_damage = record_damaging_actions(simulator, "Joker", rotation, state)
+    static_stats = CharacterStats(**{name: np.array([value]) for name, value in joker.get_final_stats().as_dict().items()})
+    batch_damage = rotation_damage_batch(simulator, "Joker", damaging_actions, static_stats)[0] + other_damage
+    assert batch_damage == pytest.approx(expected, rel=1e-12)
@@ -0,0 +1,123 @@
+# tracing.py
+"""
+统一的日志/追踪子系统。
+
+- 所有模块通过 get_logger() 获取 "p5x" 命名空间下的日志器，日志不会传播到根日志器，
+  因此不会受到宿主环境 (如 gunicorn) 日志配置的影响。
+- 热路径中的调试日志一律使用 DEBUG 级别，并用 %-风格的惰性参数或 isEnabledFor 检查保护，
+  在未开启调试时不会产生任何字符串格式化开销。
+- capture_trace() 为单次请求开启一个追踪缓冲区，期间产生的所有日志记录都会被收集起来，
+  可以随API响应一起返回，便于调试单个排轴；控制台输出级别保持不变。
+"""
+import contextvars
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+# 日志命名空间的根名称
+LOGGER_NAME = "p5x"
+# 单次追踪最多保留的记录条数，防止长搜索时缓冲区无限增长
+DEFAULT_TRACE_LIMIT = 10000
+# 未显式指定级别时，从该环境变量读取日志级别 (如 DEBUG / INFO / WARNING)
+LOG_LEVEL_ENV = "P5X_LOG_LEVEL"
+
+_LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# 当前上下文(线程/协程)中的追踪缓冲区，为None表示本上下文未开启追踪
+_trace_buffer: contextvars.ContextVar = contextvars.ContextVar("p5x_trace_buffer", default=None)
+
+
+class TraceBuffer:
+    """单次请求的追踪缓冲区，保存结构化的日志记录。"""
+    def __init__(self, limit: int = DEFAULT_TRACE_LIMIT):
+        self.limit = limit
+        self.records: List[Dict[str, str]] = []
+        self.dropped = 0  # 超出上限而被丢弃的记录数
+
+    def append(self, record: logging.LogRecord):
+        if len(self.records) >= self.limit:
+            self.dropped += 1
+            return
+        self.records.append({
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        })
+
+    def to_dict(self) -> Dict:
+        return {"records": self.records, "dropped": self.dropped}
+
+
+class _TraceBufferHandler(logging.Handler):
+    """将日志记录写入当前上下文追踪缓冲区的处理器。"""
+    def emit(self, record: logging.LogRecord):
+        buffer = _trace_buffer.get()
+        if buffer is not None:
+            buffer.append(record)
+
+
+_root_logger = logging.getLogger(LOGGER_NAME)
+_root_logger.propagate = False
+_root_logger.setLevel(logging.WARNING)
+_root_logger.addHandler(_TraceBufferHandler())
+_console_handler = logging.StreamHandler()
+_console_handler.setFormatter(logging.Formatter(_LOG_FORMAT))
+_console_handler.setLevel(logging.WARNING)
+_root_logger.addHandler(_console_handler)
+
+# 追踪期间需要临时把日志器级别降到DEBUG；多个请求可能同时追踪，因此使用引用计数
+_capture_lock = threading.Lock()
+_active_captures = 0
+_configured_level = logging.WARNING
+
+
+def get_logger(name: str) -> logging.Logger:
+    """获取 "p5x" 命名空间下的日志器，通常传入模块的 __name__。"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def configure_logging(level: int | str | None = None):
+    """
+    设置控制台日志级别。未指定时读取环境变量 P5X_LOG_LEVEL，默认为 INFO。
+    """
+    global _configured_level
+    if level is None:
+        level = os.environ.get(LOG_LEVEL_ENV, "INFO")
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    with _capture_lock:
+        _configured_level = level
+        _console_handler.setLevel(level)
+        if not _active_captures:
+            _root_logger.setLevel(level)
+
+
+@contextmanager
+def capture_trace(limit: int = DEFAULT_TRACE_LIMIT) -> Iterator[TraceBuffer]:
+    """
+    在当前上下文中开启追踪，收集期间产生的所有级别(含DEBUG)的日志记录。
+    只有当前上下文的记录会进入缓冲区；其他并发请求不受影响，控制台也不会因此输出调试信息。
+
+    用法:
+        with capture_trace() as trace:
+            ...
+        response['trace'] = trace.to_dict()
+    """
+    global _active_captures
+    buffer = TraceBuffer(limit)
+    token = _trace_buffer.set(buffer)
+    with _capture_lock:
+        _active_captures += 1
+        _root_logger.setLevel(logging.DEBUG)
+    try:
+        yield buffer
+    finally:
+        with _capture_lock:
+            _active_captures -= 1
+            if not _active_captures:
+                _root_logger.setLevel(_configured_level)
+        _trace_buffer.reset(token)